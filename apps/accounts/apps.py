@@ -8,6 +8,8 @@ class AccountsConfig(AppConfig):
     name = 'apps.accounts'
 
     def ready(self):
+        from . import signals  # noqa: F401
+
         # Ensure a default superuser is created based on environment variables.
         def create_default_superuser(**kwargs):
             username = getattr(settings, "DEFAULT_SUPERUSER_USERNAME", None)
@@ -0,0 +1,176 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.logistics.redis_client import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+# Enough for permissions and the /api/me/ payload; anything else is loaded
+# lazily as a deferred field
+USER_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+REDIS_KEY = "auth:user:{user_id}"
+
+_local_lock = threading.Lock()
+_local_cache: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+
+
+def _local_get(user_id: str) -> Optional[dict]:
+    with _local_lock:
+        entry = _local_cache.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _local_cache[user_id]
+            return None
+        _local_cache.move_to_end(user_id)
+        return entry[0]
+
+
+def _local_set(user_id: str, data: dict) -> None:
+    with _local_lock:
+        _local_cache[user_id] = (data, time.monotonic() + settings.AUTH_USER_LOCAL_TTL)
+        _local_cache.move_to_end(user_id)
+        while len(_local_cache) > settings.AUTH_USER_LOCAL_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def clear_local_user_cache() -> None:
+    with _local_lock:
+        _local_cache.clear()
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Drop a user from this process' LRU and from Redis."""
+    user_id = str(user_id)
+    with _local_lock:
+        _local_cache.pop(user_id, None)
+    if redis_enabled():
+        try:
+            get_redis().delete(REDIS_KEY.format(user_id=user_id))
+        except redis.RedisError:
+            # Never fail the save; the entry expires after AUTH_USER_CACHE_TTL
+            logger.warning(
+                "Could not invalidate cached user %s", user_id, exc_info=True
+            )
+
+
+def _load_user_data(user_id) -> Optional[dict]:
+    row = (
+        get_user_model()
+        .objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+        .values(*USER_FIELDS, "password", "driver_profile__id")
+        .first()
+    )
+    if row is None:
+        return None
+    password = row.pop("password")
+    row["driver_profile_id"] = row.pop("driver_profile__id")
+    # Only a digest is cached, and only when tokens are tied to the password
+    if api_settings.CHECK_REVOKE_TOKEN:
+        row["password_md5"] = get_md5_hash_password(password)
+    return row
+
+
+def get_cached_user_data(user_id) -> Optional[dict]:
+    """
+    Auth fields of a user from the process LRU (AUTH_USER_LOCAL_TTL), then
+    Redis (AUTH_USER_CACHE_TTL), then one query. Saves of the user or their
+    driver profile drop the entry (see apps.accounts.signals); other
+    processes' LRUs catch up within AUTH_USER_LOCAL_TTL. When Redis is
+    unavailable the user comes from the database, as without the cache.
+    """
+    key = str(user_id)
+    data = _local_get(key)
+    if data is not None:
+        return data
+
+    use_redis = redis_enabled()
+    if use_redis:
+        try:
+            raw = get_redis().get(REDIS_KEY.format(user_id=key))
+        except redis.RedisError:
+            logger.warning("Redis unavailable, loading user %s", key, exc_info=True)
+            use_redis = False
+        else:
+            if raw is not None:
+                data = json.loads(raw)
+                _local_set(key, data)
+                return data
+
+    data = _load_user_data(user_id)
+    if data is None:
+        return None
+    if use_redis:
+        try:
+            get_redis().set(
+                REDIS_KEY.format(user_id=key),
+                json.dumps(data),
+                ex=settings.AUTH_USER_CACHE_TTL,
+            )
+        except redis.RedisError:
+            logger.warning("Could not cache user %s", key, exc_info=True)
+    _local_set(key, data)
+    return data
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request user SELECT.
+
+    ``request.user`` is built from cached fields; every other field is
+    deferred, so reading it loads it and ``save()`` writes only what was
+    loaded. ``request.user.driver_profile_id`` is the driver id (or None).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        data = get_cached_user_data(user_id)
+        if data is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not data["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != data.get("password_md5"):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+
+        # from_db expects values in concrete field order
+        fields = [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname in USER_FIELDS
+        ]
+        user = self.user_model.from_db(
+            DEFAULT_DB_ALIAS, fields, [data[field] for field in fields]
+        )
+        user.driver_profile_id = data["driver_profile_id"]
+        return user
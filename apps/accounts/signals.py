@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.logistics.models import Driver
+
+from .authentication import invalidate_cached_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    # Again after commit, in case a request cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+def invalidate_user_on_driver_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.user_id))
@@ -1,3 +1,222 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import redis
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.logistics.models import (
+    DeliveryOrder,
+    DeliveryStatus,
+    Driver,
+    Garage,
+    Vehicle,
+    VehicleType,
+)
+
+from .authentication import CachedJWTAuthentication, clear_local_user_cache
+
+
+@override_settings(VERSIONED_CACHING=True)
+class MeViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="motorista", password="x"
+        )
+        self.driver = Driver.objects.create(user=self.user, license_number="CNH321")
+        self.client.force_authenticate(self.user)
+
+    def _create_order(self, status_value, **extra):
+        return DeliveryOrder.objects.create(
+            client_name=f"Cliente {status_value}",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(days=1),
+            driver=self.driver,
+            status=status_value,
+            **extra,
+        )
+
+    def test_me_lists_only_open_orders_and_is_cached(self):
+        pending = self._create_order(DeliveryStatus.PENDING)
+        self._create_order(DeliveryStatus.IN_TRANSIT)
+        self._create_order(DeliveryStatus.DELIVERED)
+        self._create_order(DeliveryStatus.CANCELLED)
+
+        resp = self.client.get(reverse("me"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data["is_driver"])
+        statuses = {order["status"] for order in resp.data["assigned_orders"]}
+        self.assertEqual(statuses, {DeliveryStatus.PENDING, DeliveryStatus.IN_TRANSIT})
+        self.assertEqual(resp.data["order_history"], reverse("me-orders"))
+
+        # Only the driver lookup runs while the cached payload is current
+        with self.assertNumQueries(1):
+            self.client.get(reverse("me"))
+
+        pending.status = DeliveryStatus.DELIVERED
+        pending.save()
+        resp = self.client.get(reverse("me"))
+        self.assertEqual(len(resp.data["assigned_orders"]), 1)
+
+    def test_me_stays_cached_across_unrelated_fleet_changes(self):
+        garage = Garage.objects.create(name="Central", address="Rua A")
+        vehicle = Vehicle.objects.create(
+            plate="ABC1D23",
+            model="Fiorino",
+            capacity_kg=600,
+            type=VehicleType.VAN,
+            garage=garage,
+        )
+        self._create_order(DeliveryStatus.PENDING, vehicle=vehicle)
+        other_user = get_user_model().objects.create_user(username="outro")
+        etag = self.client.get(reverse("me"))["ETag"]
+
+        Vehicle.objects.create(
+            plate="XYZ9A87", model="Kombi", capacity_kg=900, type=VehicleType.VAN
+        )
+        Garage.objects.create(name="Norte", address="Rua B")
+        Driver.objects.create(user=other_user, license_number="CNH999")
+        self.assertEqual(self.client.get(reverse("me"))["ETag"], etag)
+
+        garage.name = "Central Sul"
+        garage.save()
+        resp = self.client.get(reverse("me"))
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.data["assigned_orders"][0]["garage_name"], "Central Sul")
+
+        vehicle.plate = "ABC1D99"
+        vehicle.save()
+        resp = self.client.get(reverse("me"))
+        self.assertEqual(resp.data["assigned_orders"][0]["vehicle_plate"], "ABC1D99")
+
+    def test_order_history_is_paginated(self):
+        for _ in range(12):
+            self._create_order(DeliveryStatus.DELIVERED)
+        self._create_order(DeliveryStatus.PENDING)
+
+        resp = self.client.get(reverse("me-orders"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 12)
+        self.assertEqual(len(resp.data["results"]), 10)
+
+        resp = self.client.get(reverse("me-orders"), {"status": "pending"})
+        self.assertEqual(resp.data["count"], 1)
+
+    def test_payload_contract_used_by_driver_page(self):
+        # frontend/src/lib/api.ts (MeResponse, MeOrderHistory) relies on these
+        order_keys = {
+            "id",
+            "client_name",
+            "status",
+            "deadline",
+            "vehicle",
+            "vehicle_plate",
+            "vehicle_model",
+            "garage",
+            "garage_name",
+        }
+        self._create_order(DeliveryStatus.PENDING)
+        self._create_order(DeliveryStatus.DELIVERED)
+        self._create_order(DeliveryStatus.CANCELLED)
+
+        me = self.client.get(reverse("me")).data
+        self.assertEqual(
+            set(me),
+            {
+                "id",
+                "username",
+                "email",
+                "is_staff",
+                "is_superuser",
+                "is_driver",
+                "assigned_orders",
+                "order_history",
+            },
+        )
+        self.assertEqual(set(me["assigned_orders"][0]), order_keys)
+
+        history = self.client.get(me["order_history"]).data
+        self.assertEqual(set(history), {"count", "next", "previous", "results"})
+        self.assertEqual(
+            {order["status"] for order in history["results"]},
+            {DeliveryStatus.DELIVERED, DeliveryStatus.CANCELLED},
+        )
+        self.assertEqual(set(history["results"][0]), order_keys)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_user_cache()
+        self.user = get_user_model().objects.create_user(
+            username="cacheado", password="senha123", email="a@example.com"
+        )
+        self.driver = Driver.objects.create(user=self.user, license_number="CNH654")
+        self.token = AccessToken.for_user(self.user)
+        self.auth = CachedJWTAuthentication()
+
+    def test_user_is_resolved_once_and_invalidated_on_save(self):
+        with self.assertNumQueries(1):
+            user = self.auth.get_user(self.token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, "a@example.com")
+        self.assertEqual(user.driver_profile_id, self.driver.pk)
+        with self.assertNumQueries(0):
+            self.auth.get_user(self.token)
+
+        self.user.email = "b@example.com"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.auth.get_user(self.token).email, "b@example.com")
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_saving_cached_user_keeps_unloaded_fields(self):
+        user = self.auth.get_user(self.token)
+        user.first_name = "Ana"
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Ana")
+        self.assertTrue(self.user.check_password("senha123"))
+
+    @override_settings(REDIS_URL="redis://redis.invalid:6379/0")
+    def test_redis_failures_fall_back_to_the_database(self):
+        client = mock.Mock()
+        client.get.side_effect = redis.ConnectionError("down")
+        client.set.side_effect = redis.ConnectionError("down")
+        client.delete.side_effect = redis.TimeoutError("slow")
+        with mock.patch("apps.accounts.authentication.get_redis", return_value=client):
+            with self.assertNumQueries(1):
+                user = self.auth.get_user(self.token)
+            self.assertEqual(user.email, "a@example.com")
+
+            # The save still commits and drops the local entry
+            self.user.email = "b@example.com"
+            self.user.save()
+            self.assertEqual(self.auth.get_user(self.token).email, "b@example.com")
+        client.get.assert_called()
+        client.delete.assert_called()
+
+    @override_settings(VERSIONED_CACHING=True)
+    def test_me_needs_no_queries_once_warm(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.client.get(reverse("me"))
+        # Was one SELECT for the user plus one for the driver profile
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse("me"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data["is_driver"])
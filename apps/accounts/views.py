@@ -1,7 +1,11 @@
 from rest_framework import permissions, viewsets
+from rest_framework.generics import GenericAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
 
 from .serializers import UserSerializer
 
@@ -21,41 +25,122 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOnly]
 
 
+ORDER_FIELDS = (
+    "id",
+    "client_name",
+    "status",
+    "deadline",
+    "vehicle_id",
+    "vehicle__plate",
+    "vehicle__model",
+    "vehicle__garage_id",
+    "vehicle__garage__name",
+)
+
+
+def _order_row(row):
+    return {
+        "id": row["id"],
+        "client_name": row["client_name"],
+        "status": row["status"],
+        "deadline": row["deadline"],
+        "vehicle": row["vehicle_id"],
+        "vehicle_plate": row["vehicle__plate"],
+        "vehicle_model": row["vehicle__model"],
+        "garage": row["vehicle__garage_id"],
+        "garage_name": row["vehicle__garage__name"],
+    }
+
+
 class MeView(APIView):
+    """
+    Profile of the current user. Drivers also get their open orders (at most
+    ME_OPEN_ORDERS_LIMIT); closed ones are paged under /api/me/orders/.
+    """
+
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        driver_profile = getattr(user, "driver_profile", None)
-        is_driver = bool(driver_profile)
-        assigned_orders = []
-        if driver_profile:
-            from apps.logistics.models import DeliveryOrder
+        from apps.logistics.caching import conditional_get, driver_scope
+        from apps.logistics.models import DeliveryOrder, Driver
 
-            qs = DeliveryOrder.objects.filter(driver=driver_profile).select_related(
-                "vehicle", "vehicle__garage"
+        if hasattr(request.user, "driver_profile_id"):
+            # Resolved by CachedJWTAuthentication, no query needed
+            driver_id = request.user.driver_profile_id
+        else:
+            driver_id = (
+                Driver.objects.filter(user=request.user)
+                .values_list("pk", flat=True)
+                .first()
             )
-            for order in qs:
-                assigned_orders.append(
-                    {
-                        "id": order.id,
-                        "client_name": order.client_name,
-                        "status": order.status,
-                        "vehicle": order.vehicle_id,
-                        "vehicle_plate": order.vehicle.plate if order.vehicle else None,
-                        "vehicle_model": order.vehicle.model if order.vehicle else None,
-                        "garage": order.vehicle.garage_id if order.vehicle and order.vehicle.garage else None,
-                        "garage_name": order.vehicle.garage.name if order.vehicle and order.vehicle.garage else None,
-                    }
-                )
-        return Response(
-            {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "is_staff": user.is_staff,
-                "is_superuser": user.is_superuser,
-                "is_driver": is_driver,
-                "assigned_orders": assigned_orders,
-            }
+        # Only the rows the payload reads: the user, whether they have a
+        # driver profile, and that driver's open orders with their vehicle
+        # and garage (see apps.logistics.signals)
+        specs = [(get_user_model(), request.user.pk), (Driver, request.user.pk)]
+        if driver_id is not None:
+            specs.append((DeliveryOrder, driver_scope(driver_id)))
+        return conditional_get(request, specs, self._get, driver_id, specs)
+
+    def _get(self, request, driver_id, specs):
+        from apps.logistics.caching import get_versions, versioned_caching_enabled
+
+        if not versioned_caching_enabled():
+            return Response(self._payload(request.user, driver_id))
+        versions = "-".join(str(version) for version in get_versions(*specs))
+        key = f"me:{request.user.pk}:{driver_id}:{versions}"
+        data = cache.get(key)
+        if data is None:
+            data = self._payload(request.user, driver_id)
+            cache.set(key, data, timeout=settings.ME_CACHE_TTL)
+        return Response(data)
+
+    def _payload(self, user, driver_id):
+        from apps.logistics.models import OPEN_ORDER_STATUSES, DeliveryOrder
+
+        assigned_orders = []
+        if driver_id is not None:
+            open_orders = DeliveryOrder.objects.filter(
+                driver_id=driver_id, status__in=OPEN_ORDER_STATUSES
+            ).order_by("deadline")
+            assigned_orders = [
+                _order_row(row)
+                for row in open_orders.values(*ORDER_FIELDS)[
+                    : settings.ME_OPEN_ORDERS_LIMIT
+                ]
+            ]
+        return {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "is_staff": user.is_staff,
+            "is_superuser": user.is_superuser,
+            "is_driver": driver_id is not None,
+            "assigned_orders": assigned_orders,
+            "order_history": reverse("me-orders"),
+        }
+
+
+class MeOrderHistoryView(GenericAPIView):
+    """
+    Orders assigned to the current driver, newest first and paginated.
+    Closed orders by default; ``?status=`` picks another status.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        from apps.logistics.models import (
+            CLOSED_ORDER_STATUSES,
+            DeliveryOrder,
+            DeliveryStatus,
         )
+
+        queryset = DeliveryOrder.objects.filter(driver__user=self.request.user)
+        status = self.request.query_params.get("status")
+        if status in DeliveryStatus.values:
+            return queryset.filter(status=status)
+        return queryset.filter(status__in=CLOSED_ORDER_STATUSES)
+
+    def get(self, request):
+        page = self.paginate_queryset(self.get_queryset().values(*ORDER_FIELDS))
+        return self.get_paginated_response([_order_row(row) for row in page])
@@ -2,15 +2,22 @@ from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
 
 from .models import (
+    CepCache,
+    DailyOrderRollup,
     DeliveryArea,
     DeliveryOrder,
     Driver,
     Garage,
     Notification,
+    NotificationArchive,
+    OrderStatusEvent,
+    OutboxEvent,
+    PostalCode,
     PushSubscription,
     Vehicle,
     Route,
 )
+from .outbox import requeue_failed_events
 
 
 @admin.register(Vehicle)
@@ -69,7 +76,77 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ("title", "body", "user__username", "user__email")
 
 
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ("title", "user", "created_at", "archived_at")
+    search_fields = ("title", "body", "user__username", "user__email")
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "event_type",
+        "aggregate_type",
+        "aggregate_id",
+        "attempts",
+        "created_at",
+        "next_attempt_at",
+        "published_at",
+        "failed_at",
+    )
+    list_filter = (
+        "event_type",
+        "aggregate_type",
+        ("failed_at", admin.EmptyFieldListFilter),
+    )
+    search_fields = ("dedup_key", "last_error")
+    actions = ["requeue"]
+
+    @admin.action(description="Reenfileirar eventos que falharam")
+    def requeue(self, request, queryset):
+        requeued = requeue_failed_events(queryset)
+        self.message_user(request, f"{requeued} evento(s) reenfileirado(s).")
+
+
 @admin.register(PushSubscription)
 class PushSubscriptionAdmin(admin.ModelAdmin):
-    list_display = ("user", "endpoint", "created_at")
+    list_display = (
+        "user",
+        "endpoint",
+        "failure_count",
+        "last_success_at",
+        "quarantined_until",
+        "created_at",
+    )
     search_fields = ("endpoint", "user__username", "user__email")
+
+
+@admin.register(CepCache)
+class CepCacheAdmin(admin.ModelAdmin):
+    list_display = ("cep", "status_code", "fetched_at", "expires_at")
+    list_filter = ("status_code",)
+    search_fields = ("cep",)
+
+
+@admin.register(PostalCode)
+class PostalCodeAdmin(admin.ModelAdmin):
+    list_display = ("cep", "street", "neighborhood", "city", "state")
+    list_filter = ("state",)
+    search_fields = ("cep", "street", "city")
+
+
+@admin.register(DailyOrderRollup)
+class DailyOrderRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "driver", "status", "orders")
+    list_filter = ("status",)
+    date_hierarchy = "day"
+
+
+@admin.register(OrderStatusEvent)
+class OrderStatusEventAdmin(admin.ModelAdmin):
+    list_display = ("order", "driver", "from_status", "to_status", "changed_at")
+    list_filter = ("to_status",)
+    raw_id_fields = ("order", "driver")
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,276 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DailyOrderRollup,
+    DeliveryOrder,
+    DeliveryStatus,
+    Driver,
+    OrderRollupDirtyDay,
+    OrderStatusEvent,
+)
+
+STATUS_EVENT_PERCENTILES = (0.5, 0.9, 0.95)
+
+GROUP_FIELDS = {
+    "day": ("day",),
+    "driver": ("driver_id", "driver__user__username"),
+    "status": ("status",),
+}
+
+
+def order_day(order: DeliveryOrder) -> date:
+    return timezone.localdate(order.created_at)
+
+
+def mark_days_dirty(days: Iterable[date]) -> None:
+    """
+    Queue days for the next rollup refresh once the current transaction
+    commits. Days already queued are skipped (ON CONFLICT DO NOTHING), so
+    order writes never lock a shared marker row; if a refresh claimed the
+    day meanwhile, the insert waits for it and queues the day again.
+    """
+    markers = [OrderRollupDirtyDay(day=day) for day in set(days)]
+    transaction.on_commit(
+        lambda: OrderRollupDirtyDay.objects.bulk_create(
+            markers, ignore_conflicts=True
+        )
+    )
+
+
+def _day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def recompute_days(days: list[date]) -> int:
+    """Rebuild the rollup rows of ``days`` from the orders; returns rows written."""
+    if not days:
+        return 0
+
+    # Range filters on created_at keep the scan on the index
+    created = Q()
+    for day in days:
+        start, end = _day_bounds(day)
+        created |= Q(created_at__gte=start, created_at__lt=end)
+    rows = (
+        DeliveryOrder.objects.filter(created)
+        .annotate(day=TruncDate("created_at"))
+        .order_by()
+        .values("day", "driver_id", "status")
+        .annotate(orders=Count("id"))
+    )
+    with transaction.atomic():
+        DailyOrderRollup.objects.filter(day__in=days).delete()
+        created_rows = DailyOrderRollup.objects.bulk_create(
+            [DailyOrderRollup(**row) for row in rows]
+        )
+    return len(created_rows)
+
+
+def refresh_order_rollups(max_days: int = 31) -> dict:
+    """
+    Recompute only the days touched since the last run. Markers are claimed
+    with SELECT ... FOR UPDATE SKIP LOCKED and deleted in the same
+    transaction, so a day changed mid-refresh is simply marked again.
+    """
+    with transaction.atomic():
+        days = list(
+            OrderRollupDirtyDay.objects.select_for_update(skip_locked=True)
+            .order_by("day")
+            .values_list("day", flat=True)[:max_days]
+        )
+        if not days:
+            return {"days": 0, "rows": 0}
+        OrderRollupDirtyDay.objects.filter(day__in=days).delete()
+        rows = recompute_days(days)
+    return {"days": len(days), "rows": rows}
+
+
+def query_order_rollups(group_by: list[str], start: date, end: date) -> list[dict]:
+    """Order counts between ``start`` and ``end`` (inclusive), from the rollups only."""
+    fields = [field for name in group_by for field in GROUP_FIELDS[name]]
+    rows = (
+        DailyOrderRollup.objects.filter(day__gte=start, day__lte=end)
+        .values(*fields)
+        .annotate(orders=Sum("orders"))
+        .order_by(*fields)
+    )
+    results = []
+    for row in rows:
+        if "driver_id" in row:
+            row["driver"] = row.pop("driver_id")
+            row["driver_name"] = row.pop("driver__user__username")
+        results.append(row)
+    return results
+
+
+def record_status_event(order: DeliveryOrder, previous_status) -> None:
+    """Append a transition; call it in the transaction that saved ``order``."""
+    OrderStatusEvent.objects.create(
+        order=order,
+        driver_id=order.driver_id,
+        from_status=previous_status or "",
+        to_status=order.status,
+        changed_at=order.updated_at,
+    )
+
+
+def _create_month_partition(cursor, table: str, name: str, start: date, end: date):
+    default = f"{table}_default"
+    bounds = [f"{start} 00:00+00", f"{end} 00:00+00"]
+    create = (
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{bounds[0]}') TO ('{bounds[1]}')"
+    )
+    # Holds off inserts routed to the default partition until the month exists
+    cursor.execute(f"LOCK TABLE {default} IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {default} "
+        f"WHERE changed_at >= %s AND changed_at < %s)",
+        bounds,
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(create)
+        return
+
+    # Postgres refuses a partition whose rows sit in the default partition
+    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+    cursor.execute(create)
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default} "
+        f"WHERE changed_at >= %s AND changed_at < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        bounds,
+    )
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+
+
+def ensure_status_event_partitions(months_ahead: int = 2) -> list[str]:
+    """
+    Create the monthly OrderStatusEvent partitions from the current month to
+    ``months_ahead`` months ahead. Events of months without a partition land
+    in the default partition; when their month is created later those rows
+    are moved into it (with the default partition briefly detached).
+    """
+    table = OrderStatusEvent._meta.db_table
+    month = timezone.now().date().replace(day=1)
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            following = (month + timedelta(days=32)).replace(day=1)
+            name = f"{table}_p{month:%Y%m}"
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is None:
+                with transaction.atomic():
+                    _create_month_partition(cursor, table, name, month, following)
+            created.append(name)
+            month = following
+    return created
+
+
+def _datetime_range(start: date, end: date) -> tuple[datetime, datetime]:
+    return _day_bounds(start)[0], _day_bounds(end)[1]
+
+
+def time_in_state(start: date, end: date) -> list[dict]:
+    """
+    Seconds orders spent in each status they entered between ``start`` and
+    ``end``: LEAD() over each order's events (ordered by the
+    (order_id, changed_at) index) pairs a transition with the next one.
+    States still open are left out.
+    """
+    since, until = _datetime_range(start, end)
+    table = OrderStatusEvent._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                status,
+                COUNT(*),
+                percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY seconds),
+                AVG(seconds)
+            FROM (
+                SELECT
+                    to_status AS status,
+                    changed_at,
+                    EXTRACT(EPOCH FROM LEAD(changed_at) OVER (
+                        PARTITION BY order_id ORDER BY changed_at, id
+                    ) - changed_at)::float8 AS seconds
+                FROM {table}
+                WHERE changed_at >= %s
+            ) AS transitions
+            WHERE seconds IS NOT NULL AND changed_at < %s
+            GROUP BY status
+            ORDER BY status
+            """,
+            [list(STATUS_EVENT_PERCENTILES), since, until],
+        )
+        rows = cursor.fetchall()
+
+    results = []
+    for status, transitions, percentiles, average in rows:
+        entry = {"status": status, "transitions": transitions}
+        for fraction, value in zip(STATUS_EVENT_PERCENTILES, percentiles):
+            entry[f"p{round(fraction * 100)}"] = value
+        entry["avg"] = average
+        results.append(entry)
+    return results
+
+
+def on_time_by_driver(start: date, end: date) -> list[dict]:
+    """
+    Deliveries between ``start`` and ``end`` per driver and how many met the
+    order deadline. ROW_NUMBER() keeps the first delivery of an order, so an
+    order moved back and delivered again counts once.
+    """
+    since, until = _datetime_range(start, end)
+    events = OrderStatusEvent._meta.db_table
+    orders = DeliveryOrder._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                delivered.driver_id,
+                COUNT(*),
+                COUNT(*) FILTER (WHERE delivered.changed_at <= o.deadline)
+            FROM (
+                SELECT
+                    order_id,
+                    driver_id,
+                    changed_at,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY order_id ORDER BY changed_at, id
+                    ) AS delivery
+                FROM {events}
+                WHERE to_status = %s AND changed_at >= %s AND changed_at < %s
+            ) AS delivered
+            JOIN {orders} o ON o.id = delivered.order_id
+            WHERE delivered.delivery = 1
+            GROUP BY delivered.driver_id
+            ORDER BY delivered.driver_id NULLS LAST
+            """,
+            [DeliveryStatus.DELIVERED, since, until],
+        )
+        rows = cursor.fetchall()
+
+    names = dict(
+        Driver.objects.filter(pk__in=[row[0] for row in rows if row[0]]).values_list(
+            "pk", "user__username"
+        )
+    )
+    return [
+        {
+            "driver": driver_id,
+            "driver_name": names.get(driver_id),
+            "delivered": delivered,
+            "on_time": on_time,
+            "on_time_rate": round(on_time / delivered, 4),
+        }
+        for driver_id, delivered, on_time in rows
+    ]
@@ -6,4 +6,10 @@ class LogisticsConfig(AppConfig):
     name = 'apps.logistics'
 
     def ready(self):
+        from django.db.backends.signals import connection_created
+
         from . import signals  # noqa: F401
+        from .metrics import connect_task_signals, instrument_connection
+
+        connection_created.connect(instrument_connection)
+        connect_task_signals()
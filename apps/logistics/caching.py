@@ -0,0 +1,272 @@
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = "logistics:version"
+RESPONSE_KEY_PREFIX = "logistics:response"
+RESPONSE_STATS_PREFIX = "logistics:response-stats"
+
+# cache_name of every view using CachedResponseMixin, for the stats endpoint
+CACHED_ENDPOINTS: list[str] = []
+
+
+def _version_key(model, scope=None) -> str:
+    key = f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+    if scope is not None:
+        key = f"{key}:{scope}"
+    return key
+
+
+def driver_scope(driver_id) -> str:
+    """Version scope for the orders assigned to one driver."""
+    return f"driver:{driver_id}"
+
+
+def _as_spec(spec):
+    if isinstance(spec, tuple):
+        return spec
+    return spec, None
+
+
+def bump_version(model, scope=None) -> None:
+    """
+    Mark every representation built from ``model`` (optionally restricted to a
+    scope such as a user id) as stale. Versions are nanosecond timestamps so
+    a counter evicted from the cache comes back newer, never older.
+
+    Inside a transaction the counter is bumped again on commit: a reader that
+    saw the first bump but not the uncommitted rows may have cached the old
+    payload under the new version.
+
+    Cache errors are logged, never raised: a write must not fail because
+    Redis is down (entries then go stale until RESPONSE_CACHE_TTL).
+    """
+    key = _version_key(model, scope)
+    _set_version(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _set_version(key))
+
+
+def _set_version(key: str) -> None:
+    try:
+        cache.set(key, time.time_ns(), timeout=None)
+    except redis.RedisError:
+        logger.warning("Could not bump cache version %s", key, exc_info=True)
+
+
+def get_versions(*specs) -> list[int]:
+    """
+    Return the current version of each spec, where a spec is a model or a
+    ``(model, scope)`` tuple. Unknown counters are initialised to "now".
+    """
+    keys = [_version_key(*_as_spec(spec)) for spec in specs]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key) or time.time_ns()
+        versions.append(found[key])
+    return versions
+
+
+def request_versions(request, specs) -> list[int]:
+    """get_versions() once per request; ETags and the response cache share it."""
+    versions = getattr(request, "_model_versions", None)
+    if versions is None:
+        versions = get_versions(*specs)
+        request._model_versions = versions
+    return versions
+
+
+def _validators(request, specs):
+    cached = getattr(request, "_version_validators", None)
+    if cached is not None:
+        return cached
+
+    versions = request_versions(request, specs)
+    user = request.user
+    raw = "|".join(
+        [
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT", ""),
+            str(getattr(user, "pk", "")),
+            str(getattr(user, "is_staff", False)),
+            *(str(version) for version in versions),
+        ]
+    )
+    etag = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    last_modified = max(versions) / 1_000_000_000 if versions else None
+    request._version_validators = (etag, last_modified)
+    return request._version_validators
+
+
+def versioned_caching_enabled() -> bool:
+    """Whether version counters are shared by every process (see settings)."""
+    return settings.VERSIONED_CACHING
+
+
+def conditional_get(request, specs, handler, *args, **kwargs):
+    """
+    Run ``handler`` only when the client's validators are stale.
+
+    ETag and Last-Modified are derived from model version counters, so a
+    matching ``If-None-Match`` returns 304 before any query or serializer runs.
+    Without VERSIONED_CACHING the handler always runs and sends no validators.
+    """
+    if not versioned_caching_enabled():
+        return handler(request, *args, **kwargs)
+
+    def etag_func(req, *a, **kw):
+        return _validators(req, specs)[0]
+
+    def last_modified_func(req, *a, **kw):
+        timestamp = _validators(req, specs)[1]
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    response = condition(etag_func=etag_func, last_modified_func=last_modified_func)(
+        handler
+    )(request, *args, **kwargs)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+class ConditionalListMixin:
+    """
+    Add ETag/Last-Modified support to ``list``, for viewsets without a
+    ``retrieve`` action.
+
+    ``conditional_models`` lists every model (or ``(model, scope)`` tuple)
+    that feeds the serialized payload, including related models.
+    """
+
+    conditional_models = ()
+
+    def get_conditional_models(self):
+        return self.conditional_models
+
+    def list(self, request, *args, **kwargs):
+        return conditional_get(
+            request, self.get_conditional_models(), super().list, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin(ConditionalListMixin):
+    """Add ETag/Last-Modified support to ``list`` and ``retrieve``."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_get(
+            request, self.get_conditional_models(), super().retrieve, *args, **kwargs
+        )
+
+
+def _stats_key(endpoint: str, outcome: str) -> str:
+    return f"{RESPONSE_STATS_PREFIX}:{endpoint}:{outcome}"
+
+
+def _count(endpoint: str, outcome: str) -> None:
+    key = _stats_key(endpoint, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def response_cache_stats() -> list[dict]:
+    """Hits, misses and hit ratio of every cached endpoint since the counters began."""
+    endpoints = [
+        f"{name}:{action}"
+        for name in CACHED_ENDPOINTS
+        for action in CachedResponseMixin.cached_actions
+    ]
+    keys = [
+        _stats_key(endpoint, outcome)
+        for endpoint in endpoints
+        for outcome in ("hits", "misses")
+    ]
+    found = cache.get_many(keys)
+    stats = []
+    for endpoint in endpoints:
+        hits = found.get(_stats_key(endpoint, "hits"), 0)
+        misses = found.get(_stats_key(endpoint, "misses"), 0)
+        total = hits + misses
+        stats.append(
+            {
+                "endpoint": endpoint,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / total, 4) if total else None,
+            }
+        )
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list`` and ``retrieve`` payloads in the shared cache.
+
+    Keys combine the user role, the renderer, the host and the full path
+    with the version counters of ``get_conditional_models()``; signals bump
+    those on every save/delete, so a write makes the old entries unreachable
+    and they expire after RESPONSE_CACHE_TTL. Place it after
+    ConditionalGetMixin so 304s are answered before the cache is read.
+    """
+
+    cache_name = None
+    cached_actions = ("list", "retrieve")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_name and cls.cache_name not in CACHED_ENDPOINTS:
+            CACHED_ENDPOINTS.append(cls.cache_name)
+
+    def _response_cache_key(self, request) -> str:
+        user = request.user
+        role = "staff" if getattr(user, "is_staff", False) else "user"
+        versions = request_versions(request, self.get_conditional_models())
+        raw = "|".join(
+            [
+                request.get_host(),
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                *(str(version) for version in versions),
+            ]
+        )
+        digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+        return f"{RESPONSE_KEY_PREFIX}:{self.cache_name}:{self.action}:{role}:{digest}"
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if not versioned_caching_enabled():
+            return handler(request, *args, **kwargs)
+        endpoint = f"{self.cache_name}:{self.action}"
+        key = self._response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _count(endpoint, "hits")
+            return Response(data)
+
+        _count(endpoint, "misses")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TTL)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,472 @@
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Callable, Optional
+
+import redis
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metrics import record_phase
+from .models import CepCache, PostalCode
+from .redis_client import get_redis, redis_enabled
+from .upstream import UpstreamUnavailable, coalesce, get_upstream
+
+logger = logging.getLogger(__name__)
+
+# Values of the X-Cache-Status response header
+CACHE_HIT = "HIT"
+CACHE_HIT_DB = "HIT-DB"
+CACHE_HIT_LOCAL = "HIT-LOCAL"
+CACHE_MISS = "MISS"
+
+CEP_PATTERN = re.compile(r"^\d{8}$")
+
+# HTTP status and response body
+CepResult = tuple[int, dict]
+
+INVALID_CEP: CepResult = (400, {"detail": "CEP invalido."})
+UPSTREAM_ERROR: CepResult = (502, {"detail": "Falha ao consultar o CEP."})
+UPSTREAM_UNAVAILABLE: CepResult = (
+    503,
+    {"detail": "Servico de CEP indisponivel. Tente novamente em instantes."},
+)
+
+# Seconds a shared CEP fetch may take beyond CEP_LOOKUP_DEADLINE
+SHARED_FETCH_MARGIN = 2
+
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+_memory_lock = threading.Lock()
+_memory_cache: "OrderedDict[str, tuple[int, dict, float]]" = OrderedDict()
+
+
+def normalize_cep(value: str) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def is_valid_cep(cep: str) -> bool:
+    return bool(CEP_PATTERN.match(cep))
+
+
+def clear_cep_memory_cache() -> None:
+    with _memory_lock:
+        _memory_cache.clear()
+
+
+def _memory_get(cep: str) -> Optional[CepResult]:
+    with _memory_lock:
+        entry = _memory_cache.get(cep)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del _memory_cache[cep]
+            return None
+        _memory_cache.move_to_end(cep)
+        return entry[0], entry[1]
+
+
+def _memory_set(cep: str, result: CepResult, ttl: float) -> None:
+    with _memory_lock:
+        _memory_cache[cep] = (result[0], result[1], time.time() + ttl)
+        _memory_cache.move_to_end(cep)
+        while len(_memory_cache) > settings.CEP_CACHE_MEMORY_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def build_cep_body(
+    cep: str,
+    street: str,
+    neighborhood: str,
+    city: str,
+    state: str,
+    latitude: Optional[float],
+    longitude: Optional[float],
+) -> dict:
+    address_line = ", ".join(filter(None, [street, neighborhood, f"{city}-{state}"]))
+    return {
+        "cep": cep,
+        "street": street,
+        "neighborhood": neighborhood,
+        "city": city,
+        "state": state,
+        "address": address_line,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+def _postal_code_body(postal_code: PostalCode) -> dict:
+    return build_cep_body(
+        cep=f"{postal_code.cep[:5]}-{postal_code.cep[5:]}",
+        street=postal_code.street,
+        neighborhood=postal_code.neighborhood,
+        city=postal_code.city,
+        state=postal_code.state,
+        latitude=postal_code.latitude,
+        longitude=postal_code.longitude,
+    )
+
+
+def search_postal_codes(prefix: str, limit: int) -> list[dict]:
+    """Gazetteer entries whose CEP starts with ``prefix`` (prefix index)."""
+    return [
+        _postal_code_body(postal_code)
+        for postal_code in PostalCode.objects.filter(cep__startswith=prefix)[:limit]
+    ]
+
+
+def get_cep_session() -> requests.Session:
+    """Keep-alive session shared by every CEP lookup in this process."""
+    global _session
+    if _session is None:
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=settings.CEP_LOOKUP_WORKERS,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = "EcoFleet/1.0"
+        _session = session
+    return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.CEP_LOOKUP_WORKERS,
+            thread_name_prefix="cep-lookup",
+        )
+    return _executor
+
+
+def _fetch_address(cep: str) -> Optional[dict]:
+    """ViaCEP answer, or None when the CEP does not exist."""
+
+    def request():
+        resp = get_cep_session().get(
+            f"https://viacep.com.br/ws/{cep}/json/",
+            timeout=settings.CEP_VIACEP_TIMEOUT,
+        )
+        if resp.status_code >= 500 or resp.status_code == 429:
+            resp.raise_for_status()
+        return resp
+
+    resp = get_upstream("viacep").call(request, wait=settings.UPSTREAM_MAX_WAIT)
+    if resp.status_code != 200:
+        return None
+    data = resp.json()
+    return None if data.get("erro") else data
+
+
+def _fetch_coordinates(cep: str) -> Optional[tuple[float, float]]:
+    def request():
+        resp = get_cep_session().get(
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                "format": "json",
+                "postalcode": cep,
+                "country": "Brazil",
+                "limit": 1,
+            },
+            timeout=settings.CEP_NOMINATIM_TIMEOUT,
+        )
+        if resp.status_code >= 500 or resp.status_code == 429:
+            resp.raise_for_status()
+        return resp
+
+    resp = get_upstream("nominatim").call(request, wait=settings.UPSTREAM_MAX_WAIT)
+    if resp.status_code != 200:
+        return None
+    results = resp.json()
+    if not results:
+        return None
+    return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+def fetch_cep(cep: str) -> tuple[CepResult, int]:
+    """
+    Ask ViaCEP for the address and Nominatim for the coordinates.
+
+    Both requests only need the CEP, so they run concurrently and share one
+    CEP_LOOKUP_DEADLINE: the worst case is the slower call, not their sum.
+
+    Returns the result and how long it may be cached: a full answer keeps
+    for CEP_CACHE_TTL, an unknown CEP or an address without coordinates for
+    CEP_CACHE_NEGATIVE_TTL and an upstream failure for CEP_CACHE_ERROR_TTL.
+    """
+    executor = _get_executor()
+    address_future = executor.submit(_fetch_address, cep)
+    coordinates_future = executor.submit(_fetch_coordinates, cep)
+    wait(
+        [address_future, coordinates_future],
+        timeout=settings.CEP_LOOKUP_DEADLINE,
+    )
+
+    if not address_future.done():
+        address_future.cancel()
+        coordinates_future.cancel()
+        return UPSTREAM_ERROR, settings.CEP_CACHE_ERROR_TTL
+    try:
+        data = address_future.result()
+    except UpstreamUnavailable:
+        # Circuit open or over the rate limit: fail fast, do not queue up
+        return UPSTREAM_UNAVAILABLE, settings.CEP_CACHE_ERROR_TTL
+    except (requests.RequestException, ValueError):
+        return UPSTREAM_ERROR, settings.CEP_CACHE_ERROR_TTL
+    if data is None:
+        return INVALID_CEP, settings.CEP_CACHE_NEGATIVE_TTL
+
+    lat = lon = None
+    if coordinates_future.done() and coordinates_future.exception() is None:
+        coordinates = coordinates_future.result()
+        if coordinates:
+            lat, lon = coordinates
+    else:
+        coordinates_future.cancel()
+
+    body = build_cep_body(
+        cep=data.get("cep", cep),
+        street=data.get("logradouro", ""),
+        neighborhood=data.get("bairro", ""),
+        city=data.get("localidade", ""),
+        state=data.get("uf", ""),
+        latitude=lat,
+        longitude=lon,
+    )
+    if lat is None:
+        # Geocoding is the flaky half: without coordinates, try again sooner
+        return (200, body), settings.CEP_CACHE_NEGATIVE_TTL
+    return (200, body), settings.CEP_CACHE_TTL
+
+
+def resolve_local_ceps(ceps: list[str]) -> dict[str, tuple[CepResult, str]]:
+    """
+    Answer what we can without upstream calls: the in-process LRU, then the
+    PostalCode gazetteer and the CepCache table, one query each.
+    """
+    found = {}
+    pending = []
+    for cep in ceps:
+        cached = _memory_get(cep)
+        if cached is not None:
+            found[cep] = (cached, CACHE_HIT)
+        else:
+            pending.append(cep)
+
+    if pending:
+        for postal_code in PostalCode.objects.filter(cep__in=pending):
+            result = (200, _postal_code_body(postal_code))
+            _memory_set(postal_code.cep, result, settings.CEP_CACHE_TTL)
+            found[postal_code.cep] = (result, CACHE_HIT_LOCAL)
+        pending = [cep for cep in pending if cep not in found]
+
+    if pending:
+        now = timezone.now()
+        for row in CepCache.objects.filter(cep__in=pending, expires_at__gt=now):
+            result = (row.status_code, row.payload)
+            _memory_set(row.cep, result, (row.expires_at - now).total_seconds())
+            found[row.cep] = (result, CACHE_HIT_DB)
+    return found
+
+
+def _fetch_and_store(cep: str) -> CepResult:
+    now = timezone.now()
+    with record_phase("upstream"):
+        result, ttl = fetch_cep(cep)
+    _memory_set(cep, result, ttl)
+    # Upstream errors are transient: keep them in memory only
+    if result[0] < 500:
+        CepCache.objects.update_or_create(
+            cep=cep,
+            defaults={
+                "status_code": result[0],
+                "payload": result[1],
+                "fetched_at": now,
+                "expires_at": now + timedelta(seconds=ttl),
+            },
+        )
+    return result
+
+
+def _shared_fetch_budget() -> int:
+    # fetch_cep returns within CEP_LOOKUP_DEADLINE; the margin covers storing
+    # the answer and a slow Redis round trip
+    return math.ceil(settings.CEP_LOOKUP_DEADLINE) + SHARED_FETCH_MARGIN
+
+
+def _fetch_shared(cep: str) -> CepResult:
+    """
+    Fetch a CEP once across processes: the first worker takes a Redis lock
+    and goes upstream, the others subscribe to its answer instead of calling
+    the same services again. The leader publishes every outcome, errors
+    included, so followers never wait past it. While Redis is unreachable
+    every worker fetches on its own.
+    """
+    if not redis_enabled():
+        return _fetch_and_store(cep)
+
+    client = get_redis()
+    lock_key = f"cep:inflight:{cep}"
+    result_key = f"cep:result:{cep}"
+    budget = _shared_fetch_budget()
+    try:
+        leader = client.set(lock_key, 1, nx=True, ex=budget)
+        if leader:
+            # Drop the previous leader's answer so followers wait for this one
+            client.delete(result_key)
+    except redis.RedisError:
+        logger.warning("Redis unavailable, fetching CEP %s directly", cep)
+        return _fetch_and_store(cep)
+
+    if leader:
+        result = UPSTREAM_ERROR
+        try:
+            result = _fetch_and_store(cep)
+            return result
+        finally:
+            _publish_result(client, lock_key, result_key, result, budget)
+
+    try:
+        payload = _wait_for_leader(client, result_key, budget)
+    except redis.RedisError:
+        logger.warning("Redis unavailable, fetching CEP %s directly", cep)
+        return _fetch_and_store(cep)
+    if payload is None:
+        # The leader died or is stuck; its lock expires with the budget
+        return UPSTREAM_ERROR
+    status_code, body = json.loads(payload)
+    return status_code, body
+
+
+def _publish_result(client, lock_key, result_key, result, budget) -> None:
+    payload = json.dumps(result)
+    try:
+        client.set(result_key, payload, ex=budget)
+        client.publish(result_key, payload)
+        client.delete(lock_key)
+    except redis.RedisError:
+        # Followers give up after the budget and the lock expires with it
+        logger.warning("Could not publish CEP result %s", result_key, exc_info=True)
+
+
+def _wait_for_leader(client, result_key: str, budget: float) -> Optional[bytes]:
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(result_key)
+        # The leader may have answered before we subscribed
+        payload = client.get(result_key)
+        give_up_at = time.monotonic() + budget
+        while payload is None:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = pubsub.get_message(timeout=remaining)
+            if message is not None:
+                payload = message["data"]
+        return payload
+    finally:
+        pubsub.close()
+
+
+def _fetch(cep: str) -> CepResult:
+    # Concurrent lookups of one CEP in this process share a single call
+    return coalesce(f"cep:{cep}", lambda: _fetch_shared(cep))
+
+
+class BatchTimeExceeded(Exception):
+    """A batch lookup could not finish within its time budget."""
+
+
+def wait_for_upstream_slot(until: Optional[float] = None) -> bool:
+    """
+    Block until this process may call the upstream services again. Slots are
+    claimed in the shared cache, so the CEP_UPSTREAM_RATE (lookups per
+    second) holds across every worker using the same cache; while the cache
+    is unreachable each process waits a full interval on its own. With
+    ``until`` (a time.monotonic() value) gives up and returns False instead
+    of waiting past it.
+    """
+    interval = 1 / settings.CEP_UPSTREAM_RATE
+    while True:
+        if until is not None and time.monotonic() > until:
+            return False
+        slot = int(time.time() / interval)
+        try:
+            claimed = cache.add(
+                f"cep:upstream-slot:{slot}", 1, timeout=int(interval) + 2
+            )
+        except redis.RedisError:
+            if until is not None and time.monotonic() + interval > until:
+                return False
+            time.sleep(interval)
+            return True
+        if claimed:
+            return True
+        delay = max(0.0, (slot + 1) * interval - time.time())
+        if until is not None and time.monotonic() + delay > until:
+            return False
+        time.sleep(delay)
+
+
+def lookup_cep(cep: str) -> tuple[CepResult, str]:
+    """
+    Resolve a normalized CEP through the in-process LRU, the local
+    PostalCode gazetteer, the CepCache table and finally the upstream
+    services. Returns the result and the cache status for the
+    X-Cache-Status header.
+    """
+    found = resolve_local_ceps([cep])
+    if cep in found:
+        return found[cep]
+    return _fetch(cep), CACHE_MISS
+
+
+def lookup_ceps(
+    ceps: list[str],
+    progress: Optional[Callable[[int, int], None]] = None,
+    time_budget: Optional[float] = None,
+) -> list[dict]:
+    """
+    Resolve many normalized CEPs: duplicates are looked up once, local
+    answers come from bulk queries and only the rest goes upstream, one at a
+    time under the global rate limit. ``progress(done, total)`` is called
+    after every upstream lookup.
+
+    With ``time_budget`` (seconds) raises BatchTimeExceeded rather than start
+    a lookup that might not finish in time; answers fetched so far stay
+    cached.
+    """
+    started = time.monotonic()
+    unique = list(dict.fromkeys(ceps))
+    found = resolve_local_ceps(unique)
+    missing = [cep for cep in unique if cep not in found]
+    last_start = None
+    if time_budget is not None:
+        last_start = started + time_budget - _shared_fetch_budget()
+    for done, cep in enumerate(missing, start=1):
+        if not wait_for_upstream_slot(until=last_start):
+            raise BatchTimeExceeded(f"{len(missing) - done + 1} CEPs left")
+        found[cep] = (_fetch(cep), CACHE_MISS)
+        if progress is not None:
+            progress(done, len(missing))
+
+    return [
+        {
+            "cep": cep,
+            "status": found[cep][0][0],
+            "cache": found[cep][1],
+            "data": found[cep][0][1],
+        }
+        for cep in unique
+    ]
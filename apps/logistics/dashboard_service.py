@@ -0,0 +1,118 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .caching import get_versions
+from .models import DeliveryOrder, DeliveryStatus, Driver, Garage, Vehicle
+
+# Orders change far too often to key on; DASHBOARD_CACHE_TTL bounds how
+# stale the order counts get
+SUMMARY_MODELS = (Vehicle, Driver, Garage)
+SUMMARY_CACHE_KEY = "dashboard:summary:{versions}"
+
+
+def _table(model) -> str:
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _exact_counts() -> dict:
+    """Every counter in one round trip; the order table is scanned once."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                (SELECT COUNT(*) FROM {_table(Vehicle)}),
+                (SELECT COUNT(*) FROM {_table(Driver)}),
+                orders.total,
+                orders.in_transit,
+                (SELECT COUNT(*) FROM {_table(Garage)})
+            FROM (
+                SELECT
+                    COUNT(*) AS total,
+                    COUNT(*) FILTER (WHERE status = %s) AS in_transit
+                FROM {_table(DeliveryOrder)}
+            ) AS orders
+            """,
+            [DeliveryStatus.IN_TRANSIT],
+        )
+        vehicles, drivers, orders, in_transit, garages = cursor.fetchone()
+    return {
+        "vehicles": vehicles,
+        "drivers": drivers,
+        "delivery_orders": orders,
+        "in_transit_orders": in_transit,
+        "garages": garages,
+    }
+
+
+def _estimated_order_counts() -> Optional[tuple[int, int]]:
+    """
+    Order total and in-transit count from planner statistics (pg_class and
+    pg_stats), or None when the table has not been analyzed yet.
+    """
+    table = DeliveryOrder._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.reltuples::bigint, s.most_common_vals::text::text[],
+                   s.most_common_freqs
+            FROM pg_class c
+            LEFT JOIN pg_stats s
+                ON s.schemaname = current_schema()
+                AND s.tablename = %s
+                AND s.attname = 'status'
+            WHERE c.oid = to_regclass(%s)
+            """,
+            [table, table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+
+    total, values, freqs = row
+    frequencies = dict(zip(values or [], freqs or []))
+    return total, round(total * frequencies.get(DeliveryStatus.IN_TRANSIT, 0))
+
+
+def _summary() -> dict:
+    threshold = settings.DASHBOARD_ESTIMATE_THRESHOLD
+    if threshold and connection.vendor == "postgresql":
+        estimate = _estimated_order_counts()
+        if estimate is not None and estimate[0] >= threshold:
+            # Small tables stay exact; only the order table is estimated
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT
+                        (SELECT COUNT(*) FROM {_table(Vehicle)}),
+                        (SELECT COUNT(*) FROM {_table(Driver)}),
+                        (SELECT COUNT(*) FROM {_table(Garage)})
+                    """
+                )
+                vehicles, drivers, garages = cursor.fetchone()
+            return {
+                "vehicles": vehicles,
+                "drivers": drivers,
+                "delivery_orders": estimate[0],
+                "in_transit_orders": estimate[1],
+                "garages": garages,
+                "estimated": True,
+            }
+    return {**_exact_counts(), "estimated": False}
+
+
+def dashboard_summary() -> dict:
+    """
+    Dashboard counters, cached until a vehicle, driver or garage changes
+    (version keys bumped by signals) or DASHBOARD_CACHE_TTL expires, which
+    is also how long the order counts may lag.
+    """
+    versions = "-".join(str(version) for version in get_versions(*SUMMARY_MODELS))
+    key = SUMMARY_CACHE_KEY.format(versions=versions)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summary()
+        cache.set(key, summary, timeout=settings.DASHBOARD_CACHE_TTL)
+    return summary
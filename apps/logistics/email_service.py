@@ -0,0 +1,179 @@
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .models import DeliveryOrder
+from .redis_client import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+STATUS_EMAIL_QUEUE = "emails:delivery-status"
+STATUS_EMAIL_FLUSH_LOCK = "emails:delivery-status:flush-scheduled"
+# Entries being sent by one flush; only deleted once SMTP accepted them
+STATUS_EMAIL_PROCESSING = "emails:delivery-status:processing:{flush_id}"
+# Sorted set of processing lists scored by flush start, so a flush can
+# requeue the lists of one that died mid-send
+STATUS_EMAIL_PROCESSING_INDEX = "emails:delivery-status:processing"
+
+STATUS_EMAIL_SUBJECT = "Atualizacao de entrega"
+
+
+def status_email_recipients(order: DeliveryOrder) -> list[str]:
+    return [settings.DEFAULT_FROM_EMAIL]
+
+
+def status_email_line(order: DeliveryOrder) -> str:
+    return (
+        f"Pedido #{order.id} para {order.client_name} mudou para "
+        f"status: {order.get_status_display()}."
+    )
+
+
+def queue_delivery_status_email(order_id: int) -> None:
+    """
+    Buffer a status email instead of sending it right away.
+
+    The first email of a window schedules a single flush EMAIL_BATCH_WINDOW
+    seconds later; everything queued until then goes out over one SMTP
+    connection. Without Redis, fall back to one task per email.
+    """
+    from .tasks import flush_delivery_status_emails, send_delivery_status_email
+
+    if not redis_enabled():
+        send_delivery_status_email.delay(order_id)
+        return
+
+    client = get_redis()
+    client.rpush(
+        STATUS_EMAIL_QUEUE, json.dumps({"order_id": order_id, "queued_at": time.time()})
+    )
+    window = settings.EMAIL_BATCH_WINDOW
+    # The lock outlives the window so a lost flush only delays, never strands, mail
+    if client.set(STATUS_EMAIL_FLUSH_LOCK, 1, nx=True, ex=window * 10):
+        flush_delivery_status_emails.apply_async(countdown=window)
+
+
+def _build_messages(orders_by_id: dict, order_ids: list[int]) -> list[EmailMessage]:
+    orders = [orders_by_id[pk] for pk in order_ids if pk in orders_by_id]
+    if not settings.EMAIL_DIGEST_MODE:
+        return [
+            EmailMessage(
+                subject=STATUS_EMAIL_SUBJECT,
+                body=status_email_line(order),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=status_email_recipients(order),
+            )
+            for order in orders
+        ]
+
+    lines_by_recipient = defaultdict(list)
+    for order in orders:
+        for recipient in status_email_recipients(order):
+            lines_by_recipient[recipient].append(status_email_line(order))
+    return [
+        EmailMessage(
+            subject=f"{STATUS_EMAIL_SUBJECT} ({len(lines)} pedidos)",
+            body="\n".join(lines),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient],
+        )
+        for recipient, lines in lines_by_recipient.items()
+    ]
+
+
+def _move(client, source: str, destination: str, count: int, src: str, dst: str):
+    # One round trip per batch of LMOVEs; each move is atomic on its own
+    batch_size = settings.EMAIL_BATCH_SIZE
+    for start in range(0, count, batch_size):
+        pipe = client.pipeline(transaction=False)
+        for _ in range(min(batch_size, count - start)):
+            pipe.lmove(source, destination, src, dst)
+        pipe.execute()
+
+
+def _requeue_stale(client) -> int:
+    # A flush still running after the flush lock would have expired is dead
+    stale_before = time.time() - settings.EMAIL_BATCH_WINDOW * 10
+    requeued = 0
+    stale = client.zrangebyscore(STATUS_EMAIL_PROCESSING_INDEX, "-inf", stale_before)
+    for key in stale:
+        count = client.llen(key)
+        # Older than anything queued, so back to the head in their original order
+        _move(client, key, STATUS_EMAIL_QUEUE, count, "RIGHT", "LEFT")
+        client.zrem(STATUS_EMAIL_PROCESSING_INDEX, key)
+        requeued += count
+    if requeued:
+        logger.warning("status emails: requeued %s entries of a dead flush", requeued)
+    return requeued
+
+
+def _send_entries(entries: list[dict], stats: dict) -> None:
+    batch_size = settings.EMAIL_BATCH_SIZE
+    now = time.time()
+    stats["max_wait_s"] = round(now - min(entry["queued_at"] for entry in entries), 3)
+    # Several transitions of the same order collapse into one email
+    order_ids = list(dict.fromkeys(entry["order_id"] for entry in entries))
+    orders_by_id = DeliveryOrder.objects.in_bulk(order_ids)
+
+    messages = _build_messages(orders_by_id, order_ids)
+
+    started = time.perf_counter()
+    with get_connection() as connection:
+        for start in range(0, len(messages), batch_size):
+            chunk = messages[start:start + batch_size]
+            stats["sent"] += connection.send_messages(chunk) or 0
+    stats["send_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def flush_status_email_queue() -> dict:
+    """
+    Drain the buffered status emails and send them over one connection.
+
+    The entries are moved to a list owned by this flush and only dropped
+    once SMTP accepted every message; if sending fails they go back to the
+    head of the queue and the error propagates so the task retries. Lists
+    left behind by a worker that died mid-send are requeued by the next
+    flush. A retry after a partial send may repeat some emails, never lose
+    them.
+
+    Returns the queue depth seen at flush time, how many messages were sent,
+    the oldest wait in the buffer and the time spent talking to SMTP.
+    """
+    client = get_redis()
+    # Release first: anything queued from now on schedules its own flush
+    client.delete(STATUS_EMAIL_FLUSH_LOCK)
+    _requeue_stale(client)
+    depth = client.llen(STATUS_EMAIL_QUEUE)
+
+    stats = {"queue_depth": depth, "sent": 0, "max_wait_s": 0.0, "send_ms": 0.0}
+    processing = STATUS_EMAIL_PROCESSING.format(flush_id=uuid.uuid4().hex)
+    client.zadd(STATUS_EMAIL_PROCESSING_INDEX, {processing: time.time()})
+    _move(client, STATUS_EMAIL_QUEUE, processing, depth, "LEFT", "RIGHT")
+    entries = [json.loads(raw) for raw in client.lrange(processing, 0, -1)]
+    if not entries:
+        client.zrem(STATUS_EMAIL_PROCESSING_INDEX, processing)
+        return stats
+
+    try:
+        _send_entries(entries, stats)
+    except Exception:
+        # Back to the head, in their original order, for the retry
+        _move(client, processing, STATUS_EMAIL_QUEUE, len(entries), "RIGHT", "LEFT")
+        client.zrem(STATUS_EMAIL_PROCESSING_INDEX, processing)
+        raise
+    client.delete(processing)
+    client.zrem(STATUS_EMAIL_PROCESSING_INDEX, processing)
+
+    logger.info(
+        "status emails: depth=%s sent=%s max_wait=%.1fs send=%.1fms",
+        stats["queue_depth"],
+        stats["sent"],
+        stats["max_wait_s"],
+        stats["send_ms"],
+    )
+    return stats
@@ -0,0 +1,148 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.logistics.models import (
+    DeliveryOrder,
+    DeliveryStatus,
+    Driver,
+    Garage,
+    Vehicle,
+    VehicleType,
+)
+from apps.logistics.readers import (
+    DeliveryOrderListReader,
+    GarageListReader,
+    VehicleListReader,
+)
+from apps.logistics.serializers import (
+    DeliveryOrderSerializer,
+    GarageSerializer,
+    VehicleSerializer,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara linhas/s das listagens de veiculos, garagens e ordens: "
+        "serializer DRF x leitor values(). Os dados gerados sao descartados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options["rows"])
+                self._run(options["repeat"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rows):
+        now = timezone.now()
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(username=f"bench-list-{index}", first_name="Motorista")
+            for index in range(100)
+        )
+        drivers = Driver.objects.bulk_create(
+            Driver(user=user, license_number=f"BENCH{index}")
+            for index, user in enumerate(users)
+        )
+        garages = Garage.objects.bulk_create(
+            Garage(
+                name=f"Garagem {index}",
+                address="Rua Principal",
+                capacity=10,
+                latitude=-23.5,
+                longitude=-46.6,
+            )
+            for index in range(rows)
+        )
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(
+                plate=f"B{index:07d}",
+                model="Furgao",
+                capacity_kg=1000,
+                type=VehicleType.VAN,
+                garage=garages[index % len(garages)],
+                last_location=Point(-46.6 + index * 1e-5, -23.5, srid=4326),
+            )
+            for index in range(rows)
+        )
+        statuses = DeliveryStatus.values
+        DeliveryOrder.objects.bulk_create(
+            DeliveryOrder(
+                client_name=f"Cliente {index}",
+                driver=drivers[index % len(drivers)] if index % 5 else None,
+                vehicle=vehicles[index % len(vehicles)],
+                pickup_location=Point(-46.63, -23.55 + index * 1e-5, srid=4326),
+                dropoff_location=Point(-46.60, -23.50, srid=4326),
+                status=statuses[index % len(statuses)],
+                deadline=now + timedelta(hours=index % 48),
+            )
+            for index in range(rows)
+        )
+
+    def _run(self, repeat):
+        request = Request(APIRequestFactory().get("/"))
+        cases = (
+            (
+                "veiculos",
+                Vehicle.objects.all(),
+                VehicleSerializer,
+                VehicleListReader(),
+            ),
+            ("garagens", Garage.objects.all(), GarageSerializer, GarageListReader()),
+            (
+                "ordens",
+                DeliveryOrder.objects.select_related("driver__user", "vehicle"),
+                DeliveryOrderSerializer,
+                DeliveryOrderListReader(),
+            ),
+        )
+        renderer = JSONRenderer()
+        self.stdout.write(
+            f"{'lista':<10}{'linhas':>9}{'serializer/s':>15}{'leitor/s':>12}"
+            f"{'ganho':>8}  paridade"
+        )
+        for name, queryset, serializer_class, reader in cases:
+            serializer_time, expected = self._best_of(
+                repeat,
+                lambda: serializer_class(
+                    queryset.all(), many=True, context={"request": request}
+                ).data,
+            )
+            reader_time, actual = self._best_of(
+                repeat, lambda: reader.build(reader.values(queryset.all()), request)
+            )
+            same = renderer.render(expected) == renderer.render(actual)
+            rows = len(actual)
+            self.stdout.write(
+                f"{name:<10}{rows:>9,}{rows / serializer_time:>15,.0f}"
+                f"{rows / reader_time:>12,.0f}{serializer_time / reader_time:>7.1f}x"
+                f"  {'ok' if same else 'DIFERENTE'}"
+            )
+
+    def _best_of(self, repeat, fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return best, result
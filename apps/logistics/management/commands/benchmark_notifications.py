@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.logistics.models import Notification
+from apps.logistics.views import NotificationViewSet
+
+BENCH_USER_PREFIX = "bench-notif-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula a tabela de notificacoes (COPY) e mede os endpoints de listagem "
+        "e mark-all-read. Use apenas em bancos de teste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--read-ratio", type=float, default=0.9)
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Reaproveita as linhas geradas por uma execucao anterior.",
+        )
+        parser.add_argument(
+            "--cleanup",
+            action="store_true",
+            help="Remove usuarios e notificacoes de benchmark ao final.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("O benchmark usa COPY e requer PostgreSQL.")
+
+        users = self._bench_users(options["users"])
+        if not options["skip_seed"]:
+            self._seed(users, options["rows"], options["read_ratio"])
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Notification._meta.db_table}")
+
+        total = Notification.objects.count()
+        self.stdout.write(f"Notificacoes na tabela: {total:,}")
+
+        factory = APIRequestFactory()
+        list_view = NotificationViewSet.as_view({"get": "list"})
+        mark_view = NotificationViewSet.as_view({"post": "mark_all_read"})
+        sample = random.sample(users, min(options["samples"], len(users)))
+
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            list_timings = self._time_requests(
+                sample, lambda: factory.get("/api/notifications/"), list_view
+            )
+            mark_timings = self._time_requests(
+                sample,
+                lambda: factory.post("/api/notifications/mark-all-read/"),
+                mark_view,
+            )
+
+        self._report("GET /api/notifications/", list_timings)
+        self._report("POST /api/notifications/mark-all-read/", mark_timings)
+        self._explain(sample[0])
+
+        if options["cleanup"]:
+            self._cleanup(users)
+
+    def _bench_users(self, count):
+        User = get_user_model()
+        existing = {
+            user.username: user
+            for user in User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+        }
+        missing = [
+            User(username=f"{BENCH_USER_PREFIX}{index}")
+            for index in range(count)
+            if f"{BENCH_USER_PREFIX}{index}" not in existing
+        ]
+        User.objects.bulk_create(missing, batch_size=1000)
+        return list(
+            User.objects.filter(username__startswith=BENCH_USER_PREFIX).order_by("id")
+        )
+
+    def _seed(self, users, rows, read_ratio):
+        table = Notification._meta.db_table
+        now = timezone.now()
+        user_ids = [user.id for user in users]
+        self.stdout.write(f"Gerando {rows:,} notificacoes ({len(users)} usuarios)...")
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            copy_sql = (
+                f"COPY {table} (user_id, title, body, is_read, created_at) FROM STDIN"
+            )
+            with cursor.cursor.copy(copy_sql) as copy:
+                for index in range(rows):
+                    copy.write_row(
+                        (
+                            user_ids[index % len(user_ids)],
+                            f"Benchmark #{index}",
+                            "Notificacao gerada pelo benchmark.",
+                            random.random() < read_ratio,
+                            now - timedelta(minutes=index % (365 * 24 * 60)),
+                        )
+                    )
+        self.stdout.write(f"COPY concluido em {time.perf_counter() - started:.1f}s")
+
+    def _time_requests(self, users, build_request, view):
+        timings = []
+        for user in users:
+            request = build_request()
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{label}: p50 {statistics.median(timings):.1f} ms | "
+            f"p95 {p95:.1f} ms | max {timings[-1]:.1f} ms"
+        )
+
+    def _explain(self, user):
+        queryset = Notification.objects.filter(user=user, is_read=False)
+        self.stdout.write("Plano (nao lidas por usuario):")
+        self.stdout.write(queryset.order_by("-created_at")[:10].explain())
+
+    def _cleanup(self, users):
+        user_ids = [user.id for user in users]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Notification._meta.db_table} WHERE user_id = ANY(%s)",
+                [user_ids],
+            )
+        get_user_model().objects.filter(id__in=user_ids).delete()
+        self.stdout.write(self.style.SUCCESS("Dados de benchmark removidos."))
@@ -0,0 +1,91 @@
+import io
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.logistics.models import DeliveryOrder, DeliveryStatus, Driver, Vehicle
+from apps.logistics.renderers import (
+    MessagePackParser,
+    MessagePackRenderer,
+    OrjsonParser,
+    OrjsonRenderer,
+)
+from apps.logistics.serializers import DeliveryOrderSerializer
+
+FORMATS = (
+    ("json (stdlib)", JSONRenderer(), JSONParser()),
+    ("json (orjson)", OrjsonRenderer(), OrjsonParser()),
+    ("msgpack", MessagePackRenderer(), MessagePackParser()),
+)
+
+
+def _best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara render/parse de uma lista de ordens serializadas em JSON "
+        "(stdlib e orjson) e MessagePack (sem banco)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        driver = Driver(
+            id=1,
+            user=get_user_model()(id=1, username="motorista"),
+            license_number="CNH0001",
+        )
+        vehicle = Vehicle(id=1, plate="ABC-1234", model="Furgao", capacity_kg=1000)
+        statuses = DeliveryStatus.values
+        orders = [
+            DeliveryOrder(
+                id=index,
+                client_name=f"Cliente {index} - Sao Paulo",
+                driver=driver,
+                vehicle=vehicle,
+                pickup_location=Point(-46.63 + index * 1e-5, -23.55, srid=4326),
+                dropoff_location=Point(-46.60, -23.50 - index * 1e-5, srid=4326),
+                status=statuses[index % len(statuses)],
+                deadline=now + timedelta(hours=index % 48),
+                created_at=now - timedelta(minutes=index),
+                updated_at=now,
+            )
+            for index in range(options["orders"])
+        ]
+
+        serialize_time, data = _best_of(
+            options["repeat"], lambda: DeliveryOrderSerializer(orders, many=True).data
+        )
+        self.stdout.write(
+            f"{len(orders)} ordens serializadas em {serialize_time * 1000:.1f} ms"
+        )
+        self.stdout.write(
+            f"{'formato':<16}{'render ms':>11}{'parse ms':>10}{'bytes':>11}"
+        )
+        for name, renderer, parser in FORMATS:
+            render_time, payload = _best_of(
+                options["repeat"], lambda: renderer.render(data)
+            )
+            parse_time, _ = _best_of(
+                options["repeat"], lambda: parser.parse(io.BytesIO(payload))
+            )
+            self.stdout.write(
+                f"{name:<16}{render_time * 1000:>11.1f}{parse_time * 1000:>10.1f}"
+                f"{len(payload):>11,}"
+            )
@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from pywebpush import webpush
+
+from apps.logistics.models import PushSubscription
+from apps.logistics.notification_service import clear_vapid_cache, send_push
+
+PUSH_HOSTS = (
+    "https://fcm.googleapis.com/fcm/send",
+    "https://updates.push.services.mozilla.com/wpush/v2",
+    "https://web.push.apple.com",
+)
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+class _FakeResponse:
+    status_code = 201
+    reason = "Created"
+    text = ""
+
+
+class _FakeSession:
+    """Stands in for the push services so only local CPU work is measured."""
+
+    def post(self, *args, **kwargs):
+        return _FakeResponse()
+
+
+class Command(BaseCommand):
+    help = "Mede pushes/s com e sem o cache de assinatura VAPID (sem rede)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscriptions", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = options["subscriptions"]
+        receiver = ec.generate_private_key(ec.SECP256R1())
+        p256dh = _b64url(
+            receiver.public_key().public_bytes(
+                serialization.Encoding.X962,
+                serialization.PublicFormat.UncompressedPoint,
+            )
+        )
+        subscriptions = [
+            PushSubscription(
+                id=index,
+                endpoint=f"{PUSH_HOSTS[index % len(PUSH_HOSTS)]}/{index}",
+                p256dh=p256dh,
+                auth=_b64url(os.urandom(16)),
+            )
+            for index in range(total)
+        ]
+
+        private_key = settings.WEBPUSH_VAPID_PRIVATE_KEY
+        if not private_key:
+            vapid = ec.generate_private_key(ec.SECP256R1())
+            raw_key = vapid.private_numbers().private_value.to_bytes(32, "big")
+            private_key = _b64url(raw_key)
+
+        payload = json.dumps({"title": "Benchmark", "body": "x" * 120, "url": "/"})
+        session = _FakeSession()
+        contact = settings.WEBPUSH_VAPID_ADMIN_EMAIL
+
+        with override_settings(WEBPUSH_VAPID_PRIVATE_KEY=private_key):
+            started = time.perf_counter()
+            for subscription in subscriptions:
+                webpush(
+                    subscription_info={
+                        "endpoint": subscription.endpoint,
+                        "keys": {
+                            "p256dh": subscription.p256dh,
+                            "auth": subscription.auth,
+                        },
+                    },
+                    data=payload,
+                    vapid_private_key=private_key,
+                    vapid_claims={"sub": f"mailto:{contact}"},
+                    requests_session=session,
+                )
+            uncached = time.perf_counter() - started
+
+            clear_vapid_cache()
+            started = time.perf_counter()
+            for subscription in subscriptions:
+                send_push(subscription, payload, session)
+            cached = time.perf_counter() - started
+
+        self.stdout.write(f"Inscricoes: {total} ({len(PUSH_HOSTS)} servicos de push)")
+        self.stdout.write(f"Sem cache VAPID: {total / uncached:,.0f} pushes/s")
+        self.stdout.write(f"Com cache VAPID: {total / cached:,.0f} pushes/s")
+        self.stdout.write(self.style.SUCCESS(f"Ganho: {uncached / cached:.2f}x"))
@@ -0,0 +1,148 @@
+import csv
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.logistics.models import CepCache, PostalCode
+
+COLUMNS = ("cep", "street", "neighborhood", "city", "state", "latitude", "longitude")
+REQUIRED_COLUMNS = {"cep", "city", "state"}
+STAGING_TABLE = "postal_code_staging"
+
+
+class Command(BaseCommand):
+    help = (
+        "Carrega a base local de CEPs (CSV ou Parquet) via COPY. Colunas: "
+        "cep, street, neighborhood, city, state, latitude, longitude."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "parquet"],
+            help="Padrao: deduzido pela extensao do arquivo.",
+        )
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help="Apaga a base atual antes de carregar.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("A carga usa COPY e requer PostgreSQL.")
+
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Arquivo nao encontrado: {path}")
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in ("csv", "parquet"):
+            raise CommandError("Use --format csv ou --format parquet.")
+
+        started = time.perf_counter()
+        table = PostalCode._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ("
+                "cep text, street text, neighborhood text, city text, state text, "
+                "latitude double precision, longitude double precision"
+                ") ON COMMIT DROP"
+            )
+            if file_format == "csv":
+                self._copy_csv(cursor, path)
+            else:
+                self._copy_parquet(cursor, path)
+
+            if options["truncate"]:
+                cursor.execute(f"TRUNCATE {table}")
+
+            # Normalize CEPs, keep one row per CEP and upsert so reloads
+            # refresh existing entries
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({", ".join(COLUMNS)})
+                SELECT DISTINCT ON (digits)
+                    digits,
+                    coalesce(street, ''),
+                    coalesce(neighborhood, ''),
+                    city,
+                    upper(state),
+                    latitude,
+                    longitude
+                FROM (
+                    SELECT *, regexp_replace(cep, '\\D', '', 'g') AS digits
+                    FROM {STAGING_TABLE}
+                ) AS staged
+                WHERE length(digits) = 8 AND city IS NOT NULL AND state IS NOT NULL
+                ORDER BY digits
+                ON CONFLICT (cep) DO UPDATE SET
+                    street = EXCLUDED.street,
+                    neighborhood = EXCLUDED.neighborhood,
+                    city = EXCLUDED.city,
+                    state = EXCLUDED.state,
+                    latitude = EXCLUDED.latitude,
+                    longitude = EXCLUDED.longitude
+                """
+            )
+            loaded = cursor.rowcount
+
+            # Cached upstream answers (including misses) are now superseded
+            cursor.execute(
+                f"DELETE FROM {CepCache._meta.db_table} WHERE cep IN ("
+                f"SELECT regexp_replace(cep, '\\D', '', 'g') FROM {STAGING_TABLE})"
+            )
+            cursor.execute(f"ANALYZE {table}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{loaded:,} CEPs carregados em {time.perf_counter() - started:.1f}s."
+            )
+        )
+
+    def _columns(self, header):
+        columns = [name.strip().lower() for name in header]
+        missing = REQUIRED_COLUMNS - set(columns)
+        unknown = set(columns) - set(COLUMNS)
+        if missing or unknown:
+            raise CommandError(
+                f"Colunas invalidas (faltando: {sorted(missing)}, "
+                f"desconhecidas: {sorted(unknown)})."
+            )
+        return columns
+
+    def _copy_csv(self, cursor, path):
+        with path.open(newline="", encoding="utf-8") as handle:
+            columns = self._columns(next(csv.reader(handle)))
+        copy_sql = (
+            f"COPY {STAGING_TABLE} ({', '.join(columns)}) "
+            "FROM STDIN WITH (FORMAT csv, HEADER true)"
+        )
+        with path.open("rb") as handle, cursor.cursor.copy(copy_sql) as copy:
+            while chunk := handle.read(1024 * 1024):
+                copy.write(chunk)
+
+    def _copy_parquet(self, cursor, path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise CommandError(
+                "Instale pyarrow para carregar arquivos Parquet."
+            ) from exc
+
+        parquet = pq.ParquetFile(path)
+        columns = self._columns(parquet.schema_arrow.names)
+        copy_sql = f"COPY {STAGING_TABLE} ({', '.join(columns)}) FROM STDIN"
+        cep_index = columns.index("cep")
+        with cursor.cursor.copy(copy_sql) as copy:
+            for batch in parquet.iter_batches(columns=columns):
+                values = [batch.column(name).to_pylist() for name in columns]
+                # Dumps that store CEPs as integers drop the leading zeros
+                values[cep_index] = [
+                    None if value is None else str(value).zfill(8)
+                    for value in values[cep_index]
+                ]
+                for row in zip(*values):
+                    copy.write_row(row)
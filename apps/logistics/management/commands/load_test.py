@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+# The calls every open browser repeats: map poll, dashboard and app load
+DEFAULT_PATHS = (
+    "/api/vehicles/",
+    "/api/garages/",
+    "/api/dashboard-summary/",
+    "/api/me/",
+    "/api/delivery-orders/",
+)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera carga HTTP contra uma instancia em execucao e mede req/s e "
+        "latencias (p50/p95/p99) por endpoint. Rode com os mesmos parametros "
+        "contra o perfil de desenvolvimento e o de producao para comparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=30.0)
+        parser.add_argument(
+            "--warmup",
+            type=float,
+            default=5.0,
+            help="Segundos de carga descartados antes da medicao.",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Endpoint a exercitar (repita a opcao; padrao: os da tela inicial).",
+        )
+        parser.add_argument("--label", default="", help="Nome do cenario no relatorio.")
+        parser.add_argument(
+            "--json", dest="json_path", help="Salva o resultado em JSON."
+        )
+
+    def handle(self, *args, **options):
+        base_url = options["url"]
+        paths = options["paths"] or list(DEFAULT_PATHS)
+        resp = requests.post(
+            urljoin(base_url, "/api/token/"),
+            json={"username": options["username"], "password": options["password"]},
+            timeout=10,
+        )
+        if resp.status_code != 200:
+            raise CommandError(f"Falha ao obter token ({resp.status_code}).")
+        headers = {"Authorization": f"Bearer {resp.json()['access']}"}
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        started = time.monotonic()
+        measure_from = started + options["warmup"]
+        stop_at = measure_from + options["duration"]
+
+        def client(worker):
+            # One keep-alive session per simulated browser
+            session = requests.Session()
+            session.headers.update(headers)
+            index = worker
+            while True:
+                now = time.monotonic()
+                if now >= stop_at:
+                    return
+                path = paths[index % len(paths)]
+                index += 1
+                try:
+                    ok = session.get(urljoin(base_url, path), timeout=30).ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.monotonic() - now
+                if now < measure_from:
+                    continue
+                with lock:
+                    if ok:
+                        latencies[path].append(elapsed)
+                    else:
+                        errors[path] += 1
+
+        self.stdout.write(
+            f"{options['concurrency']} clientes por {options['duration']:.0f}s "
+            f"(+{options['warmup']:.0f}s de aquecimento) em {base_url}..."
+        )
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(client, range(options["concurrency"])))
+
+        duration = options["duration"]
+        report = {"label": options["label"], "url": base_url, "endpoints": {}}
+        all_latencies = []
+        for path in paths:
+            values = latencies[path]
+            all_latencies.extend(values)
+            report["endpoints"][path] = self._stats(values, errors[path], duration)
+        report["total"] = self._stats(all_latencies, sum(errors.values()), duration)
+
+        self.stdout.write(
+            f"{'endpoint':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'erros':>7}"
+        )
+        for path, stats in [*report["endpoints"].items(), ("total", report["total"])]:
+            self.stdout.write(
+                f"{path:<28}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+                f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['errors']:>7}"
+            )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as handle:
+                json.dump(report, handle, indent=2)
+
+    def _stats(self, values, errors, duration):
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "rps": len(values) / duration,
+            "p50_ms": _percentile(values, 0.50) * 1000,
+            "p95_ms": _percentile(values, 0.95) * 1000,
+            "p99_ms": _percentile(values, 0.99) * 1000,
+        }
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.logistics.analytics import recompute_days
+from apps.logistics.models import OrderRollupDirtyDay
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os consolidados diarios de ordens num intervalo de dias "
+        "(carga inicial ou correcao apos updates em massa)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Data final (AAAA-MM-DD).")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Sem --from: quantos dias para tras a partir de --to (padrao: 365).",
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=31,
+            help="Dias recalculados por transacao.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            end = (
+                date.fromisoformat(options["end"])
+                if options["end"]
+                else timezone.localdate()
+            )
+            start = (
+                date.fromisoformat(options["start"])
+                if options["start"]
+                else end - timedelta(days=options["days"] - 1)
+            )
+        except ValueError as exc:
+            raise CommandError(f"Data invalida: {exc}") from exc
+        if start > end:
+            raise CommandError("--from deve ser anterior a --to.")
+
+        total = (end - start).days + 1
+        days = [start + timedelta(days=offset) for offset in range(total)]
+        rows = 0
+        for index in range(0, len(days), options["chunk"]):
+            chunk = days[index:index + options["chunk"]]
+            rows += recompute_days(chunk)
+            OrderRollupDirtyDay.objects.filter(day__in=chunk).delete()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(days)} dias recalculados ({start} a {end}), {rows} linhas."
+            )
+        )
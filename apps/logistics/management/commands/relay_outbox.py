@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.logistics.outbox import pending_event_lag, relay_pending_events
+
+
+class Command(BaseCommand):
+    help = "Publica os eventos pendentes da outbox (notificacoes e emails de status)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_POLL_INTERVAL,
+            help="Espera (s) quando a fila esta vazia.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Esvazia a fila uma vez e sai.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        self.stdout.write(self.style.MIGRATE_HEADING("Relay da outbox iniciado..."))
+
+        while True:
+            stats = relay_pending_events(batch_size)
+            handled = sum(stats.values())
+            if stats["published"] or stats["failed"] or stats["dead"]:
+                self.stdout.write(
+                    f"publicados={stats['published']} falhas={stats['failed']} "
+                    f"adiados={stats['deferred']} esgotados={stats['dead']} "
+                    f"atraso={pending_event_lag():.1f}s"
+                )
+            # A full batch that made progress means more is waiting
+            if handled >= batch_size and (stats["published"] or stats["dead"]):
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
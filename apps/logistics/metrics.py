@@ -0,0 +1,342 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Queries and upstream calls are short; requests may wait on upstreams
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+# Tasks may sit in the queue for minutes when the workers fall behind
+TASK_BUCKETS = (
+    0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent answering a request, per route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_PHASE = Histogram(
+    "http_request_phase_seconds",
+    "Time of sampled requests spent in SQL, upstream HTTP, rendering and "
+    "the rest of the app (views and serializers).",
+    ["route", "phase"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL queries run by sampled requests.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a task (or its ETA) and a worker starting it.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Time a worker spent running a task, per final state.",
+    ["task", "state"],
+    buckets=TASK_BUCKETS,
+)
+TASK_RETRIES = Counter(
+    "celery_task_retries", "Task retries requested.", ["task"]
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures", "Tasks that raised.", ["task"]
+)
+
+UNMATCHED_ROUTE = "unmatched"
+# Message header carrying the publish time (epoch seconds)
+ENQUEUED_AT_HEADER = "enqueued_at"
+QUEUE_DEPTH_CACHE_KEY = "metrics:queue-depth"
+
+
+class RequestTiming:
+    """Per-request accumulator; only sampled requests time their phases."""
+
+    __slots__ = ("started", "sampled", "queries", "phases")
+
+    def __init__(self, sampled: bool):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.queries = 0
+        self.phases = {"db": 0.0, "upstream": 0.0, "render": 0.0}
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar(
+    "request_timing", default=None
+)
+
+
+def start_request() -> tuple[RequestTiming, object]:
+    rate = settings.METRICS_SAMPLE_RATE
+    timing = RequestTiming(sampled=rate >= 1 or random.random() < rate)
+    return timing, _current.set(timing)
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    timing = _current.get()
+    if timing is None or not timing.sampled:
+        return None
+    return timing
+
+
+@contextmanager
+def record_phase(phase: str):
+    """Add the time spent in the block to ``phase`` of the sampled request."""
+    timing = current_timing()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[phase] += time.perf_counter() - started
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = current_timing()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.phases["db"] += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs) -> None:
+    """
+    connection_created receiver: time every query of sampled requests.
+    Unsampled requests pay one context variable lookup per query.
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def route_name(request) -> str:
+    # URL names keep the label set small (no ids in the label)
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.view_name:
+        return UNMATCHED_ROUTE
+    return match.view_name
+
+
+def observe_request(request, response, timing: RequestTiming) -> None:
+    total = time.perf_counter() - timing.started
+    route = route_name(request)
+    REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(total)
+    if not timing.sampled:
+        return
+
+    phases = dict(timing.phases)
+    # What is left is Python time in views, serializers and middleware
+    phases["app"] = max(0.0, total - sum(phases.values()))
+    for phase, seconds in phases.items():
+        REQUEST_PHASE.labels(route, phase).observe(seconds)
+    REQUEST_QUERIES.labels(route).observe(timing.queries)
+
+    if settings.METRICS_SERVER_TIMING:
+        entries = [
+            f'db;dur={phases["db"] * 1000:.1f};desc="{timing.queries} queries"',
+            f'upstream;dur={phases["upstream"] * 1000:.1f}',
+            f'render;dur={phases["render"] * 1000:.1f}',
+            f'app;dur={phases["app"] * 1000:.1f}',
+            f"total;dur={total * 1000:.1f}",
+        ]
+        response["Server-Timing"] = ", ".join(entries)
+
+
+_started_at: dict[str, float] = {}
+_started_at_lock = threading.Lock()
+
+
+def _stamp_enqueued(headers=None, **kwargs) -> None:
+    # before_task_publish: runs in the publisher (web, beat or a worker)
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+def _task_started(task_id=None, task=None, **kwargs) -> None:
+    now = time.time()
+    with _started_at_lock:
+        _started_at[task_id] = time.perf_counter()
+
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        # Eager calls and messages published before the header existed
+        return
+    ready_at = float(enqueued_at)
+    if task.request.eta:
+        # Countdowns and retries are not backlog: measure from the ETA
+        ready_at = max(ready_at, datetime.fromisoformat(task.request.eta).timestamp())
+    TASK_QUEUE_WAIT.labels(task.name).observe(max(0.0, now - ready_at))
+
+
+def _task_finished(task_id=None, task=None, state=None, **kwargs) -> None:
+    with _started_at_lock:
+        started = _started_at.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+def _task_retried(sender=None, **kwargs) -> None:
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+def _task_failed(sender=None, **kwargs) -> None:
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+def _serve_worker_metrics(**kwargs) -> None:
+    # worker_init: runs in the main worker process, before the pool forks
+    port = settings.METRICS_CELERY_PORT
+    if port:
+        reset_multiprocess_dir()
+        start_http_server(port, registry=metrics_registry())
+
+
+def _worker_process_exited(pid=None, **kwargs) -> None:
+    mark_process_dead(pid)
+
+
+def connect_task_signals() -> None:
+    """Instrument the task lifecycle; called from LogisticsConfig.ready()."""
+    from celery import signals
+
+    signals.before_task_publish.connect(_stamp_enqueued, weak=False)
+    signals.task_prerun.connect(_task_started, weak=False)
+    signals.task_postrun.connect(_task_finished, weak=False)
+    signals.task_retry.connect(_task_retried, weak=False)
+    signals.task_failure.connect(_task_failed, weak=False)
+    signals.worker_init.connect(_serve_worker_metrics, weak=False)
+    signals.worker_process_shutdown.connect(_worker_process_exited, weak=False)
+
+
+def sample_queue_depths() -> dict[str, int]:
+    """
+    Messages waiting in each of METRICS_QUEUE_NAMES, read from the broker.
+    Samples are shared through the cache for METRICS_QUEUE_SAMPLE_INTERVAL
+    seconds so concurrent scrapes do not all hit the broker. Queues that
+    cannot be read are left out.
+    """
+    names = settings.METRICS_QUEUE_NAMES
+    if not names:
+        return {}
+    depths = cache.get(QUEUE_DEPTH_CACHE_KEY)
+    if depths is not None:
+        return depths
+
+    from config.celery import app
+
+    depths = {}
+    try:
+        with app.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1)
+            channel = connection.default_channel
+            for name in names:
+                try:
+                    depths[name] = channel.queue_declare(
+                        queue=name, passive=True
+                    ).message_count
+                except connection.channel_errors:
+                    # Not declared yet: no worker consumed it, nothing queued
+                    depths[name] = 0
+    except Exception:
+        logger.warning("Could not sample broker queue depths", exc_info=True)
+        return depths
+    cache.set(
+        QUEUE_DEPTH_CACHE_KEY, depths, timeout=settings.METRICS_QUEUE_SAMPLE_INTERVAL
+    )
+    return depths
+
+
+class QueueDepthCollector:
+    """Broker backlog per queue, sampled at scrape time."""
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "celery_queue_length",
+            "Messages waiting in the broker queue.",
+            labels=["queue"],
+        )
+        for name, depth in sample_queue_depths().items():
+            gauge.add_metric([name], depth)
+        yield gauge
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to expose. Under gunicorn or prefork Celery every process writes
+    its samples to PROMETHEUS_MULTIPROC_DIR and they are merged here; the
+    queue depth is added at scrape time either way.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultRegistry())
+    registry.register(QueueDepthCollector())
+    return registry
+
+
+class _DefaultRegistry:
+    # Lets the process-wide registry be combined with scrape-time collectors
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def export_metrics() -> tuple[bytes, str]:
+    """Exposition payload and content type for the /metrics view."""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def reset_multiprocess_dir() -> None:
+    """Empty PROMETHEUS_MULTIPROC_DIR before the first process writes to it."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def mark_process_dead(pid: int) -> None:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
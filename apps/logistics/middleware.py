@@ -0,0 +1,61 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import current_timing, end_request, observe_request, start_request
+
+
+class RequestMetricsMiddleware:
+    """
+    Per-route latency histograms for every request; sampled requests
+    (METRICS_SAMPLE_RATE) also record SQL, upstream HTTP and render time
+    and get a Server-Timing header. Keep it first in MIDDLEWARE.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        timing, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        observe_request(request, response, timing)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        timing, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        observe_request(request, response, timing)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before DRF renders the response body
+        timing = current_timing()
+        if timing is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                timing.phases["render"] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("logistics", "0010_alter_pushsubscription_endpoint_and_constraint"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at"],
+                name="notif_user_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["user", "created_at"],
+                name="notif_unread_user_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", True)),
+                fields=["created_at"],
+                name="notif_read_created_idx",
+            ),
+        ),
+        migrations.CreateModel(
+            name="NotificationArchive",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("original_id", models.BigIntegerField(unique=True, verbose_name="ID original")),
+                ("title", models.CharField(max_length=200, verbose_name="Titulo")),
+                ("body", models.TextField(blank=True, verbose_name="Mensagem")),
+                ("order_id", models.BigIntegerField(blank=True, null=True, verbose_name="Ordem de Entrega")),
+                ("created_at", models.DateTimeField(verbose_name="Criada em")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Arquivada em")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_notifications",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuario",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notificacao arquivada",
+                "verbose_name_plural": "Notificacoes arquivadas",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
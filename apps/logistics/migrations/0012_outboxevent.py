@@ -0,0 +1,72 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0011_notification_indexes_and_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("aggregate_type", models.CharField(max_length=50, verbose_name="Agregado")),
+                ("aggregate_id", models.BigIntegerField(verbose_name="ID do agregado")),
+                ("event_type", models.CharField(max_length=100, verbose_name="Evento")),
+                (
+                    "payload",
+                    models.JSONField(blank=True, default=dict, verbose_name="Dados"),
+                ),
+                (
+                    "dedup_key",
+                    models.CharField(
+                        max_length=255,
+                        unique=True,
+                        verbose_name="Chave de deduplicacao",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Tentativas"),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, default="", verbose_name="Ultimo erro"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "published_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Publicado em"),
+                ),
+            ],
+            options={
+                "verbose_name": "Evento de saida",
+                "verbose_name_plural": "Eventos de saida",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("published_at__isnull", True)),
+                        fields=["id"],
+                        name="outbox_pending_idx",
+                    ),
+                    models.Index(
+                        fields=["aggregate_type", "aggregate_id", "id"],
+                        name="outbox_aggregate_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
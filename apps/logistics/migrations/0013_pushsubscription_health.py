@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0012_outboxevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pushsubscription",
+            name="failure_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Falhas consecutivas"
+            ),
+        ),
+        migrations.AddField(
+            model_name="pushsubscription",
+            name="last_success_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Ultimo envio"),
+        ),
+        migrations.AddField(
+            model_name="pushsubscription",
+            name="last_failure_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Ultima falha"),
+        ),
+        migrations.AddField(
+            model_name="pushsubscription",
+            name="last_latency_ms",
+            field=models.FloatField(blank=True, null=True, verbose_name="Latencia (ms)"),
+        ),
+        migrations.AddField(
+            model_name="pushsubscription",
+            name="quarantined_until",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Quarentena ate"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0013_pushsubscription_health"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CepCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cep", models.CharField(max_length=8, unique=True, verbose_name="CEP")),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(verbose_name="Status HTTP"),
+                ),
+                ("payload", models.JSONField(default=dict, verbose_name="Resposta")),
+                ("fetched_at", models.DateTimeField(verbose_name="Consultado em")),
+                ("expires_at", models.DateTimeField(verbose_name="Expira em")),
+            ],
+            options={
+                "verbose_name": "Cache de CEP",
+                "verbose_name_plural": "Cache de CEPs",
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0014_cepcache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostalCode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cep", models.CharField(max_length=8, unique=True, verbose_name="CEP")),
+                (
+                    "street",
+                    models.CharField(
+                        blank=True, default="", max_length=255, verbose_name="Logradouro"
+                    ),
+                ),
+                (
+                    "neighborhood",
+                    models.CharField(
+                        blank=True, default="", max_length=150, verbose_name="Bairro"
+                    ),
+                ),
+                ("city", models.CharField(max_length=150, verbose_name="Cidade")),
+                ("state", models.CharField(max_length=2, verbose_name="UF")),
+                (
+                    "latitude",
+                    models.FloatField(blank=True, null=True, verbose_name="Latitude"),
+                ),
+                (
+                    "longitude",
+                    models.FloatField(blank=True, null=True, verbose_name="Longitude"),
+                ),
+            ],
+            options={
+                "verbose_name": "CEP",
+                "verbose_name_plural": "CEPs",
+                "ordering": ["cep"],
+                "indexes": [
+                    models.Index(
+                        fields=["cep"],
+                        name="postal_code_cep_prefix_idx",
+                        opclasses=["varchar_pattern_ops"],
+                    )
+                ],
+            },
+        ),
+    ]
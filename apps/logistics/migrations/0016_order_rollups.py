@@ -0,0 +1,90 @@
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("logistics", "0015_postalcode"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="deliveryorder",
+            index=models.Index(fields=["created_at"], name="order_created_at_idx"),
+        ),
+        migrations.CreateModel(
+            name="DailyOrderRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="Dia")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("in_transit", "Em transito"),
+                            ("delivered", "Entregue"),
+                            ("cancelled", "Cancelado"),
+                        ],
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("orders", models.PositiveIntegerField(default=0, verbose_name="Ordens")),
+                (
+                    "driver",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="logistics.driver",
+                        verbose_name="Motorista",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Consolidado diario de ordens",
+                "verbose_name_plural": "Consolidados diarios de ordens",
+                "ordering": ["day"],
+                "indexes": [
+                    models.Index(
+                        fields=["day", "driver", "status"], name="rollup_day_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderRollupDirtyDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True, verbose_name="Dia")),
+                ("marked_at", models.DateTimeField(auto_now=True, verbose_name="Marcado em")),
+            ],
+            options={
+                "verbose_name": "Dia pendente de consolidacao",
+                "verbose_name_plural": "Dias pendentes de consolidacao",
+            },
+        ),
+    ]
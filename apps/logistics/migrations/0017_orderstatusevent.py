@@ -0,0 +1,136 @@
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "logistics_orderstatusevent"
+
+STATUS_CHOICES = [
+    ("pending", "Pendente"),
+    ("in_transit", "Em transito"),
+    ("delivered", "Entregue"),
+    ("cancelled", "Cancelado"),
+]
+
+CREATE_TABLE = f"""
+CREATE TABLE {TABLE} (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    order_id bigint NOT NULL,
+    driver_id bigint NULL,
+    from_status varchar(20) NOT NULL,
+    to_status varchar(20) NOT NULL,
+    changed_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT;
+CREATE INDEX status_event_order_idx ON {TABLE} (order_id, changed_at);
+CREATE INDEX status_event_status_idx ON {TABLE} (to_status, changed_at);
+"""
+
+
+def create_initial_partitions(apps, schema_editor):
+    # Current month and the next two; the beat task keeps extending this
+    today = date.today()
+    year, month = today.year, today.month
+    with schema_editor.connection.cursor() as cursor:
+        for _ in range(3):
+            next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE}_p{year}{month:02d} "
+                f"PARTITION OF {TABLE} FOR VALUES FROM "
+                f"('{year}-{month:02d}-01 00:00+00') "
+                f"TO ('{next_year}-{next_month:02d}-01 00:00+00')"
+            )
+            year, month = next_year, next_month
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0016_order_rollups"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="OrderStatusEvent",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "from_status",
+                            models.CharField(
+                                blank=True,
+                                choices=STATUS_CHOICES,
+                                max_length=20,
+                                verbose_name="Status anterior",
+                            ),
+                        ),
+                        (
+                            "to_status",
+                            models.CharField(
+                                choices=STATUS_CHOICES,
+                                max_length=20,
+                                verbose_name="Novo status",
+                            ),
+                        ),
+                        (
+                            "changed_at",
+                            models.DateTimeField(verbose_name="Alterado em"),
+                        ),
+                        (
+                            "driver",
+                            models.ForeignKey(
+                                blank=True,
+                                db_constraint=False,
+                                null=True,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="+",
+                                to="logistics.driver",
+                                verbose_name="Motorista",
+                            ),
+                        ),
+                        (
+                            "order",
+                            models.ForeignKey(
+                                db_constraint=False,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="status_events",
+                                to="logistics.deliveryorder",
+                                verbose_name="Ordem",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "verbose_name": "Historico de status",
+                        "verbose_name_plural": "Historicos de status",
+                        "ordering": ["order", "changed_at"],
+                        "indexes": [
+                            models.Index(
+                                fields=["order", "changed_at"],
+                                name="status_event_order_idx",
+                            ),
+                            models.Index(
+                                fields=["to_status", "changed_at"],
+                                name="status_event_status_idx",
+                            ),
+                        ],
+                    },
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE, reverse_sql=f"DROP TABLE {TABLE}"),
+                migrations.RunPython(
+                    create_initial_partitions, migrations.RunPython.noop
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("logistics", "0017_orderstatusevent"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="deliveryorder",
+            index=models.Index(
+                fields=["driver", "status"], name="order_driver_status_idx"
+            ),
+        ),
+    ]
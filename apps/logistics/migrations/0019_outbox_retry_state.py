@@ -0,0 +1,44 @@
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("logistics", "0018_deliveryorder_driver_status_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Proxima tentativa"
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxevent",
+            name="failed_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Falhou em"),
+        ),
+        RemoveIndexConcurrently(
+            model_name="outboxevent",
+            name="outbox_pending_idx",
+        ),
+        AddIndexConcurrently(
+            model_name="outboxevent",
+            index=models.Index(
+                condition=models.Q(
+                    ("failed_at__isnull", True), ("published_at__isnull", True)
+                ),
+                fields=["id"],
+                name="outbox_pending_idx",
+            ),
+        ),
+    ]
@@ -97,6 +97,10 @@ class DeliveryStatus(models.TextChoices):
     CANCELLED = "cancelled", "Cancelado"
 
 
+OPEN_ORDER_STATUSES = (DeliveryStatus.PENDING, DeliveryStatus.IN_TRANSIT)
+CLOSED_ORDER_STATUSES = (DeliveryStatus.DELIVERED, DeliveryStatus.CANCELLED)
+
+
 class DeliveryArea(models.Model):
     name = models.CharField("Nome", max_length=100)
     area = gis_models.PolygonField("Area de cobertura", geography=True)
@@ -152,6 +156,10 @@ class DeliveryOrder(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Ordem de Entrega"
         verbose_name_plural = "Ordens de Entrega"
+        indexes = [
+            models.Index(fields=["created_at"], name="order_created_at_idx"),
+            models.Index(fields=["driver", "status"], name="order_driver_status_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.client_name} - {self.get_status_display()}"
@@ -246,6 +254,24 @@ class Notification(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Notificacao"
         verbose_name_plural = "Notificacoes"
+        indexes = [
+            models.Index(
+                fields=["user", "created_at"],
+                name="notif_user_created_idx",
+            ),
+            # Unread badge and mark-all-read only touch unread rows
+            models.Index(
+                fields=["user", "created_at"],
+                name="notif_unread_user_created_idx",
+                condition=models.Q(is_read=False),
+            ),
+            # Retention job scans old read rows
+            models.Index(
+                fields=["created_at"],
+                name="notif_read_created_idx",
+                condition=models.Q(is_read=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -257,6 +283,31 @@ class Notification(models.Model):
         return "/"
 
 
+class NotificationArchive(models.Model):
+    """Read notifications moved out of the hot table by the retention job."""
+
+    original_id = models.BigIntegerField("ID original", unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_notifications",
+        verbose_name="Usuario",
+    )
+    title = models.CharField("Titulo", max_length=200)
+    body = models.TextField("Mensagem", blank=True)
+    order_id = models.BigIntegerField("Ordem de Entrega", null=True, blank=True)
+    created_at = models.DateTimeField("Criada em")
+    archived_at = models.DateTimeField("Arquivada em", auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Notificacao arquivada"
+        verbose_name_plural = "Notificacoes arquivadas"
+
+    def __str__(self) -> str:
+        return self.title
+
+
 class PushSubscription(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -269,6 +320,12 @@ class PushSubscription(models.Model):
     auth = models.CharField("Chave auth", max_length=255)
     user_agent = models.CharField("User Agent", max_length=255, blank=True, default="")
     created_at = models.DateTimeField("Criado em", auto_now_add=True)
+    # Delivery health, updated after every push attempt
+    failure_count = models.PositiveIntegerField("Falhas consecutivas", default=0)
+    last_success_at = models.DateTimeField("Ultimo envio", null=True, blank=True)
+    last_failure_at = models.DateTimeField("Ultima falha", null=True, blank=True)
+    last_latency_ms = models.FloatField("Latencia (ms)", null=True, blank=True)
+    quarantined_until = models.DateTimeField("Quarentena ate", null=True, blank=True)
 
     class Meta:
         unique_together = ("user", "endpoint")
@@ -283,3 +340,186 @@ class PushSubscription(models.Model):
 
     def __str__(self) -> str:
         return f"{self.user} - {self.endpoint[:30]}..."
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the change that caused
+    it and published afterwards by the outbox relay.
+    """
+
+    aggregate_type = models.CharField("Agregado", max_length=50)
+    aggregate_id = models.BigIntegerField("ID do agregado")
+    event_type = models.CharField("Evento", max_length=100)
+    payload = models.JSONField("Dados", default=dict, blank=True)
+    dedup_key = models.CharField("Chave de deduplicacao", max_length=255, unique=True)
+    attempts = models.PositiveIntegerField("Tentativas", default=0)
+    last_error = models.TextField("Ultimo erro", blank=True, default="")
+    created_at = models.DateTimeField("Criado em", auto_now_add=True)
+    published_at = models.DateTimeField("Publicado em", null=True, blank=True)
+    # After a failure the relay backs off exponentially until this time
+    next_attempt_at = models.DateTimeField(
+        "Proxima tentativa", null=True, blank=True
+    )
+    # Set once OUTBOX_MAX_ATTEMPTS is exhausted; the event stays for inspection
+    failed_at = models.DateTimeField("Falhou em", null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Evento de saida"
+        verbose_name_plural = "Eventos de saida"
+        indexes = [
+            # The relay only ever scans the pending tail
+            models.Index(
+                fields=["id"],
+                name="outbox_pending_idx",
+                condition=models.Q(published_at__isnull=True, failed_at__isnull=True),
+            ),
+            models.Index(
+                fields=["aggregate_type", "aggregate_id", "id"],
+                name="outbox_aggregate_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.event_type} ({self.aggregate_type} #{self.aggregate_id})"
+
+
+class CepCache(models.Model):
+    """Last upstream answer for a CEP, reused until expires_at."""
+
+    cep = models.CharField("CEP", max_length=8, unique=True)
+    status_code = models.PositiveSmallIntegerField("Status HTTP")
+    payload = models.JSONField("Resposta", default=dict)
+    fetched_at = models.DateTimeField("Consultado em")
+    expires_at = models.DateTimeField("Expira em")
+
+    class Meta:
+        verbose_name = "Cache de CEP"
+        verbose_name_plural = "Cache de CEPs"
+
+    def __str__(self) -> str:
+        return f"{self.cep} ({self.status_code})"
+
+
+class PostalCode(models.Model):
+    """Local CEP gazetteer, bulk-loaded with the load_postal_codes command."""
+
+    cep = models.CharField("CEP", max_length=8, unique=True)
+    street = models.CharField("Logradouro", max_length=255, blank=True, default="")
+    neighborhood = models.CharField("Bairro", max_length=150, blank=True, default="")
+    city = models.CharField("Cidade", max_length=150)
+    state = models.CharField("UF", max_length=2)
+    latitude = models.FloatField("Latitude", null=True, blank=True)
+    longitude = models.FloatField("Longitude", null=True, blank=True)
+
+    class Meta:
+        ordering = ["cep"]
+        verbose_name = "CEP"
+        verbose_name_plural = "CEPs"
+        indexes = [
+            # LIKE 'prefix%' needs pattern ops outside the C collation
+            models.Index(
+                fields=["cep"],
+                name="postal_code_cep_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.cep} - {self.city}/{self.state}"
+
+
+class DailyOrderRollup(models.Model):
+    """Orders created per day, driver and current status (analytics)."""
+
+    day = models.DateField("Dia")
+    driver = models.ForeignKey(
+        Driver,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Motorista",
+    )
+    status = models.CharField("Status", max_length=20, choices=DeliveryStatus.choices)
+    orders = models.PositiveIntegerField("Ordens", default=0)
+
+    class Meta:
+        ordering = ["day"]
+        verbose_name = "Consolidado diario de ordens"
+        verbose_name_plural = "Consolidados diarios de ordens"
+        indexes = [
+            models.Index(fields=["day", "driver", "status"], name="rollup_day_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} - {self.status}: {self.orders}"
+
+
+class OrderRollupDirtyDay(models.Model):
+    """Day whose DailyOrderRollup rows must be recomputed on the next run."""
+
+    day = models.DateField("Dia", unique=True)
+    marked_at = models.DateTimeField("Marcado em", auto_now=True)
+
+    class Meta:
+        verbose_name = "Dia pendente de consolidacao"
+        verbose_name_plural = "Dias pendentes de consolidacao"
+
+    def __str__(self) -> str:
+        return str(self.day)
+
+
+class OrderStatusEvent(models.Model):
+    """
+    Append-only history of order status transitions.
+
+    The table is range-partitioned by month on changed_at (see migration
+    0017); partitions ahead of time are created by a beat task. Order and
+    driver references have no database constraints so history outlives
+    deleted rows and the partitioned table needs no cross-table locks.
+    """
+
+    order = models.ForeignKey(
+        DeliveryOrder,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="status_events",
+        verbose_name="Ordem",
+    )
+    driver = models.ForeignKey(
+        Driver,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Motorista",
+    )
+    from_status = models.CharField(
+        "Status anterior",
+        max_length=20,
+        choices=DeliveryStatus.choices,
+        blank=True,
+    )
+    to_status = models.CharField(
+        "Novo status", max_length=20, choices=DeliveryStatus.choices
+    )
+    changed_at = models.DateTimeField("Alterado em")
+
+    class Meta:
+        ordering = ["order", "changed_at"]
+        verbose_name = "Historico de status"
+        verbose_name_plural = "Historicos de status"
+        indexes = [
+            models.Index(
+                fields=["order", "changed_at"], name="status_event_order_idx"
+            ),
+            models.Index(
+                fields=["to_status", "changed_at"], name="status_event_status_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.order_id}: {self.from_status or '-'} -> {self.to_status}"
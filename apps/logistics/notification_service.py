@@ -1,21 +1,119 @@
 import json
+import logging
+import threading
+import time
+from datetime import timedelta
 from typing import Optional
+from urllib.parse import urlparse
 
+import requests
 from django.conf import settings
-from pywebpush import WebPushException, webpush
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from py_vapid import Vapid
+from pywebpush import WebPushException, WebPusher
 
+from .metrics import record_phase
 from .models import DeliveryOrder, Notification, PushSubscription
 
+logger = logging.getLogger(__name__)
 
-def _send_push(notification: Notification) -> None:
-    public_key = getattr(settings, "WEBPUSH_VAPID_PUBLIC_KEY", "")
-    private_key = getattr(settings, "WEBPUSH_VAPID_PRIVATE_KEY", "")
-    contact = getattr(settings, "WEBPUSH_VAPID_ADMIN_EMAIL", settings.DEFAULT_FROM_EMAIL)
+# Outcomes of a single push attempt
+PUSH_SENT = "sent"
+PUSH_GONE = "gone"
+PUSH_RETRY = "retry"
+PUSH_FAILED = "failed"
 
-    if not public_key or not private_key:
-        return
+# Subscription health as reported to the user
+HEALTH_OK = "healthy"
+HEALTH_DEGRADED = "degraded"
+HEALTH_QUARANTINED = "quarantined"
 
-    payload = json.dumps(
+_push_session: Optional[requests.Session] = None
+
+# Parsed VAPID key and signed JWT headers per push service audience
+_vapid_lock = threading.Lock()
+_vapid_key: Optional[tuple[str, Vapid]] = None
+_vapid_headers: dict[str, tuple[dict, int]] = {}
+
+
+def push_configured() -> bool:
+    return bool(
+        getattr(settings, "WEBPUSH_VAPID_PUBLIC_KEY", "")
+        and getattr(settings, "WEBPUSH_VAPID_PRIVATE_KEY", "")
+    )
+
+
+def get_push_session() -> requests.Session:
+    """
+    Keep-alive session shared by every push sent from this process, sized so
+    each fan-out thread can hold its own connection to the push service.
+    """
+    global _push_session
+    if _push_session is None:
+        pool_size = getattr(settings, "WEBPUSH_CONCURRENCY", 10)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _push_session = session
+    return _push_session
+
+
+def push_service_host(endpoint: str) -> str:
+    return urlparse(endpoint).netloc
+
+
+def _get_vapid_key() -> Vapid:
+    global _vapid_key
+    private_key = settings.WEBPUSH_VAPID_PRIVATE_KEY
+    if _vapid_key is None or _vapid_key[0] != private_key:
+        _vapid_key = (private_key, Vapid.from_string(private_key=private_key))
+    return _vapid_key[1]
+
+
+def get_vapid_headers(endpoint: str) -> dict:
+    """
+    Return the VAPID Authorization header for the endpoint's push service.
+
+    The JWT is signed once per audience and reused until shortly before it
+    expires, instead of re-parsing the key and re-signing for every device.
+    """
+    url = urlparse(endpoint)
+    audience = f"{url.scheme}://{url.netloc}"
+    lifetime = getattr(settings, "WEBPUSH_VAPID_TOKEN_TTL", 12 * 60 * 60)
+    margin = getattr(settings, "WEBPUSH_VAPID_TOKEN_MARGIN", 5 * 60)
+    now = int(time.time())
+
+    with _vapid_lock:
+        cached = _vapid_headers.get(audience)
+        if cached and cached[1] - margin > now:
+            return dict(cached[0])
+
+        contact = getattr(
+            settings, "WEBPUSH_VAPID_ADMIN_EMAIL", settings.DEFAULT_FROM_EMAIL
+        )
+        expires_at = now + lifetime
+        headers = _get_vapid_key().sign(
+            {"sub": f"mailto:{contact}", "aud": audience, "exp": expires_at}
+        )
+        _vapid_headers[audience] = (headers, expires_at)
+        return dict(headers)
+
+
+def clear_vapid_cache() -> None:
+    global _vapid_key
+    with _vapid_lock:
+        _vapid_key = None
+        _vapid_headers.clear()
+
+
+def build_push_payload(notification: Notification) -> str:
+    return json.dumps(
         {
             "title": notification.title,
             "body": notification.body,
@@ -23,29 +121,119 @@ def _send_push(notification: Notification) -> None:
             "tag": f"notification-{notification.id}",
         }
     )
-    subscriptions: list[PushSubscription] = list(notification.user.push_subscriptions.all())
 
-    for subscription in subscriptions:
-        try:
-            webpush(
-                subscription_info={
+
+def send_push(
+    subscription: PushSubscription,
+    payload: str,
+    session: Optional[requests.Session] = None,
+) -> tuple[str, float]:
+    """
+    Deliver ``payload`` to a single subscription.
+
+    Returns the outcome and the latency in milliseconds. Expired endpoints
+    (404/410) are reported as gone, throttling and server errors as
+    retryable.
+    """
+    started = time.perf_counter()
+    try:
+        with record_phase("upstream"):
+            response = WebPusher(
+                {
                     "endpoint": subscription.endpoint,
                     "keys": {"p256dh": subscription.p256dh, "auth": subscription.auth},
                 },
-                data=payload,
-                vapid_private_key=private_key,
-                vapid_public_key=public_key,
-                vapid_claims={"sub": f"mailto:{contact}"},
+                requests_session=session,
+            ).send(
+                payload,
+                headers=get_vapid_headers(subscription.endpoint),
+                timeout=getattr(settings, "WEBPUSH_TIMEOUT", 10),
             )
-        except WebPushException as exc:
-            # Remove expired/invalid subscriptions quietly
-            status = getattr(getattr(exc, "response", None), "status_code", None)
-            if status in (404, 410):
-                subscription.delete()
-            continue
-        except Exception:
-            # Do not break order creation if push fails
+    except WebPushException:
+        # Malformed subscription keys; retrying cannot help
+        outcome = PUSH_FAILED
+    except requests.RequestException:
+        outcome = PUSH_RETRY
+    except Exception:
+        logger.exception("Unexpected web push error (subscription %s)", subscription.id)
+        outcome = PUSH_FAILED
+    else:
+        status = response.status_code
+        if status <= 202:
+            outcome = PUSH_SENT
+        elif status in (404, 410):
+            outcome = PUSH_GONE
+        elif status == 429 or status >= 500:
+            outcome = PUSH_RETRY
+        else:
+            outcome = PUSH_FAILED
+    latency_ms = (time.perf_counter() - started) * 1000
+    return outcome, latency_ms
+
+
+def deliverable(queryset: QuerySet) -> QuerySet:
+    """Exclude subscriptions that are quarantined right now."""
+    return queryset.filter(
+        Q(quarantined_until__isnull=True) | Q(quarantined_until__lte=timezone.now())
+    )
+
+
+def quarantine_delay(failure_count: int) -> Optional[timedelta]:
+    """
+    Exponential quarantine once an endpoint keeps failing: BASE seconds at
+    the threshold, doubling with every further failure up to MAX.
+    """
+    threshold = getattr(settings, "WEBPUSH_QUARANTINE_AFTER", 3)
+    if failure_count < threshold:
+        return None
+    base = getattr(settings, "WEBPUSH_QUARANTINE_BASE", 60)
+    ceiling = getattr(settings, "WEBPUSH_QUARANTINE_MAX", 24 * 60 * 60)
+    exponent = min(failure_count - threshold, 20)
+    return timedelta(seconds=min(base * 2**exponent, ceiling))
+
+
+def record_push_health(results: list[tuple[PushSubscription, str, float]]) -> None:
+    """
+    Store the outcome of a fan-out on each subscription: successes reset the
+    failure streak, failures extend it and may put the endpoint in
+    quarantine. Gone subscriptions are deleted by the caller.
+    """
+    now = timezone.now()
+    changed = []
+    for subscription, outcome, latency_ms in results:
+        if outcome == PUSH_GONE:
             continue
+        subscription.last_latency_ms = round(latency_ms, 1)
+        if outcome == PUSH_SENT:
+            subscription.failure_count = 0
+            subscription.last_success_at = now
+            subscription.quarantined_until = None
+        else:
+            subscription.failure_count += 1
+            subscription.last_failure_at = now
+            delay = quarantine_delay(subscription.failure_count)
+            subscription.quarantined_until = now + delay if delay else None
+        changed.append(subscription)
+
+    PushSubscription.objects.bulk_update(
+        changed,
+        [
+            "failure_count",
+            "last_success_at",
+            "last_failure_at",
+            "last_latency_ms",
+            "quarantined_until",
+        ],
+    )
+
+
+def subscription_health(subscription: PushSubscription) -> str:
+    quarantined_until = subscription.quarantined_until
+    if quarantined_until and quarantined_until > timezone.now():
+        return HEALTH_QUARANTINED
+    if subscription.failure_count:
+        return HEALTH_DEGRADED
+    return HEALTH_OK
 
 
 def notify_driver_assignment(order: DeliveryOrder) -> Optional[Notification]:
@@ -59,5 +247,10 @@ def notify_driver_assignment(order: DeliveryOrder) -> Optional[Notification]:
         title="Nova ordem atribuida",
         body=f"OS #{order.id} atribuida para voce (cliente: {order.client_name}).",
     )
-    _send_push(notification)
+    if push_configured():
+        from .tasks import send_push_notification
+
+        # Push delivery happens in Celery so the order write never waits on
+        # outbound calls to the push services.
+        transaction.on_commit(lambda: send_push_notification.delay(notification.id))
     return notification
@@ -0,0 +1,205 @@
+import logging
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_service import queue_delivery_status_email
+from .models import DeliveryOrder, OutboxEvent
+from .notification_service import notify_driver_assignment
+
+logger = logging.getLogger(__name__)
+
+ORDER_AGGREGATE = "delivery_order"
+
+ORDER_DRIVER_ASSIGNED = "order.driver_assigned"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+
+def record_event(
+    aggregate_type: str,
+    aggregate_id: int,
+    event_type: str,
+    payload: dict,
+    dedup_key: str,
+) -> None:
+    """
+    Store an event in the outbox. Call it inside the transaction that made
+    the change: the event is committed (or rolled back) together with it.
+    An event whose dedup_key already exists is ignored.
+    """
+    OutboxEvent.objects.bulk_create(
+        [
+            OutboxEvent(
+                aggregate_type=aggregate_type,
+                aggregate_id=aggregate_id,
+                event_type=event_type,
+                payload=payload,
+                dedup_key=dedup_key,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def record_order_event(order: DeliveryOrder, event_type: str, **payload) -> None:
+    # updated_at changes on every save, so one save yields one event per type
+    record_event(
+        ORDER_AGGREGATE,
+        order.pk,
+        event_type,
+        payload,
+        dedup_key=f"{event_type}:{order.pk}:{order.updated_at.isoformat()}",
+    )
+
+
+def _handle_driver_assigned(event: OutboxEvent) -> None:
+    order = (
+        DeliveryOrder.objects.select_related("driver__user")
+        .filter(pk=event.aggregate_id, driver_id=event.payload.get("driver_id"))
+        .first()
+    )
+    # Reassigned or deleted since: a newer event (if any) covers it
+    if order is not None:
+        notify_driver_assignment(order)
+
+
+def _handle_status_changed(event: OutboxEvent) -> None:
+    queue_delivery_status_email(event.aggregate_id)
+
+
+HANDLERS: dict[str, Callable[[OutboxEvent], None]] = {
+    ORDER_DRIVER_ASSIGNED: _handle_driver_assigned,
+    ORDER_STATUS_CHANGED: _handle_status_changed,
+}
+
+
+def _pending():
+    return OutboxEvent.objects.filter(published_at__isnull=True, failed_at__isnull=True)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after the ``attempts``-th failure, capped."""
+    seconds = settings.OUTBOX_RETRY_BASE * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.OUTBOX_RETRY_MAX))
+
+
+def relay_pending_events(batch_size: int = 100) -> dict:
+    """
+    Publish one batch of due events in id order.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED so several
+    relays can run side by side. To keep events of one aggregate in order,
+    an event is held back when an older event of the same aggregate is still
+    pending (failed earlier in this batch, backing off or claimed by another
+    relay). A held-back event takes the blocker's next_attempt_at, so it is
+    not claimed again before then and cannot crowd other aggregates out of
+    the batch. A failed event is retried after retry_delay(); once
+    OUTBOX_MAX_ATTEMPTS is exhausted it is marked failed_at and no longer
+    holds its aggregate back.
+    """
+    max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+    stats = {"published": 0, "failed": 0, "deferred": 0, "dead": 0}
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            _pending()
+            .select_for_update(skip_locked=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return stats
+
+        claimed_ids = [event.id for event in events]
+        # Blocking aggregate -> when its oldest pending event is due again;
+        # events claimed by another relay are rechecked after the base delay
+        soon = now + retry_delay(1)
+        blocked = {}
+        for aggregate_type, aggregate_id, due_at in (
+            _pending()
+            .filter(id__lt=max(claimed_ids))
+            .exclude(id__in=claimed_ids)
+            .values_list("aggregate_type", "aggregate_id", "next_attempt_at")
+        ):
+            aggregate = (aggregate_type, aggregate_id)
+            due_at = max(due_at or soon, soon)
+            blocked[aggregate] = min(blocked.get(aggregate, due_at), due_at)
+
+        deferred = {}
+        for event in events:
+            aggregate = (event.aggregate_type, event.aggregate_id)
+            if aggregate in blocked:
+                deferred.setdefault(blocked[aggregate], []).append(event.id)
+                stats["deferred"] += 1
+                continue
+
+            handler = HANDLERS.get(event.event_type)
+            try:
+                # Savepoint: a failing handler only rolls back its own writes
+                with transaction.atomic():
+                    if handler is None:
+                        logger.warning("No outbox handler for %s", event.event_type)
+                    else:
+                        handler(event)
+            except Exception as exc:
+                logger.exception("Outbox event %s failed", event.id)
+                event.attempts += 1
+                event.last_error = repr(exc)
+                if event.attempts >= max_attempts:
+                    # Give up so the rest of the aggregate is not stuck forever;
+                    # the event stays in the admin, where it can be requeued.
+                    event.failed_at = now
+                    stats["dead"] += 1
+                else:
+                    event.next_attempt_at = now + retry_delay(event.attempts)
+                    blocked[aggregate] = event.next_attempt_at
+                    stats["failed"] += 1
+                event.save(
+                    update_fields=[
+                        "attempts",
+                        "last_error",
+                        "next_attempt_at",
+                        "failed_at",
+                    ]
+                )
+                continue
+
+            event.attempts += 1
+            event.published_at = now
+            event.save(update_fields=["attempts", "published_at"])
+            stats["published"] += 1
+
+        for due_at, event_ids in deferred.items():
+            OutboxEvent.objects.filter(id__in=event_ids).update(
+                next_attempt_at=due_at
+            )
+    return stats
+
+
+def pending_event_lag() -> float:
+    """Age in seconds of the oldest event still waiting to be published."""
+    oldest = (
+        _pending()
+        .order_by("id")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    if oldest is None:
+        return 0.0
+    return (timezone.now() - oldest).total_seconds()
+
+
+def requeue_failed_events(queryset) -> int:
+    """Give failed events a fresh set of attempts."""
+    return queryset.filter(failed_at__isnull=False).update(
+        failed_at=None, attempts=0, next_attempt_at=None
+    )
+
+
+def purge_published_events(older_than) -> int:
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=older_than).delete()
+    return deleted
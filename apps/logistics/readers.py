@@ -0,0 +1,232 @@
+"""
+Read paths for the hot list endpoints.
+
+Each reader pulls one values_list() query (coordinates extracted in SQL with
+ST_X/ST_Y) and builds the response dicts directly, skipping the per-row
+serializer field machinery. Output must stay identical to the serializer
+used for every other action; ReaderParityTests pins that down.
+"""
+from django.contrib.gis.db.models import GeometryField
+from django.db.models import F, FloatField, Func
+from django.db.models.functions import Cast
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import Vehicle
+
+# DRF's own formatter: same timezone handling and ISO 8601 output as the
+# serializers' DateTimeFields
+_datetime = serializers.DateTimeField()
+
+
+def _coordinate(function: str, field: str) -> Func:
+    # Geography columns need a cast before ST_X/ST_Y
+    return Func(
+        Cast(F(field), GeometryField(srid=4326)),
+        function=function,
+        output_field=FloatField(),
+    )
+
+
+def _datetime_value(value):
+    return None if value is None else _datetime.to_representation(value)
+
+
+class ListReader:
+    fields: tuple = ()
+    coordinates: dict = {}
+
+    def values(self, queryset):
+        """Rows as tuples in ``fields`` + ``coordinates`` order."""
+        return queryset.annotate(
+            **{
+                name: _coordinate(function, field)
+                for name, (function, field) in self.coordinates.items()
+            }
+        ).values_list(*self.fields, *self.coordinates)
+
+    def build(self, rows, request=None) -> list[dict]:
+        raise NotImplementedError
+
+
+class VehicleListReader(ListReader):
+    fields = (
+        "id",
+        "plate",
+        "model",
+        "capacity_kg",
+        "type",
+        "status",
+        "garage_id",
+        "image",
+    )
+    coordinates = {
+        "last_x": ("ST_X", "last_location"),
+        "last_y": ("ST_Y", "last_location"),
+    }
+
+    def build(self, rows, request=None):
+        storage = Vehicle._meta.get_field("image").storage
+        data = []
+        for (
+            pk,
+            plate,
+            model,
+            capacity_kg,
+            type_,
+            status,
+            garage_id,
+            image,
+            last_x,
+            last_y,
+        ) in rows:
+            image_url = None
+            if image:
+                image_url = storage.url(image)
+                if request is not None:
+                    image_url = request.build_absolute_uri(image_url)
+            data.append(
+                {
+                    "id": pk,
+                    "plate": plate,
+                    "model": model,
+                    "capacity_kg": capacity_kg,
+                    "type": type_,
+                    "status": status,
+                    "garage": garage_id,
+                    "image": image_url,
+                    "last_latitude": last_y,
+                    "last_longitude": last_x,
+                }
+            )
+        return data
+
+
+class GarageListReader(ListReader):
+    fields = (
+        "id",
+        "name",
+        "address",
+        "postal_code",
+        "street_number",
+        "capacity",
+        "latitude",
+        "longitude",
+        "created_at",
+        "updated_at",
+    )
+
+    def build(self, rows, request=None):
+        return [
+            {
+                "id": pk,
+                "name": name,
+                "address": address,
+                "postal_code": postal_code,
+                "street_number": street_number,
+                "capacity": capacity,
+                "latitude": latitude,
+                "longitude": longitude,
+                "created_at": _datetime_value(created_at),
+                "updated_at": _datetime_value(updated_at),
+            }
+            for (
+                pk,
+                name,
+                address,
+                postal_code,
+                street_number,
+                capacity,
+                latitude,
+                longitude,
+                created_at,
+                updated_at,
+            ) in rows
+        ]
+
+
+class DeliveryOrderListReader(ListReader):
+    fields = (
+        "id",
+        "client_name",
+        "driver_id",
+        "driver__user__username",
+        "driver__user__first_name",
+        "driver__user__last_name",
+        "vehicle_id",
+        "vehicle__plate",
+        "status",
+        "deadline",
+        "created_at",
+        "updated_at",
+    )
+    coordinates = {
+        "pickup_x": ("ST_X", "pickup_location"),
+        "pickup_y": ("ST_Y", "pickup_location"),
+        "dropoff_x": ("ST_X", "dropoff_location"),
+        "dropoff_y": ("ST_Y", "dropoff_location"),
+    }
+
+    def build(self, rows, request=None):
+        data = []
+        for (
+            pk,
+            client_name,
+            driver_id,
+            username,
+            first_name,
+            last_name,
+            vehicle_id,
+            vehicle_plate,
+            status,
+            deadline,
+            created_at,
+            updated_at,
+            pickup_x,
+            pickup_y,
+            dropoff_x,
+            dropoff_y,
+        ) in rows:
+            driver_name = None
+            if driver_id is not None:
+                # Same as User.get_full_name() or username
+                driver_name = f"{first_name} {last_name}".strip() or username
+            data.append(
+                {
+                    "id": pk,
+                    "client_name": client_name,
+                    "driver": driver_id,
+                    "driver_name": driver_name,
+                    "vehicle": vehicle_id,
+                    "vehicle_plate": vehicle_plate,
+                    "pickup_location": _geojson_point(pickup_x, pickup_y),
+                    "dropoff_location": _geojson_point(dropoff_x, dropoff_y),
+                    "status": status,
+                    "deadline": _datetime_value(deadline),
+                    "created_at": _datetime_value(created_at),
+                    "updated_at": _datetime_value(updated_at),
+                }
+            )
+        return data
+
+
+def _geojson_point(x, y):
+    if x is None:
+        return None
+    return {"type": "Point", "coordinates": [x, y]}
+
+
+class ReaderListMixin:
+    """
+    Serve ``list`` through ``list_reader`` instead of the serializer. Sits
+    below ConditionalGetMixin so 304s still skip the query entirely.
+    """
+
+    list_reader: ListReader = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.list_reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.list_reader.build(page, request))
+        return Response(self.list_reader.build(queryset, request))
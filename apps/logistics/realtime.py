@@ -0,0 +1,105 @@
+import json
+import time
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+from .redis_client import get_redis, redis_enabled
+
+UNREAD_KEY = "notifications:unread:{user_id}"
+# Set while a cold counter is being filled; increments that miss drop it
+UNREAD_FILL_KEY = "notifications:unread-fill:{user_id}"
+UNREAD_FILL_TIMEOUT = 30
+USER_CHANNEL = "notifications:user:{user_id}"
+
+
+def streaming_enabled() -> bool:
+    return redis_enabled()
+
+
+def unread_count(user_id: int) -> int:
+    """
+    Unread badge counter served from the cache. Only a cold cache falls back
+    to counting rows; afterwards the counter is maintained incrementally.
+    If an increment arrives while the rows are being counted, the count may
+    already be stale, so it is not kept and the next read counts again.
+    """
+    key = UNREAD_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is None:
+        fill_key = UNREAD_FILL_KEY.format(user_id=user_id)
+        token = time.time_ns()
+        cache.set(fill_key, token, timeout=UNREAD_FILL_TIMEOUT)
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(key, count, timeout=settings.NOTIFICATION_UNREAD_TTL)
+        if cache.get(fill_key) != token:
+            cache.delete(key)
+    return count
+
+
+def increment_unread(user_id: int) -> None:
+    try:
+        cache.incr(UNREAD_KEY.format(user_id=user_id))
+    except ValueError:
+        # Not cached: the next read counts from the table. A read counting
+        # right now may have missed this row, so stop it from caching
+        cache.delete(UNREAD_FILL_KEY.format(user_id=user_id))
+
+
+def invalidate_unread(user_id: int) -> None:
+    cache.delete(UNREAD_KEY.format(user_id=user_id))
+
+
+def publish_notification(notification: Notification) -> None:
+    """Push a freshly created notification to the user's open streams."""
+    from .serializers import NotificationSerializer
+
+    if not streaming_enabled():
+        return
+    message = {
+        "notification": NotificationSerializer(notification).data,
+        "unread": unread_count(notification.user_id),
+    }
+    get_redis().publish(
+        USER_CHANNEL.format(user_id=notification.user_id),
+        json.dumps(message, default=str),
+    )
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def notification_events(user_id: int, unread: int, expires_at: float):
+    """
+    Server-sent events for one user: the current unread count, then every
+    new notification as it is published, with periodic keep-alives.
+
+    The stream ends when the access token expires (or after
+    NOTIFICATION_STREAM_MAX_SECONDS) so the client reconnects with a fresh
+    token.
+    """
+    heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT
+    deadline = min(expires_at, time.time() + settings.NOTIFICATION_STREAM_MAX_SECONDS)
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(USER_CHANNEL.format(user_id=user_id))
+    try:
+        yield f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n"
+        yield _sse("unread", json.dumps({"unread": unread}))
+        last_sent = time.time()
+        while time.time() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=heartbeat
+            )
+            if message is not None:
+                yield _sse("notification", message["data"].decode("utf-8"))
+                last_sent = time.time()
+            elif time.time() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
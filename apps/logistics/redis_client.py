@@ -0,0 +1,25 @@
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+_redis: Optional[redis.Redis] = None
+
+
+def redis_enabled() -> bool:
+    return bool(getattr(settings, "REDIS_URL", ""))
+
+
+def get_redis() -> redis.Redis:
+    """
+    Process-wide Redis client (connection pooled) for REDIS_URL. Commands
+    give up after REDIS_SOCKET_TIMEOUT so a stalled Redis fails fast.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        )
+    return _redis
@@ -0,0 +1,100 @@
+import math
+
+import msgpack
+import orjson
+from django.contrib.gis.geos import GEOSGeometry
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Fallback for types the fast encoders do not handle. Geometries become
+    GeoJSON; everything else (datetimes, Decimal, lazy strings, ...) gets
+    exactly the representation DRF's JSONEncoder gives it.
+    """
+    if isinstance(obj, GEOSGeometry):
+        return {"type": obj.geom_type, "coordinates": obj.coords}
+    return _drf_encoder.default(obj)
+
+
+def _has_non_finite(value) -> bool:
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_has_non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_non_finite(item) for item in value)
+    return False
+
+
+class OrjsonRenderer(JSONRenderer):
+    """
+    JSONRenderer on top of orjson. Output decodes to the same values as the
+    stdlib renderer: datetimes go through DRF's encoder ("Z" for UTC) and
+    U+2028/U+2029 are escaped. Floats may be spelled differently (orjson
+    writes 1e16 where the stdlib writes 1e+16). Indented output, values
+    orjson cannot encode and NaN/Infinity go through the stdlib, which
+    rejects the latter like DRF does.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=self.options)
+        except TypeError:
+            # Integers past 64 bits and the like: let the stdlib decide
+            return super().render(data, accepted_media_type, renderer_context)
+        # orjson writes NaN and Infinity as null; only then is the walk needed
+        if b"null" in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: keep the output safe to embed in <script>
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class OrjsonParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Opt-in binary format for the driver app on slow mobile links: send
+    ``Accept: application/msgpack`` (or ``?format=msgpack``). Values are
+    the same as in the JSON responses.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
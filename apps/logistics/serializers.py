@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 import math
@@ -12,6 +13,7 @@ from .models import (
     Vehicle,
     Route,
 )
+from .notification_service import push_service_host, subscription_health
 
 class VehicleSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(required=False, allow_null=True)
@@ -171,7 +173,8 @@ class DeliveryOrderSerializer(serializers.ModelSerializer):
 
 
 class NotificationSerializer(serializers.ModelSerializer):
-    order_id = serializers.IntegerField(source="order.id", read_only=True)
+    # The FK column: "order.id" would fetch every order, one query per row
+    order_id = serializers.IntegerField(read_only=True)
     target_url = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -214,11 +217,46 @@ class PushSubscriptionSerializer(serializers.ModelSerializer):
         return subscription
 
 
+class PushSubscriptionHealthSerializer(serializers.ModelSerializer):
+    host = serializers.SerializerMethodField()
+    health = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PushSubscription
+        fields = [
+            "id",
+            "host",
+            "user_agent",
+            "health",
+            "failure_count",
+            "last_success_at",
+            "last_failure_at",
+            "last_latency_ms",
+            "quarantined_until",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+    def get_host(self, obj):
+        return push_service_host(obj.endpoint)
+
+    def get_health(self, obj):
+        return subscription_health(obj)
+
+
 class CoverageCheckSerializer(serializers.Serializer):
     latitude = serializers.FloatField()
     longitude = serializers.FloatField()
 
 
+class CepBatchSerializer(serializers.Serializer):
+    ceps = serializers.ListField(
+        child=serializers.CharField(max_length=20, allow_blank=True),
+        allow_empty=False,
+        max_length=settings.CEP_BATCH_MAX_SIZE,
+    )
+
+
 class DeliveryAreaSerializer(serializers.ModelSerializer):
     radius_km = serializers.FloatField(write_only=True, required=False)
     center_latitude = serializers.FloatField(write_only=True, required=False)
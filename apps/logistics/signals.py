@@ -1,9 +1,128 @@
-from django.db.models.signals import post_save, pre_save
+import logging
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
-from .models import DeliveryOrder, DeliveryStatus
-from .notification_service import notify_driver_assignment
-from .tasks import send_delivery_status_email
+from .analytics import mark_days_dirty, order_day, record_status_event
+from .caching import bump_version, driver_scope
+from .models import (
+    OPEN_ORDER_STATUSES,
+    DeliveryArea,
+    DeliveryOrder,
+    DeliveryStatus,
+    Driver,
+    Garage,
+    Notification,
+    Vehicle,
+)
+from .outbox import ORDER_DRIVER_ASSIGNED, ORDER_STATUS_CHANGED, record_order_event
+from .realtime import increment_unread, invalidate_unread, publish_notification
+
+logger = logging.getLogger(__name__)
+
+VERSIONED_MODELS = (DeliveryArea, DeliveryOrder, Driver, Garage, Vehicle)
+
+
+def bump_model_version(sender, **kwargs):
+    bump_version(sender)
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(
+        bump_model_version,
+        sender=_model,
+        dispatch_uid=f"{_model._meta.label_lower}_version_on_save",
+    )
+    post_delete.connect(
+        bump_model_version,
+        sender=_model,
+        dispatch_uid=f"{_model._meta.label_lower}_version_on_delete",
+    )
+
+
+@receiver(post_save, sender=DeliveryOrder)
+@receiver(post_delete, sender=DeliveryOrder)
+def bump_driver_orders_version(sender, instance, **kwargs):
+    # /api/me/ caches a driver's open orders under this scope
+    drivers = {instance.driver_id, getattr(instance, "_previous_driver", None)}
+    for driver_id in drivers - {None}:
+        bump_version(DeliveryOrder, driver_scope(driver_id))
+
+
+def _bump_open_order_drivers(**filters):
+    # /api/me/ shows the vehicle and garage of each open order
+    driver_ids = (
+        DeliveryOrder.objects.filter(
+            status__in=OPEN_ORDER_STATUSES, driver__isnull=False, **filters
+        )
+        .values_list("driver_id", flat=True)
+        .distinct()
+    )
+    for driver_id in driver_ids:
+        bump_version(DeliveryOrder, driver_scope(driver_id))
+
+
+# pre_delete: SET_NULL detaches the orders before post_delete runs
+@receiver(post_save, sender=Vehicle)
+@receiver(pre_delete, sender=Vehicle)
+def bump_vehicle_drivers_version(sender, instance, **kwargs):
+    _bump_open_order_drivers(vehicle_id=instance.pk)
+
+
+@receiver(post_save, sender=Garage)
+@receiver(pre_delete, sender=Garage)
+def bump_garage_drivers_version(sender, instance, **kwargs):
+    _bump_open_order_drivers(vehicle__garage_id=instance.pk)
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+def bump_user_driver_version(sender, instance, **kwargs):
+    # /api/me/ tells whether the user has a driver profile
+    bump_version(Driver, instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notification_version(sender, instance, **kwargs):
+    bump_version(Notification, instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def stream_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    def deliver():
+        # The row is committed: a Redis outage must not fail the request or
+        # abort the relay batch; the badge recounts once the key expires
+        try:
+            if not instance.is_read:
+                increment_unread(instance.user_id)
+            publish_notification(instance)
+        except redis.RedisError:
+            logger.warning(
+                "Could not stream notification %s", instance.pk, exc_info=True
+            )
+
+    transaction.on_commit(deliver)
+
+
+@receiver(post_delete, sender=Notification)
+def refresh_unread_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        invalidate_unread(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def bump_user_version(sender, instance, **kwargs):
+    # Usernames feed driver_name on orders and the /api/me/ payload
+    bump_version(sender)
+    bump_version(sender, instance.pk)
 
 
 @receiver(pre_save, sender=DeliveryOrder)
@@ -26,14 +145,36 @@ def store_previous_status(sender, instance, **kwargs):
 
 @receiver(post_save, sender=DeliveryOrder)
 def notify_on_dispatch(sender, instance, created, **kwargs):
+    # Only outbox rows are written here; the relay notifies once this commits
     previous_status = getattr(instance, "_previous_status", None)
     previous_driver = getattr(instance, "_previous_driver", None)
 
     if instance.driver_id and (created or previous_driver != instance.driver_id):
-        notify_driver_assignment(instance)
+        record_order_event(
+            instance, ORDER_DRIVER_ASSIGNED, driver_id=instance.driver_id
+        )
 
     if created:
         return
 
     if previous_status != instance.status and instance.status == DeliveryStatus.IN_TRANSIT:
-        send_delivery_status_email.delay(instance.id)
+        record_order_event(
+            instance,
+            ORDER_STATUS_CHANGED,
+            previous_status=previous_status,
+            status=instance.status,
+        )
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def record_status_history(sender, instance, created, **kwargs):
+    previous_status = getattr(instance, "_previous_status", None)
+    if created or previous_status != instance.status:
+        record_status_event(instance, None if created else previous_status)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+@receiver(post_delete, sender=DeliveryOrder)
+def mark_rollup_day_dirty(sender, instance, **kwargs):
+    # Rollups group by creation day, so any change only touches that day
+    mark_days_dirty([order_day(instance)])
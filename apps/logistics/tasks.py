@@ -1,8 +1,43 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 from celery import shared_task
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import (
+    ensure_status_event_partitions as ensure_partitions,
+    refresh_order_rollups as refresh_rollups,
+)
+from .caching import bump_version
+from .cep_service import lookup_ceps
+from .email_service import flush_status_email_queue, status_email_line
+from .models import (
+    DeliveryOrder,
+    Notification,
+    NotificationArchive,
+    PushSubscription,
+)
+from .notification_service import (
+    PUSH_GONE,
+    PUSH_RETRY,
+    build_push_payload,
+    deliverable,
+    get_push_session,
+    push_configured,
+    push_service_host,
+    record_push_health,
+    send_push,
+)
+from .outbox import purge_published_events
+from .redis_client import redis_enabled
 
-from .models import DeliveryOrder
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -17,10 +52,7 @@ def send_delivery_status_email(order_id: int):
     except DeliveryOrder.DoesNotExist:
         return "Order not found"
 
-    message = (
-        f"Pedido #{order.id} para {order.client_name} mudou para "
-        f"status: {order.get_status_display()}."
-    )
+    message = status_email_line(order)
 
     send_mail(
         subject="Atualizacao de entrega",
@@ -31,3 +63,231 @@ def send_delivery_status_email(order_id: int):
     )
     print(f"[Celery] Notification sent for order {order.id}: {message}")
     return "sent"
+
+
+@shared_task(bind=True, max_retries=5)
+def flush_delivery_status_emails(self):
+    """
+    Send every buffered status email over a single mail connection. SMTP
+    failures leave the emails queued and retry after EMAIL_BATCH_WINDOW.
+    """
+    if not redis_enabled():
+        return {"queue_depth": 0, "sent": 0}
+    try:
+        return flush_status_email_queue()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=settings.EMAIL_BATCH_WINDOW)
+
+
+@shared_task
+def send_push_notification(notification_id: int):
+    """
+    Fan a notification out to every device of its user.
+
+    Subscriptions are grouped by push service host and split into batches so
+    each batch task reuses keep-alive connections to a single service and
+    retries independently of the others.
+    """
+    if not push_configured():
+        return "disabled"
+
+    user_id = (
+        Notification.objects.filter(pk=notification_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+    if user_id is None:
+        return "Notification not found"
+
+    by_host = defaultdict(list)
+    for subscription_id, endpoint in deliverable(
+        PushSubscription.objects.filter(user_id=user_id)
+    ).values_list("id", "endpoint"):
+        by_host[push_service_host(endpoint)].append(subscription_id)
+
+    batch_size = getattr(settings, "WEBPUSH_BATCH_SIZE", 100)
+    batches = 0
+    for subscription_ids in by_host.values():
+        for start in range(0, len(subscription_ids), batch_size):
+            deliver_push_batch.delay(
+                notification_id, subscription_ids[start:start + batch_size]
+            )
+            batches += 1
+    return {"hosts": len(by_host), "batches": batches}
+
+
+@shared_task(bind=True, max_retries=None)
+def deliver_push_batch(self, notification_id: int, subscription_ids: list[int]):
+    """
+    Send one notification to a batch of subscriptions concurrently.
+
+    Only the subscriptions that failed with a retryable error are retried,
+    with exponential backoff, so successful devices never get duplicates.
+    """
+    try:
+        notification = Notification.objects.get(pk=notification_id)
+    except Notification.DoesNotExist:
+        return "Notification not found"
+
+    # Endpoints quarantined since the fan-out (or a previous retry) are skipped
+    subscriptions = list(
+        deliverable(PushSubscription.objects.filter(pk__in=subscription_ids))
+    )
+    if not subscriptions:
+        return {"sent": 0}
+
+    payload = build_push_payload(notification)
+    session = get_push_session()
+    concurrency = min(getattr(settings, "WEBPUSH_CONCURRENCY", 10), len(subscriptions))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(lambda sub: send_push(sub, payload, session), subscriptions)
+        )
+
+    summary = defaultdict(int)
+    gone_ids = []
+    retry_ids = []
+    for subscription, (outcome, latency_ms) in zip(subscriptions, results):
+        summary[outcome] += 1
+        logger.info(
+            "web push %s to %s in %.1f ms (notification %s)",
+            outcome,
+            push_service_host(subscription.endpoint),
+            latency_ms,
+            notification_id,
+        )
+        if outcome == PUSH_GONE:
+            gone_ids.append(subscription.pk)
+        elif outcome == PUSH_RETRY:
+            retry_ids.append(subscription.pk)
+
+    if gone_ids:
+        # Remove expired/invalid subscriptions quietly
+        PushSubscription.objects.filter(pk__in=gone_ids).delete()
+    record_push_health(
+        [
+            (subscription, outcome, latency_ms)
+            for subscription, (outcome, latency_ms) in zip(subscriptions, results)
+        ]
+    )
+
+    max_retries = getattr(settings, "WEBPUSH_MAX_RETRIES", 5)
+    if retry_ids and self.request.retries < max_retries:
+        backoff = getattr(settings, "WEBPUSH_RETRY_BACKOFF", 5)
+        raise self.retry(
+            args=(notification_id, retry_ids),
+            countdown=backoff * (2 ** self.request.retries),
+        )
+
+    summary["max_latency_ms"] = round(max(latency for _, latency in results), 1)
+    return dict(summary)
+
+
+@shared_task
+def purge_read_notifications():
+    """
+    Delete (or archive) read notifications older than the retention window.
+
+    Works in bounded batches so a large backlog never holds long locks or
+    one huge transaction; whatever is left is picked up on the next run.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    batch_size = settings.NOTIFICATION_RETENTION_BATCH_SIZE
+    archive = settings.NOTIFICATION_RETENTION_ARCHIVE
+    stale = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by()
+    table = Notification._meta.db_table
+    # Read rows need no per-object signals; the predicate is repeated so a
+    # row marked unread since the SELECT is neither deleted nor archived
+    delete_sql = (
+        f"DELETE FROM {table} WHERE id = ANY(%s) AND is_read AND created_at < %s "
+        f"RETURNING id, user_id, title, body, order_id, created_at"
+    )
+    columns = ("id", "user_id", "title", "body", "order_id", "created_at")
+
+    removed = 0
+    for _ in range(settings.NOTIFICATION_RETENTION_MAX_BATCHES):
+        ids = list(stale.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(delete_sql, [ids, cutoff])
+                rows = [dict(zip(columns, values)) for values in cursor.fetchall()]
+            removed += len(rows)
+            if archive:
+                NotificationArchive.objects.bulk_create(
+                    [
+                        NotificationArchive(
+                            original_id=row["id"],
+                            user_id=row["user_id"],
+                            title=row["title"],
+                            body=row["body"],
+                            order_id=row["order_id"],
+                            created_at=row["created_at"],
+                        )
+                        for row in rows
+                    ],
+                    ignore_conflicts=True,
+                )
+
+        for user_id in {row["user_id"] for row in rows}:
+            bump_version(Notification, user_id)
+
+    logger.info(
+        "notification retention: %s %s read notifications older than %s",
+        "archived" if archive else "deleted",
+        removed,
+        cutoff.date(),
+    )
+    return removed
+
+
+@shared_task
+def prune_push_subscriptions():
+    """
+    Delete endpoints that keep failing and have not delivered anything for
+    WEBPUSH_PRUNE_AFTER_DAYS (or ever, for subscriptions older than that).
+    """
+    cutoff = timezone.now() - timedelta(days=settings.WEBPUSH_PRUNE_AFTER_DAYS)
+    stale = PushSubscription.objects.filter(
+        failure_count__gte=settings.WEBPUSH_PRUNE_FAILURES
+    ).filter(
+        Q(last_success_at__lt=cutoff)
+        | Q(last_success_at__isnull=True, created_at__lt=cutoff)
+    )
+    removed, _ = stale.delete()
+    logger.info("push prune: deleted %s failing subscriptions", removed)
+    return removed
+
+
+@shared_task
+def purge_outbox_events():
+    cutoff = timezone.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    removed = purge_published_events(cutoff)
+    logger.info("outbox retention: deleted %s published events", removed)
+    return removed
+
+
+@shared_task(bind=True)
+def lookup_cep_batch(self, ceps: list[str]):
+    """Resolve a large CEP batch off the web workers, reporting progress."""
+
+    def report(done, total):
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta={"done": done, "total": total})
+
+    return {"results": lookup_ceps(ceps, progress=report)}
+
+
+@shared_task
+def refresh_order_rollups():
+    stats = refresh_rollups(max_days=settings.ANALYTICS_ROLLUP_MAX_DAYS)
+    logger.info("order rollups: %(days)s days recomputed, %(rows)s rows", stats)
+    return stats
+
+
+@shared_task
+def ensure_status_event_partitions():
+    return ensure_partitions(months_ahead=settings.STATUS_EVENT_PARTITIONS_AHEAD)
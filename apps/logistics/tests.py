@@ -1,14 +1,47 @@
+import io
+import json
+from decimal import Decimal
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from unittest.mock import patch
+from unittest.mock import MagicMock, Mock, patch
 
+import redis
+import requests
+from celery.exceptions import Retry
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point, Polygon
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from prometheus_client import REGISTRY
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
+from . import email_service, metrics
+from .analytics import ensure_status_event_partitions, refresh_order_rollups
+from .caching import response_cache_stats
+from .cep_service import clear_cep_memory_cache
+from .dashboard_service import dashboard_summary
+from .email_service import flush_status_email_queue, queue_delivery_status_email
 from .models import (
+    CepCache,
+    DailyOrderRollup,
     DeliveryArea,
     DeliveryOrder,
     DeliveryStatus,
@@ -16,10 +49,53 @@ from .models import (
     Driver,
     Garage,
     Notification,
+    NotificationArchive,
+    OrderRollupDirtyDay,
+    OrderStatusEvent,
+    OutboxEvent,
+    PostalCode,
+    PushSubscription,
     Route,
     Vehicle,
     VehicleType,
 )
+from .notification_service import (
+    PUSH_FAILED,
+    PUSH_GONE,
+    PUSH_RETRY,
+    PUSH_SENT,
+    clear_vapid_cache,
+    get_vapid_headers,
+)
+from .outbox import (
+    ORDER_STATUS_CHANGED,
+    pending_event_lag,
+    relay_pending_events,
+    requeue_failed_events,
+)
+from .readers import DeliveryOrderListReader, GarageListReader, VehicleListReader
+from .realtime import increment_unread, unread_count
+from .renderers import MessagePackParser, MessagePackRenderer, OrjsonRenderer
+from .serializers import (
+    DeliveryOrderSerializer,
+    GarageSerializer,
+    VehicleSerializer,
+)
+from .tasks import (
+    add,
+    deliver_push_batch,
+    prune_push_subscriptions,
+    purge_read_notifications,
+    send_push_notification,
+)
+from .upstream import (
+    CircuitBreaker,
+    TokenBucket,
+    Upstream,
+    UpstreamUnavailable,
+    coalesce,
+    reset_upstreams,
+)
 
 
 class LogisticsModelTests(APITestCase):
@@ -81,10 +157,20 @@ class LogisticsModelTests(APITestCase):
             deadline=timezone.now() + timedelta(days=1),
         )
 
-        with patch("apps.logistics.signals.send_delivery_status_email.delay") as mocked_delay:
+        with patch("apps.logistics.outbox.queue_delivery_status_email") as mocked_queue:
             order.status = DeliveryStatus.IN_TRANSIT
             order.save()
-            mocked_delay.assert_called_once_with(order.id)
+            mocked_queue.assert_not_called()
+            self.assertTrue(
+                OutboxEvent.objects.filter(
+                    aggregate_id=order.id,
+                    event_type=ORDER_STATUS_CHANGED,
+                    published_at__isnull=True,
+                ).exists()
+            )
+
+            relay_pending_events()
+            mocked_queue.assert_called_once_with(order.id)
 
     def test_assignment_creates_notification(self):
         pickup = Point(-46.57421, -23.55052, srid=4326)
@@ -102,12 +188,18 @@ class LogisticsModelTests(APITestCase):
             deadline=timezone.now() + timedelta(days=1),
             driver=driver,
         )
+        self.assertFalse(Notification.objects.filter(user=self.driver_user).exists())
+
+        relay_pending_events()
+        # A second run finds nothing left to publish
+        relay_pending_events()
 
         self.assertEqual(Notification.objects.filter(user=self.driver_user).count(), 1)
 
 
 class LogisticsAPITests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.User = get_user_model()
         self.admin = self.User.objects.create_user(
             username="admin",
@@ -329,3 +421,1701 @@ class LogisticsAPITests(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(resp.data["vehicles"], 1)
         self.assertGreaterEqual(resp.data["garages"], 1)
+
+    @override_settings(DASHBOARD_ESTIMATE_THRESHOLD=0)
+    def test_dashboard_summary_is_one_query_and_cached_until_change(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            summary = dashboard_summary()
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_summary(), summary)
+
+        # Order writes are frequent; their counts refresh with the TTL
+        DeliveryOrder.objects.create(
+            client_name="Cliente Dashboard",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(days=1),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_summary(), summary)
+
+        Garage.objects.create(name="Base Sul", address="Rua Y", capacity=5)
+        with self.assertNumQueries(1):
+            refreshed = dashboard_summary()
+        self.assertEqual(refreshed["garages"], summary["garages"] + 1)
+        self.assertEqual(refreshed["delivery_orders"], summary["delivery_orders"] + 1)
+        self.assertFalse(summary["estimated"])
+
+    @override_settings(DASHBOARD_ESTIMATE_THRESHOLD=1_000_000)
+    def test_dashboard_summary_estimates_huge_order_table(self):
+        cache.clear()
+        with patch(
+            "apps.logistics.dashboard_service._estimated_order_counts",
+            return_value=(12_000_000, 3_000_000),
+        ):
+            summary = dashboard_summary()
+
+        self.assertTrue(summary["estimated"])
+        self.assertEqual(summary["delivery_orders"], 12_000_000)
+        self.assertEqual(summary["in_transit_orders"], 3_000_000)
+
+
+@override_settings(VERSIONED_CACHING=True)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="viewer",
+            password="viewerpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.garage_list_url = reverse("garage-list")
+        Garage.objects.create(name="Base Sul", address="Rua Y", capacity=5)
+
+    def test_matching_etag_returns_not_modified(self):
+        first = self.client.get(self.garage_list_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+
+        with patch.object(GarageSerializer, "to_representation") as mocked:
+            second = self.client.get(
+                self.garage_list_url, HTTP_IF_NONE_MATCH=first["ETag"]
+            )
+            mocked.assert_not_called()
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_invalidates_etag(self):
+        first = self.client.get(self.garage_list_url)
+        Garage.objects.create(name="Base Leste", address="Rua Z", capacity=3)
+        second = self.client.get(
+            self.garage_list_url, HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data["count"], 2)
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    @override_settings(VERSIONED_CACHING=False)
+    def test_no_validators_without_a_shared_cache(self):
+        first = self.client.get(self.garage_list_url)
+        self.assertNotIn("ETag", first)
+        self.assertNotIn("Last-Modified", first)
+
+    def test_mark_all_read_invalidates_notification_etag(self):
+        Notification.objects.create(user=self.user, title="Aviso")
+        url = reverse("notification-list")
+        first = self.client.get(url)
+        self.client.post(reverse("notification-mark-all-read"))
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertTrue(second.data["results"][0]["is_read"])
+
+
+@override_settings(VERSIONED_CACHING=True)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="cached", password="x"
+        )
+        self.admin = get_user_model().objects.create_user(
+            username="cachedadmin", password="x", is_staff=True
+        )
+        self.client.force_authenticate(self.user)
+        self.url = reverse("garage-list")
+        self.garage = Garage.objects.create(name="Base Norte", address="Rua A")
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+
+    def test_query_string_and_role_are_part_of_the_key(self):
+        self.client.get(self.url)
+        self.client.get(self.url, {"page": 1})
+        self.client.force_authenticate(self.admin)
+        self.client.get(self.url)
+
+        stats = {row["endpoint"]: row for row in response_cache_stats()}
+        self.assertEqual(stats["garages:list"]["hits"], 0)
+        self.assertEqual(stats["garages:list"]["misses"], 3)
+
+    def test_write_invalidates_list_and_detail(self):
+        detail_url = reverse("garage-detail", args=[self.garage.pk])
+        self.client.get(self.url)
+        self.client.get(detail_url)
+
+        self.garage.name = "Base Renomeada"
+        self.garage.save()
+        Garage.objects.create(name="Base Oeste", address="Rua B")
+
+        self.assertEqual(self.client.get(self.url).data["count"], 2)
+        self.assertEqual(self.client.get(detail_url).data["name"], "Base Renomeada")
+
+    def test_read_inside_write_transaction_is_not_served_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.garage.name = "Base Renomeada"
+                self.garage.save()
+                # Stands in for a reader that saw the bump before the commit
+                self.client.get(self.url)
+        self.client.get(self.url)
+
+        stats = {row["endpoint"]: row for row in response_cache_stats()}
+        self.assertEqual(stats["garages:list"]["hits"], 0)
+        self.assertEqual(stats["garages:list"]["misses"], 2)
+
+    def test_writes_succeed_while_the_cache_is_down(self):
+        with patch(
+            "apps.logistics.caching.cache.set",
+            side_effect=redis.ConnectionError("down"),
+        ) as mocked_set:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.garage.name = "Base Renomeada"
+                self.garage.save()
+        self.assertGreaterEqual(mocked_set.call_count, 2)
+        self.garage.refresh_from_db()
+        self.assertEqual(self.garage.name, "Base Renomeada")
+
+    def test_errors_are_not_cached(self):
+        missing_url = reverse("garage-detail", args=[self.garage.pk + 100])
+        self.assertEqual(self.client.get(missing_url).status_code, 404)
+        Garage.objects.create(pk=self.garage.pk + 100, name="Nova", address="Rua C")
+        self.assertEqual(self.client.get(missing_url).status_code, 200)
+
+    def test_stats_report_hit_ratio_per_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        stats = {row["endpoint"]: row for row in response_cache_stats()}
+        self.assertEqual(stats["garages:list"]["hits"], 2)
+        self.assertEqual(stats["garages:list"]["misses"], 1)
+        self.assertAlmostEqual(stats["garages:list"]["hit_ratio"], 0.6667)
+        self.assertIsNone(stats["vehicles:retrieve"]["hit_ratio"])
+
+        self.assertEqual(
+            self.client.get(reverse("response-cache-stats")).status_code, 403
+        )
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("response-cache-stats"))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN="", METRICS_QUEUE_NAMES=[])
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="timed", password="x"
+        )
+        self.client.force_authenticate(self.user)
+        Garage.objects.create(name="Base Sul", address="Rua Y")
+
+    def _server_timing(self, response):
+        entries = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            entries[name] = dict(param.split("=", 1) for param in params)
+        return entries
+
+    def test_sampled_request_reports_phases(self):
+        response = self.client.get(reverse("garage-list"))
+        timing = self._server_timing(response)
+        self.assertEqual(set(timing), {"db", "upstream", "render", "app", "total"})
+        self.assertNotEqual(timing["db"]["desc"], '"0 queries"')
+        self.assertGreater(float(timing["total"]["dur"]), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_request_has_no_server_timing(self):
+        response = self.client.get(reverse("garage-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_upstream_time_is_recorded(self):
+        def slow_fetch(cep):
+            time.sleep(0.02)
+            return (200, {"cep": cep}), 60
+
+        with patch("apps.logistics.cep_service.fetch_cep", side_effect=slow_fetch):
+            response = self.client.get(reverse("cep-lookup"), {"cep": "01001000"})
+        self.assertGreaterEqual(
+            float(self._server_timing(response)["upstream"]["dur"]), 20
+        )
+
+    @override_settings(DEBUG=True)
+    def test_metrics_endpoint_exports_route_histograms(self):
+        self.client.get(reverse("garage-list"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{', body)
+        self.assertIn('route="garage-list"', body)
+        self.assertIn('http_request_db_queries_count{route="garage-list"}', body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_endpoint_requires_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_metrics_endpoint_is_off_without_token_in_production(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TaskMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def _task(self, name, **request):
+        task = Mock()
+        task.name = name
+        task.request = Mock(eta=None, **request)
+        return task
+
+    def test_publish_stamps_enqueue_time(self):
+        headers = {}
+        metrics._stamp_enqueued(headers=headers)
+        self.assertAlmostEqual(
+            headers[metrics.ENQUEUED_AT_HEADER], time.time(), delta=1
+        )
+
+    def test_queue_wait_and_runtime_are_observed(self):
+        name = "tests.waited"
+        task = self._task(name, enqueued_at=time.time() - 5)
+        metrics._task_started(task_id="t1", task=task)
+        metrics._task_finished(task_id="t1", task=task, state="SUCCESS")
+
+        wait = self._sample("celery_task_queue_wait_seconds_sum", task=name)
+        self.assertGreaterEqual(wait, 5)
+        self.assertLess(wait, 10)
+        runs = self._sample(
+            "celery_task_runtime_seconds_count", task=name, state="SUCCESS"
+        )
+        self.assertEqual(runs, 1)
+
+    def test_queue_wait_starts_at_the_eta(self):
+        name = "tests.countdown"
+        task = self._task(name, enqueued_at=time.time() - 60)
+        task.request.eta = (timezone.now() - timedelta(seconds=2)).isoformat()
+        metrics._task_started(task_id="t2", task=task)
+        wait = self._sample("celery_task_queue_wait_seconds_sum", task=name)
+        self.assertLess(wait, 10)
+
+    def test_eager_task_records_runtime(self):
+        before = self._sample(
+            "celery_task_runtime_seconds_count",
+            task="apps.logistics.tasks.add",
+            state="SUCCESS",
+        )
+        add.apply(args=(2, 2))
+        after = self._sample(
+            "celery_task_runtime_seconds_count",
+            task="apps.logistics.tasks.add",
+            state="SUCCESS",
+        )
+        self.assertEqual(after, before + 1)
+
+    def test_retries_and_failures_are_counted(self):
+        task = self._task("tests.flaky")
+        metrics._task_retried(sender=task)
+        metrics._task_failed(sender=task)
+        self.assertEqual(self._sample("celery_task_retries_total", task=task.name), 1)
+        self.assertEqual(self._sample("celery_task_failures_total", task=task.name), 1)
+
+    @override_settings(METRICS_QUEUE_NAMES=["celery"], METRICS_TOKEN="", DEBUG=True)
+    def test_queue_depth_is_sampled_from_the_broker(self):
+        connection = MagicMock()
+        connection.__enter__.return_value = connection
+        connection.default_channel.queue_declare.return_value = Mock(message_count=7)
+        with patch("config.celery.app.connection_for_read", return_value=connection):
+            body = self.client.get(reverse("metrics")).content.decode()
+            self.client.get(reverse("metrics"))
+        self.assertIn('celery_queue_length{queue="celery"} 7.0', body)
+        # The second scrape is answered from the shared sample
+        connection.default_channel.queue_declare.assert_called_once()
+
+
+@override_settings(
+    WEBPUSH_VAPID_PUBLIC_KEY="public",
+    WEBPUSH_VAPID_PRIVATE_KEY="private",
+    WEBPUSH_BATCH_SIZE=2,
+)
+class PushFanOutTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="pushdriver",
+            password="driverpass",
+        )
+        self.notification = Notification.objects.create(user=self.user, title="OS")
+        endpoints = [
+            "https://fcm.googleapis.com/fcm/send/a",
+            "https://fcm.googleapis.com/fcm/send/b",
+            "https://fcm.googleapis.com/fcm/send/c",
+            "https://updates.push.services.mozilla.com/wpush/v2/d",
+        ]
+        self.subscriptions = [
+            PushSubscription.objects.create(
+                user=self.user, endpoint=endpoint, p256dh="key", auth="auth"
+            )
+            for endpoint in endpoints
+        ]
+
+    def test_fan_out_groups_batches_by_push_host(self):
+        with patch("apps.logistics.tasks.deliver_push_batch.delay") as mocked_delay:
+            result = send_push_notification(self.notification.id)
+
+        self.assertEqual(result, {"hosts": 2, "batches": 3})
+        batches = sorted(len(call.args[1]) for call in mocked_delay.call_args_list)
+        self.assertEqual(batches, [1, 1, 2])
+
+    def test_batch_prunes_gone_and_retries_only_transient_failures(self):
+        gone, flaky, ok = self.subscriptions[:3]
+        outcomes = {gone.id: PUSH_GONE, flaky.id: PUSH_RETRY, ok.id: PUSH_SENT}
+
+        def fake_send(subscription, payload, session=None):
+            return outcomes[subscription.id], 12.0
+
+        with patch("apps.logistics.tasks.send_push", side_effect=fake_send), patch(
+            "apps.logistics.tasks.deliver_push_batch.retry",
+            side_effect=Retry(),
+        ) as mocked_retry:
+            with self.assertRaises(Retry):
+                deliver_push_batch(self.notification.id, [gone.id, flaky.id, ok.id])
+
+        self.assertFalse(PushSubscription.objects.filter(pk=gone.id).exists())
+        self.assertEqual(
+            mocked_retry.call_args.kwargs["args"], (self.notification.id, [flaky.id])
+        )
+
+    @override_settings(WEBPUSH_QUARANTINE_AFTER=2, WEBPUSH_QUARANTINE_BASE=60)
+    def test_repeated_failures_quarantine_endpoint(self):
+        broken, ok = self.subscriptions[:2]
+        outcomes = {broken.id: PUSH_FAILED, ok.id: PUSH_SENT}
+
+        def fake_send(subscription, payload, session=None):
+            return outcomes[subscription.id], 40.0
+
+        with patch("apps.logistics.tasks.send_push", side_effect=fake_send):
+            deliver_push_batch(self.notification.id, [broken.id, ok.id])
+            broken.refresh_from_db()
+            self.assertEqual(broken.failure_count, 1)
+            self.assertIsNone(broken.quarantined_until)
+
+            deliver_push_batch(self.notification.id, [broken.id, ok.id])
+
+        broken.refresh_from_db()
+        ok.refresh_from_db()
+        self.assertEqual(broken.failure_count, 2)
+        self.assertGreater(broken.quarantined_until, timezone.now())
+        self.assertEqual(ok.failure_count, 0)
+        self.assertEqual(ok.last_latency_ms, 40.0)
+        self.assertIsNotNone(ok.last_success_at)
+
+        with patch("apps.logistics.tasks.deliver_push_batch.delay") as mocked_delay:
+            send_push_notification(self.notification.id)
+        fanned_out = {pk for call in mocked_delay.call_args_list for pk in call.args[1]}
+        self.assertNotIn(broken.id, fanned_out)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("push-subscription-health"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["summary"], {"healthy": 3, "degraded": 0, "quarantined": 1}
+        )
+
+    def test_prune_removes_long_failing_subscriptions(self):
+        stale, recovering = self.subscriptions[:2]
+        long_ago = timezone.now() - timedelta(days=60)
+        PushSubscription.objects.filter(pk=stale.pk).update(
+            failure_count=20, last_success_at=long_ago
+        )
+        PushSubscription.objects.filter(pk=recovering.pk).update(
+            failure_count=20, last_success_at=timezone.now()
+        )
+
+        self.assertEqual(prune_push_subscriptions(), 1)
+        self.assertFalse(PushSubscription.objects.filter(pk=stale.pk).exists())
+        self.assertTrue(PushSubscription.objects.filter(pk=recovering.pk).exists())
+
+    def test_assignment_enqueues_push_after_commit(self):
+        driver = Driver.objects.create(user=self.user, license_number="CNH555")
+        order = DeliveryOrder.objects.create(
+            client_name="Cliente Push",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(days=1),
+            driver=driver,
+        )
+        with patch("apps.logistics.tasks.send_push_notification.delay") as mocked_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                relay_pending_events()
+        notification = Notification.objects.get(order=order)
+        mocked_delay.assert_called_once_with(notification.id)
+
+
+class VapidHeaderCacheTests(APITestCase):
+    def setUp(self):
+        clear_vapid_cache()
+        self.addCleanup(clear_vapid_cache)
+
+    def test_jwt_signed_once_per_audience(self):
+        signer = Mock()
+        signer.sign.return_value = {"Authorization": "vapid t=token,k=key"}
+        with patch(
+            "apps.logistics.notification_service._get_vapid_key", return_value=signer
+        ):
+            get_vapid_headers("https://fcm.googleapis.com/fcm/send/a")
+            get_vapid_headers("https://fcm.googleapis.com/fcm/send/b")
+            headers = get_vapid_headers("https://web.push.apple.com/c")
+
+        self.assertEqual(signer.sign.call_count, 2)
+        self.assertEqual(headers["Authorization"], "vapid t=token,k=key")
+        audiences = [call.args[0]["aud"] for call in signer.sign.call_args_list]
+        self.assertEqual(
+            audiences, ["https://fcm.googleapis.com", "https://web.push.apple.com"]
+        )
+
+    @override_settings(WEBPUSH_VAPID_TOKEN_TTL=60, WEBPUSH_VAPID_TOKEN_MARGIN=60)
+    def test_jwt_resigned_near_expiry(self):
+        signer = Mock()
+        signer.sign.return_value = {"Authorization": "vapid t=token,k=key"}
+        with patch(
+            "apps.logistics.notification_service._get_vapid_key", return_value=signer
+        ):
+            get_vapid_headers("https://fcm.googleapis.com/fcm/send/a")
+            get_vapid_headers("https://fcm.googleapis.com/fcm/send/b")
+
+        self.assertEqual(signer.sign.call_count, 2)
+
+
+class NotificationRealtimeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="streamer",
+            password="streampass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.unread_url = reverse("notification-unread-count")
+
+    def test_unread_counter_maintained_without_table_scan(self):
+        Notification.objects.create(user=self.user, title="Primeira")
+        self.assertEqual(self.client.get(self.unread_url).data["unread"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, title="Segunda")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user.pk), 2)
+
+        self.client.post(reverse("notification-mark-all-read"))
+        with self.assertNumQueries(1):
+            self.assertEqual(unread_count(self.user.pk), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user.pk), 0)
+
+    def test_increment_during_cold_count_is_not_lost(self):
+        real_count = QuerySet.count
+
+        def count_then_notify(queryset):
+            count = real_count(queryset)
+            # Committed (and its increment run) after the rows were counted
+            Notification.objects.create(user=self.user, title="Concorrente")
+            increment_unread(self.user.pk)
+            return count
+
+        with patch.object(QuerySet, "count", count_then_notify):
+            self.assertEqual(unread_count(self.user.pk), 0)
+        self.assertEqual(unread_count(self.user.pk), 1)
+
+    def test_new_notification_is_published_to_user_channel(self):
+        with override_settings(REDIS_URL="redis://localhost:6379/2"), patch(
+            "apps.logistics.realtime.get_redis"
+        ) as mocked_redis:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = Notification.objects.create(
+                    user=self.user, title="Nova"
+                )
+
+        channel, message = mocked_redis.return_value.publish.call_args.args
+        self.assertEqual(channel, f"notifications:user:{self.user.pk}")
+        self.assertEqual(json.loads(message)["notification"]["id"], notification.id)
+
+    def test_notification_detail_has_no_get(self):
+        notification = Notification.objects.create(user=self.user, title="Unica")
+        url = reverse("notification-detail", args=[notification.id])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        resp = self.client.patch(url, {"is_read": True}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_redis_outage_does_not_fail_committed_notification(self):
+        with override_settings(REDIS_URL="redis://localhost:6379/2"), patch(
+            "apps.logistics.realtime.get_redis"
+        ) as mocked_redis:
+            mocked_redis.return_value.publish.side_effect = redis.ConnectionError
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, title="Nova")
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+    def test_stream_rejects_invalid_token(self):
+        resp = self.client.get(reverse("notification-stream"), {"token": "invalid"})
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(REDIS_URL="")
+    def test_stream_unavailable_without_redis(self):
+        token = AccessToken.for_user(self.user)
+        resp = self.client.get(reverse("notification-stream"), {"token": str(token)})
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=30, NOTIFICATION_RETENTION_BATCH_SIZE=1)
+class NotificationRetentionTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="retention",
+            password="retentionpass",
+        )
+        old = timezone.now() - timedelta(days=45)
+        self.old_read = [
+            Notification.objects.create(
+                user=self.user, title=f"Lida {i}", is_read=True
+            )
+            for i in range(3)
+        ]
+        self.old_unread = Notification.objects.create(user=self.user, title="Pendente")
+        self.recent_read = Notification.objects.create(
+            user=self.user, title="Recente", is_read=True
+        )
+        Notification.objects.filter(
+            pk__in=[n.pk for n in self.old_read] + [self.old_unread.pk]
+        ).update(created_at=old)
+
+    def test_purge_deletes_only_old_read_notifications_in_batches(self):
+        removed = purge_read_notifications()
+
+        self.assertEqual(removed, 3)
+        remaining = set(Notification.objects.values_list("pk", flat=True))
+        self.assertEqual(remaining, {self.old_unread.pk, self.recent_read.pk})
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    @override_settings(NOTIFICATION_RETENTION_ARCHIVE=True)
+    def test_purge_can_archive_instead_of_dropping(self):
+        purge_read_notifications()
+
+        archived = NotificationArchive.objects.values_list("original_id", flat=True)
+        self.assertEqual(set(archived), {n.pk for n in self.old_read})
+
+    @override_settings(NOTIFICATION_RETENTION_MAX_BATCHES=2)
+    def test_purge_stops_after_max_batches(self):
+        self.assertEqual(purge_read_notifications(), 2)
+
+
+class FakeRedis:
+    """In-memory stand-in for the few list/key commands the email buffer uses."""
+
+    def __init__(self):
+        self.lists = defaultdict(list)
+        self.keys = {}
+        self.zsets = defaultdict(dict)
+
+    def rpush(self, name, value):
+        self.lists[name].append(value.encode())
+
+    def lmove(self, source, destination, src, dst):
+        if not self.lists[source]:
+            return None
+        item = self.lists[source].pop(0 if src == "LEFT" else -1)
+        if dst == "LEFT":
+            self.lists[destination].insert(0, item)
+        else:
+            self.lists[destination].append(item)
+        return item
+
+    def lrange(self, name, start, end):
+        return self.lists[name][start:None if end == -1 else end + 1]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def llen(self, name):
+        return len(self.lists[name])
+
+    def set(self, name, value, nx=False, ex=None):
+        if nx and name in self.keys:
+            return None
+        self.keys[name] = value
+        return True
+
+    def delete(self, name):
+        self.keys.pop(name, None)
+        self.lists.pop(name, None)
+
+    def zadd(self, name, mapping):
+        self.zsets[name].update(mapping)
+
+    def zrangebyscore(self, name, low, high):
+        members = sorted(self.zsets[name].items(), key=lambda item: item[1])
+        return [member for member, score in members if score <= high]
+
+    def zrem(self, name, member):
+        self.zsets[name].pop(member, None)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+@override_settings(REDIS_URL="redis://localhost:6379/2", EMAIL_BATCH_WINDOW=30)
+class StatusEmailBatchTests(APITestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch(
+            "apps.logistics.email_service.get_redis", return_value=self.redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.orders = [
+            DeliveryOrder.objects.create(
+                client_name=f"Cliente {index}",
+                pickup_location=Point(-46.6, -23.5, srid=4326),
+                dropoff_location=Point(-46.5, -23.5, srid=4326),
+                status=DeliveryStatus.IN_TRANSIT,
+                deadline=timezone.now() + timedelta(days=1),
+            )
+            for index in range(2)
+        ]
+
+    def _queue_all(self):
+        with patch(
+            "apps.logistics.tasks.flush_delivery_status_emails.apply_async"
+        ) as mocked_flush:
+            queue_delivery_status_email(self.orders[0].id)
+            queue_delivery_status_email(self.orders[1].id)
+            queue_delivery_status_email(self.orders[0].id)
+        mocked_flush.assert_called_once_with(countdown=30)
+
+    def test_window_sends_buffered_emails_over_one_connection(self):
+        self._queue_all()
+        with patch(
+            "apps.logistics.email_service.get_connection",
+            wraps=email_service.get_connection,
+        ) as mocked_connection:
+            stats = flush_status_email_queue()
+
+        mocked_connection.assert_called_once()
+        self.assertEqual(stats["queue_depth"], 3)
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.redis.llen(email_service.STATUS_EMAIL_QUEUE), 0)
+
+    def test_failed_send_keeps_emails_queued_in_order(self):
+        self._queue_all()
+        queued = list(self.redis.lists[email_service.STATUS_EMAIL_QUEUE])
+        with patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("smtp down"),
+        ):
+            with self.assertRaises(OSError):
+                flush_status_email_queue()
+
+        self.assertEqual(self.redis.lists[email_service.STATUS_EMAIL_QUEUE], queued)
+        self.assertEqual(
+            [name for name, items in self.redis.lists.items() if items],
+            [email_service.STATUS_EMAIL_QUEUE],
+        )
+
+        stats = flush_status_email_queue()
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_next_flush_requeues_entries_of_a_dead_flush(self):
+        self._queue_all()
+        queued = list(self.redis.lists[email_service.STATUS_EMAIL_QUEUE])
+        # The worker dies mid-send, skipping the cleanup
+        with patch(
+            "apps.logistics.email_service._send_entries", side_effect=SystemExit
+        ):
+            with self.assertRaises(SystemExit):
+                flush_status_email_queue()
+        self.assertEqual(self.redis.llen(email_service.STATUS_EMAIL_QUEUE), 0)
+
+        # Still within the lock lifetime: the list may belong to a live flush
+        self.assertEqual(flush_status_email_queue()["sent"], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        index = self.redis.zsets[email_service.STATUS_EMAIL_PROCESSING_INDEX]
+        for key in index:
+            index[key] -= 30 * 10 + 1
+        stats = flush_status_email_queue()
+
+        self.assertEqual(stats["queue_depth"], len(queued))
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            [name for name, items in self.redis.lists.items() if items], []
+        )
+        self.assertEqual(index, {})
+
+    @override_settings(EMAIL_DIGEST_MODE=True)
+    def test_digest_mode_groups_orders_per_recipient(self):
+        self._queue_all()
+        flush_status_email_queue()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(f"Pedido #{self.orders[0].id}", mail.outbox[0].body)
+        self.assertIn(f"Pedido #{self.orders[1].id}", mail.outbox[0].body)
+
+
+class OutboxRelayTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="relay", password="x"
+        )
+        self.driver = Driver.objects.create(user=self.user, license_number="CNH777")
+
+    def _create_order(self, **extra):
+        return DeliveryOrder.objects.create(
+            client_name="Cliente Outbox",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(days=1),
+            **extra,
+        )
+
+    def test_rolled_back_save_leaves_no_event(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self._create_order(driver=self.driver)
+                raise RuntimeError("rollback")
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_event_holds_back_later_events_of_same_aggregate(self):
+        order = self._create_order(driver=self.driver)
+        order.status = DeliveryStatus.IN_TRANSIT
+        order.save()
+        other = self._create_order(driver=self.driver)
+
+        with patch(
+            "apps.logistics.outbox.notify_driver_assignment",
+            side_effect=[RuntimeError("push down"), None],
+        ), patch("apps.logistics.outbox.queue_delivery_status_email") as mocked_queue:
+            stats = relay_pending_events()
+
+        self.assertEqual(
+            stats, {"published": 1, "failed": 1, "deferred": 1, "dead": 0}
+        )
+        mocked_queue.assert_not_called()
+        pending = OutboxEvent.objects.filter(published_at__isnull=True)
+        pending_orders = set(pending.values_list("aggregate_id", flat=True))
+        self.assertEqual(pending_orders, {order.id})
+        self.assertFalse(
+            OutboxEvent.objects.filter(
+                aggregate_id=other.id, published_at__isnull=True
+            ).exists()
+        )
+        # The held-back event waits for its blocker instead of being reclaimed
+        self.assertEqual(
+            set(pending.values_list("next_attempt_at", flat=True)),
+            {pending.get(attempts=1).next_attempt_at},
+        )
+
+        # Backing off: the failed event and the one behind it are not due yet
+        with patch("apps.logistics.outbox.queue_delivery_status_email") as mocked_queue:
+            self.assertEqual(relay_pending_events()["published"], 0)
+        mocked_queue.assert_not_called()
+
+        OutboxEvent.objects.filter(next_attempt_at__isnull=False).update(
+            next_attempt_at=timezone.now()
+        )
+        with patch("apps.logistics.outbox.queue_delivery_status_email") as mocked_queue:
+            stats = relay_pending_events()
+
+        self.assertEqual(stats["published"], 2)
+        mocked_queue.assert_called_once_with(order.id)
+
+    @override_settings(
+        OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE=2.0, OUTBOX_RETRY_MAX=5.0
+    )
+    def test_failures_back_off_and_end_in_failed_state(self):
+        order = self._create_order(driver=self.driver)
+        event = OutboxEvent.objects.get(aggregate_id=order.id)
+        delays = []
+        with patch(
+            "apps.logistics.outbox.notify_driver_assignment",
+            side_effect=RuntimeError("redis down"),
+        ):
+            for _ in range(3):
+                before = timezone.now()
+                stats = relay_pending_events()
+                event.refresh_from_db()
+                if event.next_attempt_at and event.failed_at is None:
+                    delay = event.next_attempt_at - before
+                    delays.append(round(delay.total_seconds()))
+                    OutboxEvent.objects.filter(pk=event.pk).update(
+                        next_attempt_at=timezone.now()
+                    )
+
+        self.assertEqual(delays, [2, 4])
+        self.assertEqual(stats["dead"], 1)
+        self.assertIsNotNone(event.failed_at)
+        self.assertIsNone(event.published_at)
+        self.assertEqual(pending_event_lag(), 0.0)
+
+        self.assertEqual(requeue_failed_events(OutboxEvent.objects.all()), 1)
+        with patch("apps.logistics.outbox.notify_driver_assignment"):
+            self.assertEqual(relay_pending_events()["published"], 1)
+
+
+class CepLookupCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_cep_memory_cache()
+        reset_upstreams()
+        self.addCleanup(clear_cep_memory_cache)
+        self.url = reverse("cep-lookup")
+
+    def _upstream(self, viacep_payload, geocode_delay=0):
+        def fake_get(url, **kwargs):
+            if "viacep" in url:
+                return Mock(status_code=200, json=Mock(return_value=viacep_payload))
+            time.sleep(geocode_delay)
+            return Mock(
+                status_code=200,
+                json=Mock(return_value=[{"lat": "-23.55", "lon": "-46.63"}]),
+            )
+
+        session = Mock(get=Mock(side_effect=fake_get))
+        patcher = patch(
+            "apps.logistics.cep_service.get_cep_session", return_value=session
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session.get
+
+    def test_hit_is_served_from_memory_then_database(self):
+        payload = {
+            "cep": "01001-000",
+            "logradouro": "Praca da Se",
+            "bairro": "Se",
+            "localidade": "Sao Paulo",
+            "uf": "SP",
+        }
+        mocked_get = self._upstream(payload)
+        first = self.client.get(self.url, {"cep": "01001-000"})
+        second = self.client.get(self.url, {"cep": "01001000"})
+        clear_cep_memory_cache()
+        third = self.client.get(self.url, {"cep": "01001-000"})
+
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(first["X-Cache-Status"], "MISS")
+        self.assertEqual(second["X-Cache-Status"], "HIT")
+        self.assertEqual(third["X-Cache-Status"], "HIT-DB")
+        self.assertEqual(third.data, first.data)
+        self.assertEqual(first.data["latitude"], -23.55)
+
+    def test_unknown_cep_is_negatively_cached(self):
+        mocked_get = self._upstream({"erro": True})
+        first = self.client.get(self.url, {"cep": "99999-999"})
+        second = self.client.get(self.url, {"cep": "99999-999"})
+
+        # ViaCEP and Nominatim were asked once, concurrently
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second["X-Cache-Status"], "HIT")
+        cached = CepCache.objects.get(cep="99999999")
+        self.assertLessEqual(
+            cached.expires_at, timezone.now() + timedelta(hours=1, seconds=5)
+        )
+
+    @override_settings(CEP_LOOKUP_DEADLINE=0.2)
+    def test_slow_geocoder_is_cut_off_by_deadline(self):
+        self._upstream({"cep": "01001-000", "localidade": "Sao Paulo"}, 1)
+        started = time.perf_counter()
+        response = self.client.get(self.url, {"cep": "01001-000"})
+
+        self.assertLess(time.perf_counter() - started, 0.9)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["latitude"])
+
+    def test_gazetteer_answers_without_upstream_calls(self):
+        PostalCode.objects.create(
+            cep="01001000",
+            street="Praca da Se",
+            neighborhood="Se",
+            city="Sao Paulo",
+            state="SP",
+            latitude=-23.55,
+            longitude=-46.63,
+        )
+        PostalCode.objects.create(cep="01002000", city="Sao Paulo", state="SP")
+        PostalCode.objects.create(cep="20040002", city="Rio de Janeiro", state="RJ")
+        mocked_get = self._upstream({"erro": True})
+
+        response = self.client.get(self.url, {"cep": "01001-000"})
+        matches = self.client.get(self.url, {"prefix": "0100"})
+        too_short = self.client.get(self.url, {"prefix": "01"})
+
+        mocked_get.assert_not_called()
+        self.assertEqual(response["X-Cache-Status"], "HIT-LOCAL")
+        self.assertEqual(response.data["address"], "Praca da Se, Se, Sao Paulo-SP")
+        self.assertEqual(
+            [item["cep"] for item in matches.data["results"]],
+            ["01001-000", "01002-000"],
+        )
+        self.assertEqual(too_short.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_load_postal_codes_upserts_from_csv(self):
+        CepCache.objects.create(
+            cep="01001000",
+            status_code=400,
+            payload={"detail": "CEP invalido."},
+            fetched_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        PostalCode.objects.create(cep="01001000", city="Antiga", state="SP")
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as dump:
+            dump.write("cep,street,city,state,latitude,longitude\n")
+            dump.write("01001-000,Praca da Se,Sao Paulo,sp,-23.55,-46.63\n")
+            dump.write("20040-002,,Rio de Janeiro,RJ,,\n")
+            dump.write("123,,Invalido,XX,,\n")
+        self.addCleanup(os.remove, dump.name)
+
+        call_command("load_postal_codes", dump.name, stdout=io.StringIO())
+
+        self.assertEqual(PostalCode.objects.count(), 2)
+        updated = PostalCode.objects.get(cep="01001000")
+        self.assertEqual((updated.city, updated.state), ("Sao Paulo", "SP"))
+        self.assertIsNone(PostalCode.objects.get(cep="20040002").latitude)
+        self.assertFalse(CepCache.objects.exists())
+
+    def test_upstream_failure_is_not_persisted(self):
+        session = Mock(get=Mock(side_effect=requests.ConnectionError))
+        with patch(
+            "apps.logistics.cep_service.get_cep_session", return_value=session
+        ):
+            response = self.client.get(self.url, {"cep": "01001-000"})
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertFalse(CepCache.objects.exists())
+
+    @override_settings(REDIS_URL="redis://localhost:6379/2")
+    def test_lookup_works_while_redis_is_down(self):
+        mocked_get = self._upstream(
+            {"cep": "01001-000", "localidade": "Sao Paulo", "uf": "SP"}
+        )
+        client = Mock()
+        client.set.side_effect = redis.ConnectionError("down")
+        client.eval.side_effect = redis.ConnectionError("down")
+        with patch(
+            "apps.logistics.cep_service.get_redis", return_value=client
+        ), patch("apps.logistics.upstream.get_redis", return_value=client):
+            response = self.client.get(self.url, {"cep": "01001-000"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mocked_get.call_count, 2)
+        client.eval.assert_called()
+
+    @override_settings(REDIS_URL="redis://localhost:6379/2")
+    def test_follower_waits_for_the_leader_answer(self):
+        mocked_get = self._upstream({"erro": True})
+        answer = [200, {"cep": "01001-000"}]
+        pubsub = Mock()
+        pubsub.get_message.side_effect = [
+            None,
+            {"type": "message", "data": json.dumps(answer).encode()},
+        ]
+        # Another worker holds the lock and has not answered yet
+        client = Mock(pubsub=Mock(return_value=pubsub))
+        client.set.return_value = None
+        client.get.return_value = None
+        with patch("apps.logistics.cep_service.get_redis", return_value=client):
+            response = self.client.get(self.url, {"cep": "01001-000"})
+
+        mocked_get.assert_not_called()
+        pubsub.subscribe.assert_called_once_with("cep:result:01001000")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, answer[1])
+
+
+class CepBatchLookupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_cep_memory_cache()
+        self.addCleanup(clear_cep_memory_cache)
+        self.user = get_user_model().objects.create_user(
+            username="planilha", password="x"
+        )
+        self.client.force_authenticate(self.user)
+        PostalCode.objects.create(cep="01001000", city="Sao Paulo", state="SP")
+
+    @override_settings(CEP_BATCH_SYNC_UPSTREAM=1, CEP_UPSTREAM_RATE=1000)
+    def test_small_batch_is_answered_inline_and_deduplicated(self):
+        fetched = ((200, {"cep": "20040-002", "city": "Rio de Janeiro"}), 3600)
+        with patch(
+            "apps.logistics.cep_service.fetch_cep", return_value=fetched
+        ) as mocked_fetch:
+            response = self.client.post(
+                reverse("cep-lookup-batch"),
+                {"ceps": ["01001-000", "01001000", "20040-002", "abc"]},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mocked_fetch.assert_called_once_with("20040002")
+        self.assertEqual(
+            [(item["cep"], item["cache"]) for item in response.data["results"]],
+            [("01001000", "HIT-LOCAL"), ("20040002", "MISS")],
+        )
+        self.assertEqual(response.data["invalid"], ["abc"])
+
+    @override_settings(CEP_BATCH_SYNC_UPSTREAM=1)
+    def test_large_batch_becomes_a_celery_job(self):
+        with patch(
+            "apps.logistics.views.lookup_cep_batch.delay",
+            return_value=Mock(id="job-1"),
+        ) as mocked_delay:
+            response = self.client.post(
+                reverse("cep-lookup-batch"),
+                {"ceps": ["01001000", "20040002", "30130010"]},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        mocked_delay.assert_called_once_with(["01001000", "20040002", "30130010"])
+        self.assertEqual(response.data["pending_upstream"], 2)
+        self.assertEqual(
+            response.data["status_url"],
+            reverse("cep-lookup-batch-status", args=["job-1"]),
+        )
+
+        job = Mock(state="SUCCESS", result={"results": []})
+        job.successful.return_value = True
+        with patch("apps.logistics.views.AsyncResult", return_value=job):
+            status_response = self.client.get(response.data["status_url"])
+        self.assertEqual(
+            status_response.data, {"job_id": "job-1", "state": "SUCCESS", "results": []}
+        )
+
+        # Only the submitter may read the results
+        other = get_user_model().objects.create_user(username="outro", password="x")
+        self.client.force_authenticate(other)
+        with patch("apps.logistics.views.AsyncResult", return_value=job):
+            status_response = self.client.get(response.data["status_url"])
+        self.assertEqual(status_response.status_code, status.HTTP_404_NOT_FOUND)
+        missing = self.client.get(reverse("cep-lookup-batch-status", args=["job-2"]))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CEP_BATCH_SYNC_UPSTREAM=5, CEP_BATCH_SYNC_SECONDS=0)
+    def test_batch_that_cannot_finish_in_time_becomes_a_job(self):
+        with patch("apps.logistics.cep_service.fetch_cep") as mocked_fetch, patch(
+            "apps.logistics.views.lookup_cep_batch.delay",
+            return_value=Mock(id="job-3"),
+        ):
+            response = self.client.post(
+                reverse("cep-lookup-batch"),
+                {"ceps": ["01001000", "20040002"]},
+                format="json",
+            )
+
+        mocked_fetch.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["pending_upstream"], 1)
+
+
+class UpstreamGuardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_limits_calls_per_second(self):
+        bucket = TokenBucket("test", rate=1, capacity=2)
+
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0))
+
+    def test_breaker_fails_fast_once_open(self):
+        upstream = Upstream(
+            "test",
+            TokenBucket("test", rate=1000, capacity=1000),
+            CircuitBreaker("test", threshold=2, window=60, reset_timeout=30),
+        )
+        failing = Mock(side_effect=requests.Timeout)
+
+        for _ in range(2):
+            with self.assertRaises(requests.Timeout):
+                upstream.call(failing, wait=0)
+        with self.assertRaises(UpstreamUnavailable):
+            upstream.call(failing, wait=0)
+
+        self.assertEqual(failing.call_count, 2)
+
+    def test_concurrent_identical_calls_are_coalesced(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_lookup():
+            calls.append(1)
+            release.wait(timeout=2)
+            return "resultado"
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(coalesce, "cep:01001000", slow_lookup)
+                for _ in range(3)
+            ]
+            time.sleep(0.1)
+            release.set()
+            results = [future.result(timeout=2) for future in futures]
+
+        self.assertEqual(results, ["resultado"] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+class OrderRollupTests(APITestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            username="gestor", password="x", is_staff=True
+        )
+        self.driver = Driver.objects.create(
+            user=get_user_model().objects.create_user(username="rollup", password="x"),
+            license_number="CNH555",
+        )
+        self.url = reverse("order-analytics")
+        self.client.force_authenticate(self.admin)
+
+    def _create_order(self, **extra):
+        return DeliveryOrder.objects.create(
+            client_name="Cliente Rollup",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(days=1),
+            **extra,
+        )
+
+    def test_refresh_recomputes_only_touched_days(self):
+        today = timezone.localdate()
+        order = self._create_order(driver=self.driver)
+        self._create_order()
+        old = self._create_order()
+        DeliveryOrder.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        OrderRollupDirtyDay.objects.all().delete()
+        OrderRollupDirtyDay.objects.create(day=today)
+
+        self.assertEqual(refresh_order_rollups(), {"days": 1, "rows": 2})
+        days = set(DailyOrderRollup.objects.values_list("day", flat=True))
+        self.assertEqual(days, {today})
+        self.assertFalse(OrderRollupDirtyDay.objects.exists())
+        self.assertEqual(refresh_order_rollups(), {"days": 0, "rows": 0})
+
+        order.status = DeliveryStatus.IN_TRANSIT
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+            # Nothing is queued until the write commits
+            self.assertFalse(OrderRollupDirtyDay.objects.exists())
+        self.assertEqual(OrderRollupDirtyDay.objects.count(), 1)
+        refresh_order_rollups()
+        statuses = dict(
+            DailyOrderRollup.objects.filter(driver=self.driver).values_list(
+                "status", "orders"
+            )
+        )
+        self.assertEqual(statuses, {DeliveryStatus.IN_TRANSIT: 1})
+
+    def test_analytics_endpoint_reads_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_order(driver=self.driver)
+            self._create_order(driver=self.driver, status=DeliveryStatus.DELIVERED)
+            self._create_order()
+        refresh_order_rollups()
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, {"group_by": "driver"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        by_driver = {row["driver"]: row["orders"] for row in resp.data["results"]}
+        self.assertEqual(by_driver, {self.driver.id: 2, None: 1})
+
+        resp = self.client.get(self.url, {"group_by": "day,status"})
+        self.assertEqual(sum(row["orders"] for row in resp.data["results"]), 3)
+        self.assertEqual(set(resp.data["results"][0]), {"day", "status", "orders"})
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        resp = self.client.get(self.url, {"from": tomorrow.isoformat()})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(self.url, {"group_by": "vehicle"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_analytics_requires_staff(self):
+        self.client.force_authenticate(self.driver.user)
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderStatusHistoryTests(APITestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            username="analista", password="x", is_staff=True
+        )
+        self.driver = Driver.objects.create(
+            user=get_user_model().objects.create_user(
+                username="historico", password="x"
+            ),
+            license_number="CNH444",
+        )
+        self.client.force_authenticate(self.admin)
+
+    def _create_order(self, **extra):
+        return DeliveryOrder.objects.create(
+            client_name="Cliente Historico",
+            pickup_location=Point(-46.6, -23.5, srid=4326),
+            dropoff_location=Point(-46.5, -23.5, srid=4326),
+            deadline=timezone.now() + timedelta(hours=2),
+            driver=self.driver,
+            **extra,
+        )
+
+    def _move(self, order, status_value, at):
+        order.status = status_value
+        order.save()
+        OrderStatusEvent.objects.filter(
+            order=order, to_status=status_value
+        ).update(changed_at=at)
+
+    def test_transitions_are_recorded_with_the_save(self):
+        order = self._create_order()
+        order.client_name = "Renomeado"
+        order.save()
+        order.status = DeliveryStatus.IN_TRANSIT
+        order.save()
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                order.status = DeliveryStatus.DELIVERED
+                order.save()
+                raise RuntimeError("rollback")
+
+        transitions = list(
+            OrderStatusEvent.objects.filter(order=order).values_list(
+                "from_status", "to_status"
+            )
+        )
+        self.assertEqual(
+            transitions,
+            [
+                ("", DeliveryStatus.PENDING),
+                (DeliveryStatus.PENDING, DeliveryStatus.IN_TRANSIT),
+            ],
+        )
+
+    def test_time_in_state_percentiles(self):
+        now = timezone.now()
+        for minutes in (10, 20, 30):
+            order = self._create_order()
+            OrderStatusEvent.objects.filter(order=order).update(
+                changed_at=now - timedelta(hours=1)
+            )
+            self._move(
+                order,
+                DeliveryStatus.IN_TRANSIT,
+                now - timedelta(hours=1) + timedelta(minutes=minutes),
+            )
+
+        resp = self.client.get(reverse("time-in-state"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        by_status = {row["status"]: row for row in resp.data["results"]}
+        pending = by_status[DeliveryStatus.PENDING]
+        self.assertEqual(pending["transitions"], 3)
+        self.assertAlmostEqual(pending["p50"], 20 * 60)
+        self.assertAlmostEqual(pending["avg"], 20 * 60)
+        # Orders still in transit have no completed stay in that state
+        self.assertNotIn(DeliveryStatus.IN_TRANSIT, by_status)
+
+    def test_on_time_rate_per_driver(self):
+        now = timezone.now()
+        late = self._create_order()
+        self._move(late, DeliveryStatus.DELIVERED, now + timedelta(hours=3))
+        on_time = self._create_order()
+        self._move(on_time, DeliveryStatus.DELIVERED, now)
+        # Reopened and delivered again: only the first delivery counts
+        self._move(on_time, DeliveryStatus.IN_TRANSIT, now + timedelta(minutes=5))
+        on_time.status = DeliveryStatus.DELIVERED
+        on_time.save()
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        resp = self.client.get(reverse("on-time-rate"), {"to": tomorrow.isoformat()})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            resp.data["results"],
+            [
+                {
+                    "driver": self.driver.id,
+                    "driver_name": "historico",
+                    "delivered": 2,
+                    "on_time": 1,
+                    "on_time_rate": 0.5,
+                }
+            ],
+        )
+
+    def test_partitions_are_created_ahead(self):
+        names = ensure_status_event_partitions(months_ahead=1)
+        self.assertEqual(len(names), 2)
+        self.assertEqual(ensure_status_event_partitions(months_ahead=1), names)
+
+    def test_new_partition_takes_rows_from_the_default_partition(self):
+        # Past the months the migration created: lands in the default partition
+        later = timezone.now() + timedelta(days=31 * 4)
+        order = self._create_order()
+        self._move(order, DeliveryStatus.IN_TRANSIT, later)
+        table = OrderStatusEvent._meta.db_table
+        name = f"{table}_p{later:%Y%m}"
+
+        ensure_status_event_partitions(months_ahead=5)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {name}")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {table}_default WHERE changed_at >= %s",
+                [later - timedelta(days=1)],
+            )
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(
+            OrderStatusEvent.objects.filter(order=order, changed_at=later).count(), 1
+        )
+
+
+class RendererTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="renderer", password="x", is_staff=True
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_orjson_matches_stdlib_renderer(self):
+        data = {
+            "when": timezone.now(),
+            "day": timezone.localdate(),
+            "amount": Decimal("10.50"),
+            "label": gettext_lazy("Cliente"),
+            "error": ErrorDetail("invalido", code="invalid"),
+            "text": "entrega \u2028 sao paulo",
+            "items": [{"pair": (1, 2)}, None, 0.1],
+        }
+        self.assertEqual(OrjsonRenderer().render(data), JSONRenderer().render(data))
+
+        # Exponents are spelled differently (1e16 vs 1e+16) but decode the same
+        floats = {"big": 1e16, "small": 1e-7, "negative": -2.5e-300}
+        self.assertEqual(
+            json.loads(OrjsonRenderer().render(floats)),
+            json.loads(JSONRenderer().render(floats)),
+        )
+        for value in (float("nan"), float("inf"), float("-inf")):
+            data = {"items": [{"latitude": value}]}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                OrjsonRenderer().render(data)
+
+    def test_geometries_render_as_geojson(self):
+        data = {"point": Point(-46.6, -23.5, srid=4326)}
+        self.assertEqual(
+            json.loads(OrjsonRenderer().render(data)),
+            {"point": {"type": "Point", "coordinates": [-46.6, -23.5]}},
+        )
+
+    def test_msgpack_is_opt_in_and_matches_json(self):
+        Garage.objects.create(
+            name="Base", address="Rua A", postal_code="01000-000", capacity=5
+        )
+        url = reverse("garage-list")
+
+        resp = self.client.get(url)
+        self.assertEqual(resp["Content-Type"], "application/json")
+
+        packed = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(packed["Content-Type"], "application/msgpack")
+        body = MessagePackParser().parse(io.BytesIO(packed.content))
+        self.assertEqual(body, json.loads(resp.content))
+
+    def test_msgpack_request_body(self):
+        payload = {
+            "name": "Base Norte",
+            "address": "Rua B",
+            "postal_code": "02000-000",
+            "street_number": "10",
+            "capacity": 3,
+        }
+        resp = self.client.post(
+            reverse("garage-list"),
+            data=MessagePackRenderer().render(payload),
+            content_type="application/msgpack",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["name"], "Base Norte")
+
+
+class ReaderParityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        garage = Garage.objects.create(
+            name="Garagem Sul", address="Rua C", capacity=4, latitude=-23.6
+        )
+        Garage.objects.create(name="Sem coordenadas", address="Rua D")
+        vehicle = Vehicle.objects.create(
+            plate="XYZ-9876",
+            model="Caminhao",
+            capacity_kg=5000,
+            type=VehicleType.TRUCK,
+            garage=garage,
+            last_location=Point(-46.654321, -23.561234, srid=4326),
+            image="vehicles/caminhao.png",
+        )
+        Vehicle.objects.create(
+            plate="XYZ-0001", model="Moto", capacity_kg=20, type=VehicleType.MOTORCYCLE
+        )
+        named = Driver.objects.create(
+            user=User.objects.create_user(
+                username="completo", password="x", first_name="Ana", last_name="Lima"
+            ),
+            license_number="CNH111",
+        )
+        plain = Driver.objects.create(
+            user=User.objects.create_user(username="simples", password="x"),
+            license_number="CNH222",
+        )
+        for driver, status_value in (
+            (named, DeliveryStatus.IN_TRANSIT),
+            (plain, DeliveryStatus.DELIVERED),
+            (None, DeliveryStatus.PENDING),
+        ):
+            DeliveryOrder.objects.create(
+                client_name="Cliente \u00e1",
+                driver=driver,
+                vehicle=vehicle if driver else None,
+                pickup_location=Point(-46.6, -23.5, srid=4326),
+                dropoff_location=Point(-46.512345678, -23.498765432, srid=4326),
+                status=status_value,
+                deadline=timezone.now() + timedelta(hours=5),
+            )
+        self.request = Request(APIRequestFactory().get("/api/"))
+
+    def _assert_parity(self, queryset, serializer_class, reader):
+        expected = serializer_class(
+            queryset, many=True, context={"request": self.request}
+        ).data
+        actual = reader.build(reader.values(queryset), self.request)
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_vehicle_reader_matches_serializer(self):
+        self._assert_parity(
+            Vehicle.objects.all(), VehicleSerializer, VehicleListReader()
+        )
+
+    def test_garage_reader_matches_serializer(self):
+        self._assert_parity(Garage.objects.all(), GarageSerializer, GarageListReader())
+
+    def test_order_reader_matches_serializer(self):
+        self._assert_parity(
+            DeliveryOrder.objects.all(),
+            DeliveryOrderSerializer,
+            DeliveryOrderListReader(),
+        )
+
+    def test_list_endpoint_uses_one_query_per_page(self):
+        user = get_user_model().objects.create_user(username="leitor", password="x")
+        self.client.force_authenticate(user)
+        # COUNT for the paginator plus the page itself
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse("deliveryorder-list"))
+        self.assertEqual(resp.data["count"], 3)
+        names = {order["driver_name"] for order in resp.data["results"]}
+        self.assertEqual(names, {"Ana Lima", "simples", None})
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every read endpoint is measured with N and with 10 x N rows of each model:
+    the query count must not grow with the data and must stay within the
+    endpoint's budget. Failures list the SQL of the larger run.
+    """
+
+    N = 3
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username="budgetadmin", password="x", is_staff=True
+        )
+        self.driver_user = User.objects.create_user(
+            username="budgetdriver", password="x", first_name="Ana"
+        )
+        self.driver = Driver.objects.create(
+            user=self.driver_user, license_number="CNH-BUDGET"
+        )
+        self.seeded = 0
+        fetched = ((200, {"cep": "20040-002", "city": "Rio de Janeiro"}), 3600)
+        patcher = patch("apps.logistics.cep_service.fetch_cep", return_value=fetched)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _seed(self, count):
+        User = get_user_model()
+        pickup = Point(-46.57421, -23.55052, srid=4326)
+        dropoff = Point(-46.57421, -23.54052, srid=4326)
+        polygon = Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (0, 0)), srid=4326)
+        statuses = [DeliveryStatus.PENDING, DeliveryStatus.DELIVERED]
+        for i in range(self.seeded, self.seeded + count):
+            garage = Garage.objects.create(name=f"Garagem {i}", address="Rua A")
+            vehicle = Vehicle.objects.create(
+                plate=f"BGT-{i:04d}",
+                model="Furgao",
+                capacity_kg=1000,
+                type=VehicleType.VAN,
+                garage=garage,
+            )
+            user = User.objects.create_user(username=f"budget{i}", password="x")
+            Driver.objects.create(user=user, license_number=f"CNH-{i:06d}")
+            order = DeliveryOrder.objects.create(
+                client_name=f"Cliente {i}",
+                driver=self.driver,
+                vehicle=vehicle,
+                pickup_location=pickup,
+                dropoff_location=dropoff,
+                status=statuses[i % 2],
+                deadline=timezone.now() + timedelta(days=1),
+            )
+            DeliveryArea.objects.create(name=f"Area {i}", area=polygon)
+            Notification.objects.create(
+                user=self.driver_user, title=f"OS {i}", order=order
+            )
+            PushSubscription.objects.create(
+                user=self.driver_user,
+                endpoint=f"https://fcm.googleapis.com/fcm/send/{i}",
+                p256dh="key",
+                auth="auth",
+            )
+        self.seeded += count
+
+    def _endpoints(self):
+        def first(model):
+            return model.objects.order_by("id").values_list("pk", flat=True)[0]
+
+        def detail(name, model, user):
+            url = reverse(f"{name}-detail", args=[first(model)])
+            return (f"{name}-detail", url, user, 1)
+
+        # (name, url, user, budget); a (url, data) pair is sent as a POST
+        return [
+            ("vehicle-list", reverse("vehicle-list"), self.driver_user, 2),
+            detail("vehicle", Vehicle, self.driver_user),
+            ("driver-list", reverse("driver-list"), self.driver_user, 2),
+            detail("driver", Driver, self.driver_user),
+            ("deliveryorder-list", reverse("deliveryorder-list"), self.driver_user, 2),
+            detail("deliveryorder", DeliveryOrder, self.driver_user),
+            ("garage-list", reverse("garage-list"), self.driver_user, 2),
+            detail("garage", Garage, self.driver_user),
+            ("deliveryarea-list", reverse("deliveryarea-list"), self.driver_user, 2),
+            detail("deliveryarea", DeliveryArea, self.driver_user),
+            # Every seeded area covers the point: one query, however many match
+            (
+                "coverage-check",
+                (reverse("coverage-check"), {"latitude": 0.5, "longitude": 0.5}),
+                self.driver_user,
+                1,
+            ),
+            # Gazetteer and CepCache lookups, then the CepCache upsert for the
+            # (mocked) upstream answer: two savepoints, SELECT FOR UPDATE and
+            # INSERT
+            (
+                "cep-lookup",
+                f"{reverse('cep-lookup')}?cep=20040002",
+                self.driver_user,
+                8,
+            ),
+            ("notification-list", reverse("notification-list"), self.driver_user, 2),
+            (
+                "push-subscription-health",
+                reverse("push-subscription-health"),
+                self.driver_user,
+                1,
+            ),
+            ("user-list", reverse("user-list"), self.admin, 2),
+            detail("user", get_user_model(), self.admin),
+            ("me", reverse("me"), self.driver_user, 2),
+            ("me-orders", reverse("me-orders"), self.driver_user, 2),
+            ("dashboard-summary", reverse("dashboard-summary"), self.admin, 3),
+            ("order-analytics", reverse("order-analytics"), self.admin, 1),
+            ("time-in-state", reverse("time-in-state"), self.admin, 1),
+            # Report query plus one lookup of the driver names
+            ("on-time-rate", reverse("on-time-rate"), self.admin, 2),
+        ]
+
+    def _measure(self, url, user):
+        # Response, ETag, /api/me/ and CEP caches would hide the cold path
+        cache.clear()
+        clear_cep_memory_cache()
+        CepCache.objects.all().delete()
+        self.client.force_authenticate(user)
+        url, data = (url, None) if isinstance(url, str) else url
+        with CaptureQueriesContext(connection) as captured:
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        return [query["sql"] for query in captured.captured_queries]
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self._seed(self.N)
+        endpoints = self._endpoints()
+        for _, url, user, _ in endpoints:
+            # Warm-up: one-off lookups (content types, ...) are not per request
+            self._measure(url, user)
+        small = {name: self._measure(url, user) for name, url, user, _ in endpoints}
+
+        self._seed(9 * self.N)
+        large = {name: self._measure(url, user) for name, url, user, _ in endpoints}
+
+        rows = [
+            (name, budget, len(small[name]), len(large[name]))
+            for name, _, _, budget in endpoints
+        ]
+        try:
+            for name, budget, small_count, large_count in rows:
+                with self.subTest(endpoint=name):
+                    if large_count > small_count or large_count > budget:
+                        self.fail(
+                            f"{name}: {small_count} queries with {self.N} rows, "
+                            f"{large_count} with {10 * self.N} (budget {budget}):\n"
+                            + "\n".join(large[name])
+                        )
+        finally:
+            print(f"\nQuery budgets ({self.N} / {10 * self.N} rows)")
+            print(f"{'endpoint':<28}{'budget':>8}{'N':>6}{'10N':>6}")
+            for name, budget, small_count, large_count in rows:
+                print(f"{name:<28}{budget:>8}{small_count:>6}{large_count:>6}")
@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+
+from .redis_client import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Refill the bucket from the elapsed time and take one token. Returns the
+# seconds to wait before a token is available ("0" when one was taken).
+# Redis server time keeps every worker on the same clock.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream is rate limited beyond the caller's budget or tripped."""
+
+
+class TokenBucket:
+    """
+    ``rate`` calls per second with bursts of up to ``capacity``, shared by
+    every process through Redis. Without Redis, or while it is unreachable,
+    the bucket is per process.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.key = f"upstream:bucket:{name}"
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _take_local(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _take(self) -> float:
+        if not redis_enabled():
+            return self._take_local()
+        try:
+            wait = get_redis().eval(
+                TOKEN_BUCKET_SCRIPT, 1, self.key, self.rate, self.capacity
+            )
+        except redis.RedisError:
+            logger.warning("Redis unavailable, local bucket for %s", self.key)
+            return self._take_local()
+        return float(wait)
+
+    def acquire(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for a token."""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` failures within ``window`` seconds and fails
+    fast for ``reset_timeout`` seconds. Calls then go through again, but a
+    single further failure reopens the circuit until a success closes it.
+    State lives in the cache so every worker sees the same circuit; while
+    the cache is unreachable the circuit counts as closed.
+    """
+
+    def __init__(self, name: str, threshold: int, window: int, reset_timeout: int):
+        self.failures_key = f"upstream:breaker:{name}:failures"
+        self.open_key = f"upstream:breaker:{name}:open"
+        self.threshold = threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+
+    def is_open(self) -> bool:
+        try:
+            return bool(cache.get(self.open_key))
+        except redis.RedisError:
+            return False
+
+    def record_success(self) -> None:
+        try:
+            cache.delete(self.failures_key)
+        except redis.RedisError:
+            pass
+
+    def record_failure(self) -> None:
+        try:
+            self._record_failure()
+        except redis.RedisError:
+            logger.warning("Could not record failure of %s", self.open_key)
+
+    def _record_failure(self) -> None:
+        cache.add(self.failures_key, 0, timeout=self.window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            failures = 1
+            cache.set(self.failures_key, failures, timeout=self.window)
+        if failures >= self.threshold:
+            cache.set(self.open_key, 1, timeout=self.reset_timeout)
+            # Half-open: the first failure after the reset reopens at once
+            cache.set(
+                self.failures_key,
+                self.threshold - 1,
+                timeout=self.reset_timeout + self.window,
+            )
+
+
+class Upstream:
+    def __init__(self, name: str, bucket: TokenBucket, breaker: CircuitBreaker):
+        self.name = name
+        self.bucket = bucket
+        self.breaker = breaker
+
+    def call(self, fn: Callable[[], T], wait: float) -> T:
+        """
+        Run ``fn`` if the circuit is closed and a token frees up within
+        ``wait`` seconds, otherwise raise UpstreamUnavailable right away.
+        Any exception raised by ``fn`` counts against the breaker.
+        """
+        if self.breaker.is_open():
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+        if not self.bucket.acquire(wait):
+            raise UpstreamUnavailable(f"{self.name}: rate limited")
+        try:
+            result = fn()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+
+_upstreams: dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str) -> Upstream:
+    """Guards for an entry of settings.UPSTREAM_LIMITS, built once per process."""
+    with _upstreams_lock:
+        upstream = _upstreams.get(name)
+        if upstream is None:
+            limits = settings.UPSTREAM_LIMITS[name]
+            upstream = Upstream(
+                name,
+                TokenBucket(name, limits["rate"], limits["burst"]),
+                CircuitBreaker(
+                    name,
+                    threshold=settings.UPSTREAM_BREAKER_THRESHOLD,
+                    window=settings.UPSTREAM_BREAKER_WINDOW,
+                    reset_timeout=settings.UPSTREAM_BREAKER_RESET,
+                ),
+            )
+            _upstreams[name] = upstream
+        return upstream
+
+
+def reset_upstreams() -> None:
+    with _upstreams_lock:
+        _upstreams.clear()
+
+
+_inflight_lock = threading.Lock()
+_inflight: dict[str, Future] = {}
+
+
+def coalesce(key: str, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+    """
+    Run ``fn`` once for concurrent callers with the same ``key`` in this
+    process; the others wait for and share its result (or exception).
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        return future.result(timeout=timeout)
+
+    try:
+        result = fn()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -1,15 +1,53 @@
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from celery.result import AsyncResult
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views import View
 from rest_framework import permissions, viewsets, status as drf_status, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
 from rest_framework.views import APIView
-import requests
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from apps.accounts.authentication import CachedJWTAuthentication
 
+from .analytics import (
+    GROUP_FIELDS,
+    on_time_by_driver,
+    query_order_rollups,
+    time_in_state,
+)
+from .caching import (
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    ConditionalListMixin,
+    bump_version,
+    response_cache_stats,
+)
+from .cep_service import (
+    BatchTimeExceeded,
+    is_valid_cep,
+    lookup_cep,
+    lookup_ceps,
+    normalize_cep,
+    resolve_local_ceps,
+    search_postal_codes,
+)
+from .dashboard_service import dashboard_summary
+from .metrics import export_metrics
 from .models import (
     DeliveryArea,
     DeliveryOrder,
-    DeliveryStatus,
     Driver,
     Garage,
     Notification,
@@ -17,16 +55,36 @@ from .models import (
     Vehicle,
     VehicleStatus,
 )
+from .notification_service import HEALTH_DEGRADED, HEALTH_OK, HEALTH_QUARANTINED
+from .readers import (
+    DeliveryOrderListReader,
+    GarageListReader,
+    ReaderListMixin,
+    VehicleListReader,
+)
+from .realtime import (
+    invalidate_unread,
+    notification_events,
+    streaming_enabled,
+    unread_count,
+)
 from .serializers import (
+    CepBatchSerializer,
     CoverageCheckSerializer,
     DeliveryAreaSerializer,
     DeliveryOrderSerializer,
     DriverSerializer,
     GarageSerializer,
     NotificationSerializer,
+    PushSubscriptionHealthSerializer,
     PushSubscriptionSerializer,
     VehicleSerializer,
 )
+from .tasks import lookup_cep_batch
+
+CEP_BATCH_OWNER_KEY = "cep:batch-owner:{job_id}"
+# Celery keeps task results for a day by default
+CEP_BATCH_OWNER_TTL = 24 * 3600
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -40,22 +98,45 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(
+    ConditionalGetMixin, CachedResponseMixin, ReaderListMixin, viewsets.ModelViewSet
+):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
+    list_reader = VehicleListReader()
     permission_classes = [IsAdminOrReadOnly]
+    conditional_models = (Vehicle,)
+    cache_name = "vehicles"
 
 
-class DriverViewSet(viewsets.ModelViewSet):
+class DriverViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Driver.objects.select_related("user").all()
     serializer_class = DriverSerializer
     permission_classes = [IsAdminOrReadOnly]
+    conditional_models = (Driver,)
+    cache_name = "drivers"
 
 
-class DeliveryOrderViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryOrder.objects.all()
+class DeliveryOrderViewSet(
+    ConditionalGetMixin, CachedResponseMixin, ReaderListMixin, viewsets.ModelViewSet
+):
+    # The serializer reads the driver's user and the vehicle plate (lists go
+    # through list_reader instead)
+    queryset = DeliveryOrder.objects.select_related("driver__user", "vehicle")
     serializer_class = DeliveryOrderSerializer
+    list_reader = DeliveryOrderListReader()
     permission_classes = [IsAdminOrReadOnly]
+    conditional_models = (DeliveryOrder, Driver, get_user_model(), Vehicle)
+    cache_name = "delivery-orders"
+
+    # The order row and its outbox events are committed together
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
 
     def get_permissions(self):
         # Admins can tudo, drivers podem alterar status apenas das ordens atribuídas
@@ -87,16 +168,25 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class GarageViewSet(viewsets.ModelViewSet):
+class GarageViewSet(
+    ConditionalGetMixin, CachedResponseMixin, ReaderListMixin, viewsets.ModelViewSet
+):
     queryset = Garage.objects.all()
     serializer_class = GarageSerializer
+    list_reader = GarageListReader()
     permission_classes = [IsAdminOrReadOnly]
+    conditional_models = (Garage,)
+    cache_name = "garages"
 
 
-class DeliveryAreaViewSet(viewsets.ModelViewSet):
+class DeliveryAreaViewSet(
+    ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet
+):
     queryset = DeliveryArea.objects.all()
     serializer_class = DeliveryAreaSerializer
     permission_classes = [IsAdminOrReadOnly]
+    conditional_models = (DeliveryArea,)
+    cache_name = "delivery-areas"
 
 
 class CoverageCheckView(APIView):
@@ -123,7 +213,10 @@ class CoverageCheckView(APIView):
 
 
 class NotificationViewSet(
-    mixins.ListModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet
+    ConditionalListMixin,
+    mixins.ListModelMixin,
+    mixins.UpdateModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -131,12 +224,78 @@ class NotificationViewSet(
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).order_by("-created_at")
 
+    def get_conditional_models(self):
+        return ((Notification, self.request.user.pk),)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_unread(self.request.user.pk)
+
+    @action(detail=False, methods=["get"], url_path="unread-count")
+    def unread_count(self, request):
+        return Response({"unread": unread_count(request.user.pk)})
+
     @action(detail=False, methods=["post"], url_path="mark-all-read")
     def mark_all_read(self, request):
         updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        if updated:
+            # QuerySet.update() bypasses post_save, so invalidate explicitly
+            bump_version(Notification, request.user.pk)
+        # Recount on the next read: a reset to 0 would erase notifications
+        # created while this request ran
+        invalidate_unread(request.user.pk)
         return Response({"updated": updated})
 
 
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint; see METRICS_TOKEN. Without a token it is
+    only served with DEBUG on.
+    """
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token and not settings.DEBUG:
+            return HttpResponse(status=404)
+        if token and not constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return HttpResponse(status=401)
+        payload, content_type = export_metrics()
+        return HttpResponse(payload, content_type=content_type)
+
+
+class NotificationStreamView(View):
+    """
+    Server-sent events with new notifications for the authenticated user.
+
+    EventSource cannot send headers, so the access token comes in the
+    ``token`` query parameter. Requires the ASGI server and Redis.
+    """
+
+    async def get(self, request):
+        authenticator = CachedJWTAuthentication()
+        try:
+            token = authenticator.get_validated_token(request.GET.get("token", ""))
+            user = await sync_to_async(authenticator.get_user)(token)
+        except (InvalidToken, AuthenticationFailed):
+            return JsonResponse({"detail": "Token invalido."}, status=401)
+
+        if not streaming_enabled():
+            return JsonResponse(
+                {"detail": "Streaming de notificacoes indisponivel."}, status=503
+            )
+
+        unread = await sync_to_async(unread_count)(user.pk)
+        response = StreamingHttpResponse(
+            notification_events(user.pk, unread, expires_at=token["exp"]),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class PushSubscriptionViewSet(
     mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
 ):
@@ -150,88 +309,203 @@ class PushSubscriptionViewSet(
     def public_key(self, request):
         return Response({"public_key": getattr(settings, "WEBPUSH_VAPID_PUBLIC_KEY", "")})
 
+    @action(detail=False, methods=["get"])
+    def health(self, request):
+        subscriptions = self.get_queryset().order_by("-created_at")
+        data = PushSubscriptionHealthSerializer(subscriptions, many=True).data
+        summary = {HEALTH_OK: 0, HEALTH_DEGRADED: 0, HEALTH_QUARANTINED: 0}
+        for item in data:
+            summary[item["health"]] += 1
+        return Response({"summary": summary, "subscriptions": data})
+
 
 class DashboardSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        return Response(dashboard_summary())
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit ratio of the list/retrieve response cache, per endpoint."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache_stats())
+
+
+def _query_date(request, name):
+    value = request.query_params.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+class AnalyticsView(APIView):
+    """Staff-only reports over a ``from``/``to`` date range (inclusive)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def date_range(self, request) -> tuple[date, date]:
+        try:
+            end = _query_date(request, "to") or timezone.localdate()
+            start = _query_date(request, "from") or end - timedelta(
+                days=settings.ANALYTICS_DEFAULT_RANGE_DAYS - 1
+            )
+        except ValueError:
+            raise ValidationError(
+                {"detail": "Datas devem estar no formato AAAA-MM-DD."}
+            )
+        if start > end:
+            raise ValidationError({"detail": "from deve ser anterior a to."})
+        return start, end
+
+
+class OrderAnalyticsView(AnalyticsView):
+    """
+    Orders per day, driver and/or status, read from the daily rollups only.
+
+    GET /api/analytics/orders/?group_by=day,driver,status&from=2024-01-01&to=2024-12-31
+    """
+
+    def get(self, request):
+        group_by = [
+            name.strip()
+            for name in request.query_params.get("group_by", "day").split(",")
+            if name.strip()
+        ]
+        unknown = [name for name in group_by if name not in GROUP_FIELDS]
+        if not group_by or unknown:
+            return Response(
+                {"detail": f"group_by aceita: {', '.join(GROUP_FIELDS)}."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+        start, end = self.date_range(request)
+        group_by = list(dict.fromkeys(group_by))
         return Response(
             {
-                "vehicles": Vehicle.objects.count(),
-                "drivers": Driver.objects.count(),
-                "delivery_orders": DeliveryOrder.objects.count(),
-                "in_transit_orders": DeliveryOrder.objects.filter(
-                    status=DeliveryStatus.IN_TRANSIT
-                ).count(),
-                "garages": Garage.objects.count(),
+                "group_by": group_by,
+                "from": start,
+                "to": end,
+                "results": query_order_rollups(group_by, start, end),
             }
         )
 
 
+class TimeInStateView(AnalyticsView):
+    """Percentiles (seconds) of the time orders spent in each status."""
+
+    def get(self, request):
+        start, end = self.date_range(request)
+        return Response(
+            {"from": start, "to": end, "results": time_in_state(start, end)}
+        )
+
+
+class OnTimeRateView(AnalyticsView):
+    """Deliveries per driver and the share that met the order deadline."""
+
+    def get(self, request):
+        start, end = self.date_range(request)
+        return Response(
+            {"from": start, "to": end, "results": on_time_by_driver(start, end)}
+        )
+
+
 class CepLookupView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        cep = (request.query_params.get("cep") or "").replace("-", "").strip()
+        if "prefix" in request.query_params:
+            return self._search(request)
+
+        cep = normalize_cep(request.query_params.get("cep"))
         if not cep:
             return Response({"detail": "CEP nao informado."}, status=400)
-
-        try:
-            resp = requests.get(
-                f"https://viacep.com.br/ws/{cep}/json/",
-                timeout=5,
-            )
-            if resp.status_code != 200:
-                return Response({"detail": "CEP invalido."}, status=400)
-            data = resp.json()
-            if data.get("erro"):
-                return Response({"detail": "CEP invalido."}, status=400)
-        except requests.RequestException:
+        if not is_valid_cep(cep):
+            return Response({"detail": "CEP invalido."}, status=400)
+
+        (status_code, body), cache_status = lookup_cep(cep)
+        response = Response(body, status=status_code)
+        response["X-Cache-Status"] = cache_status
+        return response
+
+    def _search(self, request):
+        # Partial CEPs are answered from the local gazetteer only
+        prefix = normalize_cep(request.query_params.get("prefix"))
+        if len(prefix) < settings.CEP_PREFIX_MIN_LENGTH:
             return Response(
-                {"detail": "Falha ao consultar o CEP."}, status=502
+                {
+                    "detail": (
+                        f"Informe ao menos {settings.CEP_PREFIX_MIN_LENGTH} "
+                        "digitos do CEP."
+                    )
+                },
+                status=400,
             )
+        return Response({"results": search_postal_codes(prefix[:8], limit=20)})
 
-        address_line = ", ".join(
-            filter(
-                None,
-                [
-                    data.get("logradouro"),
-                    data.get("bairro"),
-                    f"{data.get('localidade')}-{data.get('uf')}",
-                ],
-            )
-        )
 
-        lat = lon = None
-        try:
-            geo_resp = requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "format": "json",
-                    "postalcode": cep,
-                    "country": "Brazil",
-                    "limit": 1,
-                },
-                headers={"User-Agent": "EcoFleet/1.0"},
-                timeout=6,
-            )
-            if geo_resp.status_code == 200:
-                results = geo_resp.json()
-                if results:
-                    lat = float(results[0]["lat"])
-                    lon = float(results[0]["lon"])
-        except requests.RequestException:
-            pass
+class CepBatchLookupView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CepBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
+        ceps = []
+        invalid = []
+        for raw in serializer.validated_data["ceps"]:
+            cep = normalize_cep(raw)
+            if is_valid_cep(cep):
+                ceps.append(cep)
+            else:
+                invalid.append(raw)
+        ceps = list(dict.fromkeys(ceps))
+
+        pending_upstream = len(ceps) - len(resolve_local_ceps(ceps))
+        if pending_upstream <= settings.CEP_BATCH_SYNC_UPSTREAM:
+            try:
+                results = lookup_ceps(
+                    ceps, time_budget=settings.CEP_BATCH_SYNC_SECONDS
+                )
+                return Response({"results": results, "invalid": invalid})
+            except BatchTimeExceeded:
+                # What was fetched is cached; the job only looks up the rest
+                pending_upstream = len(ceps) - len(resolve_local_ceps(ceps))
+
+        # Upstream is rate limited: a big miss set would hold a worker for minutes
+        job = lookup_cep_batch.delay(ceps)
+        cache.set(
+            CEP_BATCH_OWNER_KEY.format(job_id=job.id),
+            request.user.pk,
+            timeout=CEP_BATCH_OWNER_TTL,
+        )
         return Response(
             {
-                "cep": data.get("cep", cep),
-                "street": data.get("logradouro", ""),
-                "neighborhood": data.get("bairro", ""),
-                "city": data.get("localidade", ""),
-                "state": data.get("uf", ""),
-                "address": address_line,
-                "latitude": lat,
-                "longitude": lon,
-            }
+                "job_id": job.id,
+                "status_url": reverse("cep-lookup-batch-status", args=[job.id]),
+                "pending_upstream": pending_upstream,
+                "invalid": invalid,
+            },
+            status=drf_status.HTTP_202_ACCEPTED,
         )
+
+
+class CepBatchStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        # Results are only shown to whoever submitted the batch
+        owner = cache.get(CEP_BATCH_OWNER_KEY.format(job_id=job_id))
+        if owner is None or owner != request.user.pk:
+            raise NotFound("Lote nao encontrado.")
+        job = AsyncResult(job_id, app=lookup_cep_batch.app)
+        data = {"job_id": job_id, "state": job.state}
+        if job.state == "PROGRESS":
+            data.update(job.info or {})
+        elif job.successful():
+            data.update(job.result)
+        elif job.failed():
+            data["detail"] = "Falha ao processar o lote."
+        return Response(data)
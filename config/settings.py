@@ -15,6 +15,7 @@ from pathlib import Path
 
 from datetime import timedelta
 from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -69,6 +70,7 @@ if ENABLE_ADMIN:
     INSTALLED_APPS.insert(0, 'django.contrib.admin')
 
 MIDDLEWARE = [
+    'apps.logistics.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -116,6 +118,15 @@ if POSTGRES_DB or config("DB_ENGINE", default=None):
             'PASSWORD': config('POSTGRES_PASSWORD', default=''),
             'HOST': config('POSTGRES_HOST', default='db'),
             'PORT': config('POSTGRES_PORT', default='5432'),
+            # Keep connections for DB_CONN_MAX_AGE seconds (celery workers,
+            # WSGI). Under ASGI every request runs in its own thread, so keep
+            # 0 there and pool with PgBouncer instead (DB_POOLER=True).
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            # Named cursors do not survive PgBouncer transaction pooling
+            'DISABLE_SERVER_SIDE_CURSORS': config(
+                'DB_POOLER', default=False, cast=bool
+            ),
         }
     }
 else:
@@ -127,12 +138,50 @@ else:
     }
 
 
+# Cache (Redis when configured, local memory otherwise)
+REDIS_URL = config("REDIS_URL", default="")
+# Seconds before a direct Redis command (not the cache backend) gives up
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", default=1.0, cast=float)
+REDIS_CONNECT_TIMEOUT = config("REDIS_CONNECT_TIMEOUT", default=1.0, cast=float)
+
+# ETags and cached responses hang off version counters that web, Celery and
+# the outbox relay all bump, so they need the shared (Redis) cache: with the
+# per-process LocMemCache fallback, writes made elsewhere would never show.
+VERSIONED_CACHING = config("VERSIONED_CACHING", default=bool(REDIS_URL), cast=bool)
+if VERSIONED_CACHING and not REDIS_URL:
+    raise ImproperlyConfigured("VERSIONED_CACHING requires REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
+# The browsable API renders HTML forms (and runs extra queries) per request
+API_BROWSABLE = config("API_BROWSABLE", default=DEBUG, cast=bool)
+# orjson renders and parses JSON; MessagePack is opt-in via the Accept header
+API_RENDERER_CLASSES = [
+    'apps.logistics.renderers.OrjsonRenderer',
+    'apps.logistics.renderers.MessagePackRenderer',
+]
+if API_BROWSABLE:
+    API_RENDERER_CLASSES.append('rest_framework.renderers.BrowsableAPIRenderer')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -140,9 +189,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+    'DEFAULT_RENDERER_CLASSES': API_RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': (
+        'apps.logistics.renderers.OrjsonParser',
+        'apps.logistics.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
@@ -154,6 +206,13 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(minutes=REFRESH_TOKEN_MINUTES),
 }
 
+# CachedJWTAuthentication keeps the resolved user in a per-process LRU for
+# AUTH_USER_LOCAL_TTL seconds and in Redis (with REDIS_URL) for
+# AUTH_USER_CACHE_TTL; saving the user or their driver profile invalidates it
+AUTH_USER_LOCAL_TTL = config("AUTH_USER_LOCAL_TTL", default=5, cast=float)
+AUTH_USER_LOCAL_SIZE = config("AUTH_USER_LOCAL_SIZE", default=10000, cast=int)
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=300, cast=int)
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Gestao de Rotas API",
     "DESCRIPTION": "API para gestao de veiculos, motoristas e ordens de entrega.",
@@ -162,6 +221,165 @@ SPECTACULAR_SETTINGS = {
 
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://redis:6379/0")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default="redis://redis:6379/1")
+CELERY_BEAT_SCHEDULE = {
+    "purge-read-notifications": {
+        "task": "apps.logistics.tasks.purge_read_notifications",
+        "schedule": config(
+            "NOTIFICATION_RETENTION_INTERVAL", default=60 * 60, cast=int
+        ),
+    },
+    # Safety net: a flush is normally scheduled by the first queued email
+    "flush-delivery-status-emails": {
+        "task": "apps.logistics.tasks.flush_delivery_status_emails",
+        "schedule": 5 * 60,
+    },
+    "prune-push-subscriptions": {
+        "task": "apps.logistics.tasks.prune_push_subscriptions",
+        "schedule": 24 * 60 * 60,
+    },
+    "purge-outbox-events": {
+        "task": "apps.logistics.tasks.purge_outbox_events",
+        "schedule": 60 * 60,
+    },
+    "refresh-order-rollups": {
+        "task": "apps.logistics.tasks.refresh_order_rollups",
+        "schedule": config("ANALYTICS_ROLLUP_INTERVAL", default=5 * 60, cast=int),
+    },
+    "ensure-status-event-partitions": {
+        "task": "apps.logistics.tasks.ensure_status_event_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+# Read notifications older than this are deleted (or archived) in batches
+NOTIFICATION_RETENTION_DAYS = config(
+    "NOTIFICATION_RETENTION_DAYS", default=90, cast=int
+)
+NOTIFICATION_RETENTION_BATCH_SIZE = config(
+    "NOTIFICATION_RETENTION_BATCH_SIZE",
+    default=5000,
+    cast=int,
+)
+NOTIFICATION_RETENTION_MAX_BATCHES = config(
+    "NOTIFICATION_RETENTION_MAX_BATCHES",
+    default=200,
+    cast=int,
+)
+NOTIFICATION_RETENTION_ARCHIVE = config(
+    "NOTIFICATION_RETENTION_ARCHIVE",
+    default=False,
+    cast=bool,
+)
+
+# CEP lookups: in-process LRU in front of the CepCache table. Hits keep for
+# CEP_CACHE_TTL, unknown CEPs (and addresses without coordinates) for
+# CEP_CACHE_NEGATIVE_TTL, upstream failures for CEP_CACHE_ERROR_TTL.
+CEP_CACHE_TTL = config("CEP_CACHE_TTL", default=90 * 24 * 60 * 60, cast=int)
+CEP_CACHE_NEGATIVE_TTL = config("CEP_CACHE_NEGATIVE_TTL", default=60 * 60, cast=int)
+CEP_CACHE_ERROR_TTL = config("CEP_CACHE_ERROR_TTL", default=60, cast=int)
+CEP_CACHE_MEMORY_SIZE = config("CEP_CACHE_MEMORY_SIZE", default=10_000, cast=int)
+# ViaCEP and Nominatim are queried concurrently under one overall deadline
+CEP_VIACEP_TIMEOUT = config("CEP_VIACEP_TIMEOUT", default=5, cast=float)
+CEP_NOMINATIM_TIMEOUT = config("CEP_NOMINATIM_TIMEOUT", default=6, cast=float)
+CEP_LOOKUP_DEADLINE = config("CEP_LOOKUP_DEADLINE", default=6, cast=float)
+CEP_LOOKUP_WORKERS = config("CEP_LOOKUP_WORKERS", default=8, cast=int)
+# Partial CEP search (?prefix=) over the local PostalCode gazetteer
+CEP_PREFIX_MIN_LENGTH = config("CEP_PREFIX_MIN_LENGTH", default=5, cast=int)
+# Upstream guards: token buckets shared through Redis (Nominatim's usage
+# policy allows 1 req/s) and a circuit breaker that fails fast after
+# THRESHOLD failures in WINDOW seconds, for RESET seconds
+UPSTREAM_LIMITS = {
+    "viacep": {
+        "rate": config("VIACEP_RATE", default=10, cast=float),
+        "burst": config("VIACEP_BURST", default=20, cast=int),
+    },
+    "nominatim": {
+        "rate": config("NOMINATIM_RATE", default=1, cast=float),
+        "burst": config("NOMINATIM_BURST", default=1, cast=int),
+    },
+}
+UPSTREAM_BREAKER_THRESHOLD = config("UPSTREAM_BREAKER_THRESHOLD", default=5, cast=int)
+UPSTREAM_BREAKER_WINDOW = config("UPSTREAM_BREAKER_WINDOW", default=60, cast=int)
+UPSTREAM_BREAKER_RESET = config("UPSTREAM_BREAKER_RESET", default=30, cast=int)
+# Longest a lookup waits for a rate-limit token before giving up on that upstream
+UPSTREAM_MAX_WAIT = config("UPSTREAM_MAX_WAIT", default=1.0, cast=float)
+# Batch lookups: upstream calls are globally capped at CEP_UPSTREAM_RATE per
+# second; batches needing more than CEP_BATCH_SYNC_UPSTREAM of them, or more
+# than CEP_BATCH_SYNC_SECONDS of web worker time, run in Celery
+CEP_UPSTREAM_RATE = config("CEP_UPSTREAM_RATE", default=1.0, cast=float)
+CEP_BATCH_MAX_SIZE = config("CEP_BATCH_MAX_SIZE", default=5000, cast=int)
+CEP_BATCH_SYNC_UPSTREAM = config("CEP_BATCH_SYNC_UPSTREAM", default=5, cast=int)
+CEP_BATCH_SYNC_SECONDS = config("CEP_BATCH_SYNC_SECONDS", default=15.0, cast=float)
+
+# List/retrieve payloads of the logistics viewsets are cached per role and
+# query string; writes bump version keys, so entries only outlive a change
+# by becoming unreachable. The TTL bounds how long dead entries linger.
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=300, cast=int)
+
+# Request metrics for Prometheus (GET /metrics). Every request feeds the
+# per-route latency histogram; a METRICS_SAMPLE_RATE share of them also times
+# SQL, upstream HTTP and rendering and answers with a Server-Timing header.
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; without a token
+# the endpoint only answers with DEBUG on.
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_SAMPLE_RATE = config("METRICS_SAMPLE_RATE", default=0.1, cast=float)
+METRICS_SERVER_TIMING = config("METRICS_SERVER_TIMING", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# Celery: task wait/runtime/retry/failure metrics are recorded in the
+# workers and served on METRICS_CELERY_PORT (0 disables the listener). The
+# broker backlog of METRICS_QUEUE_NAMES is sampled at scrape time on both
+# surfaces and shared for METRICS_QUEUE_SAMPLE_INTERVAL seconds.
+METRICS_CELERY_PORT = config("METRICS_CELERY_PORT", default=0, cast=int)
+METRICS_QUEUE_NAMES = config(
+    "METRICS_QUEUE_NAMES",
+    default="celery",
+    cast=Csv(),
+)
+METRICS_QUEUE_SAMPLE_INTERVAL = config(
+    "METRICS_QUEUE_SAMPLE_INTERVAL", default=10, cast=int
+)
+
+# Dashboard counters are cached until a vehicle, driver or garage changes
+# (or the TTL expires, the only refresh for order counts); past
+# DASHBOARD_ESTIMATE_THRESHOLD orders, the order counts come from planner
+# statistics instead of COUNT(*). 0 always counts exactly.
+DASHBOARD_CACHE_TTL = config("DASHBOARD_CACHE_TTL", default=60, cast=int)
+DASHBOARD_ESTIMATE_THRESHOLD = config(
+    "DASHBOARD_ESTIMATE_THRESHOLD",
+    default=1_000_000,
+    cast=int,
+)
+
+# /api/me/ lists at most ME_OPEN_ORDERS_LIMIT open orders and caches the
+# payload per user until their orders change (or the TTL expires)
+ME_OPEN_ORDERS_LIMIT = config("ME_OPEN_ORDERS_LIMIT", default=50, cast=int)
+ME_CACHE_TTL = config("ME_CACHE_TTL", default=30, cast=int)
+
+# Order analytics read DailyOrderRollup; the refresh-order-rollups beat job
+# recomputes up to ANALYTICS_ROLLUP_MAX_DAYS touched days per run
+ANALYTICS_ROLLUP_MAX_DAYS = config("ANALYTICS_ROLLUP_MAX_DAYS", default=31, cast=int)
+ANALYTICS_DEFAULT_RANGE_DAYS = config(
+    "ANALYTICS_DEFAULT_RANGE_DAYS",
+    default=365,
+    cast=int,
+)
+# Monthly OrderStatusEvent partitions created ahead of time by the beat task
+STATUS_EVENT_PARTITIONS_AHEAD = config(
+    "STATUS_EVENT_PARTITIONS_AHEAD",
+    default=2,
+    cast=int,
+)
+
+# Outbox relay (python manage.py relay_outbox)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=100, cast=int)
+OUTBOX_POLL_INTERVAL = config("OUTBOX_POLL_INTERVAL", default=1.0, cast=float)
+# Failed events are retried after OUTBOX_RETRY_BASE * 2^(attempts - 1) seconds,
+# at most OUTBOX_RETRY_MAX apart; the defaults ride out about an hour of outage
+# before an event is marked failed (requeue it from the admin).
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=15, cast=int)
+OUTBOX_RETRY_BASE = config("OUTBOX_RETRY_BASE", default=2.0, cast=float)
+OUTBOX_RETRY_MAX = config("OUTBOX_RETRY_MAX", default=600.0, cast=float)
+OUTBOX_RETENTION_HOURS = config("OUTBOX_RETENTION_HOURS", default=72, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -201,12 +419,56 @@ STATIC_URL = 'static/'
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="noreply@example.com")
+# Status emails are buffered for EMAIL_BATCH_WINDOW seconds and sent together
+EMAIL_BATCH_WINDOW = config("EMAIL_BATCH_WINDOW", default=30, cast=int)
+EMAIL_BATCH_SIZE = config("EMAIL_BATCH_SIZE", default=200, cast=int)
+EMAIL_DIGEST_MODE = config("EMAIL_DIGEST_MODE", default=False, cast=bool)
 WEBPUSH_VAPID_PUBLIC_KEY = config("WEBPUSH_VAPID_PUBLIC_KEY", default="")
 WEBPUSH_VAPID_PRIVATE_KEY = config("WEBPUSH_VAPID_PRIVATE_KEY", default="")
 WEBPUSH_VAPID_ADMIN_EMAIL = config(
     "WEBPUSH_VAPID_ADMIN_EMAIL",
     default=DEFAULT_FROM_EMAIL,
 )
+# Fan-out tuning for the push delivery tasks
+WEBPUSH_BATCH_SIZE = config("WEBPUSH_BATCH_SIZE", default=100, cast=int)
+WEBPUSH_CONCURRENCY = config("WEBPUSH_CONCURRENCY", default=10, cast=int)
+WEBPUSH_TIMEOUT = config("WEBPUSH_TIMEOUT", default=10, cast=float)
+WEBPUSH_MAX_RETRIES = config("WEBPUSH_MAX_RETRIES", default=5, cast=int)
+WEBPUSH_RETRY_BACKOFF = config("WEBPUSH_RETRY_BACKOFF", default=5, cast=int)
+# Signed VAPID JWTs are reused per push service until MARGIN seconds before expiry
+WEBPUSH_VAPID_TOKEN_TTL = config(
+    "WEBPUSH_VAPID_TOKEN_TTL", default=12 * 60 * 60, cast=int
+)
+WEBPUSH_VAPID_TOKEN_MARGIN = config(
+    "WEBPUSH_VAPID_TOKEN_MARGIN", default=5 * 60, cast=int
+)
+# Endpoints failing QUARANTINE_AFTER times in a row are skipped for
+# QUARANTINE_BASE * 2^n seconds (capped at QUARANTINE_MAX); endpoints with
+# PRUNE_FAILURES consecutive failures and no success for PRUNE_AFTER_DAYS
+# are deleted by the periodic prune job.
+WEBPUSH_QUARANTINE_AFTER = config("WEBPUSH_QUARANTINE_AFTER", default=3, cast=int)
+WEBPUSH_QUARANTINE_BASE = config("WEBPUSH_QUARANTINE_BASE", default=60, cast=int)
+WEBPUSH_QUARANTINE_MAX = config(
+    "WEBPUSH_QUARANTINE_MAX", default=24 * 60 * 60, cast=int
+)
+WEBPUSH_PRUNE_FAILURES = config("WEBPUSH_PRUNE_FAILURES", default=10, cast=int)
+WEBPUSH_PRUNE_AFTER_DAYS = config("WEBPUSH_PRUNE_AFTER_DAYS", default=30, cast=int)
+
+# Notification stream (SSE) and cached unread counters
+NOTIFICATION_UNREAD_TTL = config(
+    "NOTIFICATION_UNREAD_TTL", default=24 * 60 * 60, cast=int
+)
+NOTIFICATION_STREAM_HEARTBEAT = config(
+    "NOTIFICATION_STREAM_HEARTBEAT", default=15, cast=int
+)
+NOTIFICATION_STREAM_MAX_SECONDS = config(
+    "NOTIFICATION_STREAM_MAX_SECONDS",
+    default=10 * 60,
+    cast=int,
+)
+NOTIFICATION_STREAM_RETRY_MS = config(
+    "NOTIFICATION_STREAM_RETRY_MS", default=3000, cast=int
+)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -13,18 +13,26 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from apps.logistics.views import (
+    CepBatchLookupView,
+    CepBatchStatusView,
     CepLookupView,
     CoverageCheckView,
     DashboardSummaryView,
     DeliveryAreaViewSet,
     DeliveryOrderViewSet,
     DriverViewSet,
+    MetricsView,
     GarageViewSet,
+    NotificationStreamView,
     NotificationViewSet,
+    OnTimeRateView,
+    OrderAnalyticsView,
     PushSubscriptionViewSet,
+    ResponseCacheStatsView,
+    TimeInStateView,
     VehicleViewSet,
 )
-from apps.accounts.views import UserViewSet, MeView
+from apps.accounts.views import MeOrderHistoryView, MeView, UserViewSet
 router = DefaultRouter()
 router.register(r'vehicles', VehicleViewSet)
 router.register(r'drivers', DriverViewSet)
@@ -37,6 +45,11 @@ router.register(r'push-subscriptions', PushSubscriptionViewSet, basename='push-s
 
 
 urlpatterns = [
+    path(
+        'api/notifications/stream/',
+        NotificationStreamView.as_view(),
+        name='notification-stream',
+    ),
     path('api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -46,14 +59,46 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name='schema'),
         name='swagger-ui',
     ),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('api/coverage-check/', CoverageCheckView.as_view(), name='coverage-check'),
     path(
         'api/dashboard-summary/',
         DashboardSummaryView.as_view(),
         name='dashboard-summary',
     ),
+    path(
+        'api/cache-stats/',
+        ResponseCacheStatsView.as_view(),
+        name='response-cache-stats',
+    ),
+    path(
+        'api/analytics/orders/',
+        OrderAnalyticsView.as_view(),
+        name='order-analytics',
+    ),
+    path(
+        'api/analytics/time-in-state/',
+        TimeInStateView.as_view(),
+        name='time-in-state',
+    ),
+    path(
+        'api/analytics/on-time/',
+        OnTimeRateView.as_view(),
+        name='on-time-rate',
+    ),
     path('api/cep-lookup/', CepLookupView.as_view(), name='cep-lookup'),
+    path(
+        'api/cep-lookup/batch/',
+        CepBatchLookupView.as_view(),
+        name='cep-lookup-batch',
+    ),
+    path(
+        'api/cep-lookup/batch/<str:job_id>/',
+        CepBatchStatusView.as_view(),
+        name='cep-lookup-batch-status',
+    ),
     path('api/me/', MeView.as_view(), name='me'),
+    path('api/me/orders/', MeOrderHistoryView.as_view(), name='me-orders'),
 ]
 
 if getattr(settings, "ENABLE_ADMIN", True):
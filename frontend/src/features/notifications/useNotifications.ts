@@ -1,11 +1,14 @@
 import { useCallback, useEffect, useMemo, useState } from "react"
 import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query"
 import {
+  NotificationList,
   UserNotification,
   fetchNotifications,
+  fetchUnreadCount,
   getPushPublicKey,
   markAllNotificationsRead,
   markNotificationRead,
+  notificationStreamUrl,
   savePushSubscription,
 } from "@/lib/api"
 import { urlBase64ToUint8Array } from "@/lib/utils"
@@ -13,6 +16,13 @@ import { urlBase64ToUint8Array } from "@/lib/utils"
 type PushState = "idle" | "enabled" | "blocked" | "unsupported" | "missing-key" | "error"
 
 const NOTIFICATION_QUERY_KEY = ["notifications"]
+const UNREAD_QUERY_KEY = ["notifications", "unread"]
+const STREAM_RECONNECT_MS = 5000
+
+type StreamMessage = {
+  notification: UserNotification
+  unread: number
+}
 
 const hasAuthTokens = () => {
   if (typeof window === "undefined") return false
@@ -22,15 +32,82 @@ const hasAuthTokens = () => {
 export const useNotifications = () => {
   const [pushState, setPushState] = useState<PushState>("idle")
   const [publicKey, setPublicKey] = useState<string | null>(null)
+  const [streamConnected, setStreamConnected] = useState(false)
   const queryClient = useQueryClient()
 
-  const notificationsQuery = useQuery<UserNotification[]>({
+  const notificationsQuery = useQuery<NotificationList | UserNotification[]>({
     queryKey: NOTIFICATION_QUERY_KEY,
     queryFn: fetchNotifications,
     enabled: hasAuthTokens(),
-    refetchInterval: 30000,
+    // Polling fica apenas como fallback quando o stream nao esta conectado
+    refetchInterval: streamConnected ? false : 30000,
+  })
+
+  const unreadQuery = useQuery<{ unread: number }>({
+    queryKey: UNREAD_QUERY_KEY,
+    queryFn: fetchUnreadCount,
+    enabled: hasAuthTokens(),
+    refetchInterval: streamConnected ? false : 30000,
   })
 
+  useEffect(() => {
+    if (typeof window === "undefined" || !("EventSource" in window)) return
+    if (!hasAuthTokens()) return
+
+    let source: EventSource | null = null
+    let reconnectTimer: number | undefined
+    let cancelled = false
+
+    const connect = () => {
+      const url = notificationStreamUrl()
+      if (!url || cancelled) return
+      source = new EventSource(url)
+      source.onopen = () => setStreamConnected(true)
+      source.addEventListener("unread", (event) => {
+        const { unread } = JSON.parse((event as MessageEvent).data)
+        queryClient.setQueryData(UNREAD_QUERY_KEY, { unread })
+      })
+      source.addEventListener("notification", (event) => {
+        const message: StreamMessage = JSON.parse((event as MessageEvent).data)
+        queryClient.setQueryData(UNREAD_QUERY_KEY, { unread: message.unread })
+        queryClient.setQueryData<NotificationList | UserNotification[]>(
+          NOTIFICATION_QUERY_KEY,
+          (current) => {
+            if (Array.isArray(current)) return [message.notification, ...current]
+            if (current && Array.isArray(current.results)) {
+              return {
+                ...current,
+                count: (current.count ?? current.results.length) + 1,
+                results: [message.notification, ...current.results],
+              }
+            }
+            return current
+          },
+        )
+      })
+      source.onerror = () => {
+        // Token expirado ou servidor reiniciado: renova o token e reconecta
+        source?.close()
+        setStreamConnected(false)
+        reconnectTimer = window.setTimeout(async () => {
+          try {
+            await fetchUnreadCount()
+          } catch {
+            // segue no polling ate o proximo ciclo
+          }
+          connect()
+        }, STREAM_RECONNECT_MS)
+      }
+    }
+
+    connect()
+    return () => {
+      cancelled = true
+      window.clearTimeout(reconnectTimer)
+      source?.close()
+    }
+  }, [queryClient])
+
   const notificationList = useMemo(() => {
     const data = notificationsQuery.data
     if (Array.isArray(data)) return data
@@ -39,8 +116,10 @@ export const useNotifications = () => {
   }, [notificationsQuery.data])
 
   const unreadCount = useMemo(
-    () => notificationList.filter((n) => !n.is_read).length,
-    [notificationList],
+    () =>
+      unreadQuery.data?.unread ??
+      notificationList.filter((n: UserNotification) => !n.is_read).length,
+    [unreadQuery.data, notificationList],
   )
 
   const markOneMutation = useMutation({
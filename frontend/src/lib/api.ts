@@ -371,6 +371,18 @@ export const updateUser = (
 export const deleteUser = (id: number) =>
   apiFetch<void>(`/api/users/${id}/`, { method: "DELETE" });
 
+export type MeOrder = {
+  id: number;
+  client_name: string;
+  status: string;
+  deadline?: string | null;
+  vehicle?: number | null;
+  vehicle_plate?: string | null;
+  vehicle_model?: string | null;
+  garage?: number | null;
+  garage_name?: string | null;
+};
+
 export type MeResponse = {
   id: number;
   username: string;
@@ -378,23 +390,39 @@ export type MeResponse = {
   is_staff: boolean;
   is_superuser: boolean;
   is_driver: boolean;
-  assigned_orders: Array<{
-    id: number;
-    client_name: string;
-    status: string;
-    vehicle?: number | null;
-    vehicle_plate?: string | null;
-    vehicle_model?: string | null;
-    garage?: number | null;
-    garage_name?: string | null;
-  }>;
+  // Open orders only (pending / in_transit)
+  assigned_orders: MeOrder[];
+  // Path of the paginated history (delivered / cancelled by default)
+  order_history: string;
+};
+
+export type MeOrderHistory = {
+  count: number;
+  next: string | null;
+  previous: string | null;
+  results: MeOrder[];
 };
 
 export const fetchMe = () => apiFetch<MeResponse>("/api/me/");
 
+export const fetchMyOrderHistory = (
+  path = "/api/me/orders/",
+  page = 1
+) => apiFetch<MeOrderHistory>(`${path}?page=${page}`);
+
 export const fetchNotifications = () =>
   apiFetch<NotificationList | UserNotification[]>("/api/notifications/");
 
+export const fetchUnreadCount = () =>
+  apiFetch<{ unread: number }>("/api/notifications/unread-count/");
+
+// EventSource nao envia headers, entao o token vai na query string
+export const notificationStreamUrl = () => {
+  const { access } = getTokens();
+  if (!access) return null;
+  return `${API_URL}/api/notifications/stream/?token=${encodeURIComponent(access)}`;
+};
+
 export const markNotificationRead = (id: number) =>
   apiFetch<UserNotification>(`/api/notifications/${id}/`, {
     method: "PATCH",
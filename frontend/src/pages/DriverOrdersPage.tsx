@@ -17,12 +17,20 @@ import {
   XCircle,
   Archive,
 } from "lucide-react"
-import { fetchMe, updateDeliveryOrder, MeResponse } from "@/lib/api"
+import {
+  fetchMe,
+  fetchMyOrderHistory,
+  updateDeliveryOrder,
+  MeOrder,
+  MeResponse,
+} from "@/lib/api"
 import styles from "./DriverOrdersPage.module.css"
 
-type DriverOrder = MeResponse["assigned_orders"][number]
+type DriverOrder = MeOrder
 type TabKey = "orders" | "closed" | "garage" | "vehicle"
 
+const CLOSED_STATUSES = ["delivered", "cancelled"]
+
 const tabs = [
   { id: "orders", label: "Ordem de servico", icon: ClipboardList },
   { id: "closed", label: "Fechados", icon: Archive },
@@ -53,12 +61,21 @@ const DriverOrdersPage = () => {
   const [note, setNote] = useState("")
   const [noteCache, setNoteCache] = useState<Record<number, string>>({})
   const [updating, setUpdating] = useState(false)
+  const [closedOrders, setClosedOrders] = useState<DriverOrder[]>([])
+  const [closedCount, setClosedCount] = useState(0)
+  const [closedPage, setClosedPage] = useState(1)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   const load = async () => {
     setLoading(true)
     try {
       const data = await fetchMe()
+      // /api/me/ only carries open orders; closed ones are paged separately
+      const history = await fetchMyOrderHistory(data.order_history)
       setMe(data)
+      setClosedOrders(history.results)
+      setClosedCount(history.count)
+      setClosedPage(1)
       setError("")
     } catch (err) {
       const message =
@@ -75,20 +92,48 @@ const DriverOrdersPage = () => {
     load()
   }, [])
 
+  const loadMoreClosed = async () => {
+    if (!me) return
+    setLoadingMore(true)
+    try {
+      const history = await fetchMyOrderHistory(
+        me.order_history,
+        closedPage + 1
+      )
+      setClosedOrders((prev) => [...prev, ...history.results])
+      setClosedCount(history.count)
+      setClosedPage((page) => page + 1)
+    } catch (err) {
+      const message =
+        err instanceof Error ? err.message : "Erro ao carregar historico."
+      setError(message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleStatusChange = async (orderId: number, status: string) => {
     setUpdating(true)
     try {
       await updateDeliveryOrder(orderId, { status })
+      const closing = CLOSED_STATUSES.includes(status)
+      const order = me?.assigned_orders.find((o) => o.id === orderId)
       setMe((prev) =>
         prev
           ? {
               ...prev,
-              assigned_orders: prev.assigned_orders.map((o) =>
-                o.id === orderId ? { ...o, status } : o
-              ),
+              assigned_orders: closing
+                ? prev.assigned_orders.filter((o) => o.id !== orderId)
+                : prev.assigned_orders.map((o) =>
+                    o.id === orderId ? { ...o, status } : o
+                  ),
             }
           : prev
       )
+      if (closing && order) {
+        setClosedOrders((prev) => [{ ...order, status }, ...prev])
+        setClosedCount((count) => count + 1)
+      }
       setNoteCache((prev) => ({ ...prev, [orderId]: note }))
       setSelectedOrder((prev) => (prev ? { ...prev, status } : prev))
       setError("")
@@ -101,13 +146,8 @@ const DriverOrdersPage = () => {
     }
   }
 
-  const assignedOrders = me?.assigned_orders ?? []
-  const activeOrders = assignedOrders.filter(
-    (order) => order.status !== "delivered" && order.status !== "cancelled"
-  )
-  const closedOrders = assignedOrders.filter(
-    (order) => order.status === "delivered" || order.status === "cancelled"
-  )
+  const activeOrders = me?.assigned_orders ?? []
+  const assignedOrders = [...activeOrders, ...closedOrders]
   const garageAssignments = uniqueBy(assignedOrders, (order) => {
     if (order.garage) return `garage-${order.garage}`
     if (order.garage_name) return `garage-name-${order.garage_name}`
@@ -190,6 +230,16 @@ const DriverOrdersPage = () => {
             </div>
           ))
         )}
+        {!loading && closedOrders.length < closedCount && (
+          <Button
+            variant="secondary"
+            className="w-full"
+            onClick={loadMoreClosed}
+            disabled={loadingMore}
+          >
+            {loadingMore ? "Carregando..." : "Carregar mais"}
+          </Button>
+        )}
       </CardContent>
     </Card>
   )
@@ -0,0 +1,51 @@
+"""
+Gunicorn settings for the production profile (docker-compose.prod.yml).
+
+    gunicorn -c gunicorn.conf.py config.asgi:application
+
+Every knob can be overridden through GUNICORN_* environment variables.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Uvicorn workers serve the ASGI app (the SSE notification stream needs it).
+# Sync views run in a thread pool inside each worker, so one worker per core
+# plus one keeps the CPUs busy without oversubscribing them.
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1)
+)
+
+# SSE connections stay open for minutes; the stream itself ends before the
+# access token expires, so the worker timeout only guards against hangs.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+# Workers share metrics through PROMETHEUS_MULTIPROC_DIR (see
+# apps.logistics.metrics.metrics_registry): start from an empty directory and
+# drop the live gauges of workers that exit.
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)